@@ -0,0 +1,188 @@
+# Copyright (c) 2011-present, Facebook, Inc.  All rights reserved.
+#  This source code is licensed under both the GPLv2 (found in the
+#  COPYING file in the root directory) and Apache 2.0 License
+#  (found in the LICENSE.Apache file in the root directory).
+
+from advisor.db_timeseries_parser import LogTimeSeriesData, NO_ENTITY
+from advisor.timestamp_parser import TimestampParser
+import math
+import re
+
+
+class BackgroundJob:
+    # A flush or compaction job, which runs on one background thread; it was
+    # busy from the first to the last of the job's logs (in seconds). The job
+    # ids start again from 1 every time the database is opened, so a job is
+    # identified by its id and the start time of its 'session'.
+    def __init__(self, job_id, session, thread, start_time):
+        self.job_id = job_id
+        self.session = session
+        self.thread = thread
+        self.job_type = None
+        self.start_time = start_time
+        self.end_time = start_time
+
+    def add_log(self, log_time, job_type):
+        self.start_time = min(self.start_time, log_time)
+        self.end_time = max(self.end_time, log_time)
+        if not self.job_type:
+            self.job_type = job_type
+
+
+class BackgroundJobsParser(LogTimeSeriesData):
+    # This data source rebuilds the busy intervals of the background threads
+    # from the logs of the flush and compaction jobs: the logs of a job are
+    # tagged '[JOB <id>]' (or '"job": <id>' in an EVENT_LOG_v1 record) and
+    # their context is the id of the thread that runs the job. The database
+    # wide (NO_ENTITY) time series, per job type 'flush' or 'compaction', are:
+    # - 'background.<type>.busy_threads': the average number of threads busy
+    #   with jobs of the type, per 'bucket_sec' seconds,
+    # - 'background.<type>.utilization': busy_threads divided by the size of
+    #   the pool, which is taken from 'pool_sizes' (Dict[type, size]) or else
+    #   is the number of threads that were seen running jobs of the type,
+    # - 'background.<type>.slots_available' and
+    #   'background.<type>.slots_scheduled': from the 'flush slots available
+    #   ..., compaction slots scheduled ...' logs, which tell whether the jobs
+    #   wait for a free slot of the pool.
+    # A pool with a high utilization and no slots available is saturated,
+    # while busy threads with free slots point at jobs bound by I/O.
+    KEY_PREFIX = 'background.'
+    JOB_TYPES = ('flush', 'compaction')
+    # the words of the logs of the jobs of each type
+    JOB_TYPE_KEYWORDS = (('flush', 'flush'), ('compaction', 'compact'))
+    RESTART = 'RocksDB version'
+    EVENT_REGEX = re.compile(r'"event": "(\w+)"')
+    SOURCE_LOCATION_REGEX = re.compile(r'\[[^\[\]\s]+:\d+\]')
+    JOB_ID_REGEX = re.compile(r'\[JOB (\d+)\]|"job": (\d+)')
+    SLOTS_REGEX = re.compile(
+        r'(flush|compaction) slots (available|scheduled) (\d+)'
+    )
+
+    def __init__(
+        self, logs_path_prefix, log_scanner=None, start_time=None,
+        end_time=None, bucket_sec=60, pool_sizes=None
+    ):
+        super().__init__(
+            logs_path_prefix, [], log_scanner, start_time, end_time
+        )
+        self.bucket_sec = bucket_sec
+        self.pool_sizes = pool_sizes or {}
+        self.jobs = {}  # Dict[Tuple[session, job_id], BackgroundJob]
+        # Dict['<type>.slots_<state>', Dict[time, number of slots]]
+        self.slots = {}
+        # the time of the last 'RocksDB version' banner
+        self.session = None
+
+    @staticmethod
+    def get_job_type(message):
+        match = BackgroundJobsParser.EVENT_REGEX.search(message)
+        if match:
+            text = match.group(1)
+        else:
+            text = BackgroundJobsParser.SOURCE_LOCATION_REGEX.sub('', message)
+        text = text.lower()
+        for job_type, keyword in BackgroundJobsParser.JOB_TYPE_KEYWORDS:
+            if keyword in text:
+                return job_type
+        return None
+
+    def process_log(self, log):
+        if log.message_contains(self.RESTART):
+            self.session = (
+                log.get_timestamp_micros() / TimestampParser.MICROS_PER_SEC
+            )
+            return
+        if log.message_contains('slots'):
+            slots = self.SLOTS_REGEX.findall(log.get_message())
+            log_time = (
+                log.get_timestamp_micros() / TimestampParser.MICROS_PER_SEC
+            )
+            for job_type, state, num_slots in slots:
+                key = job_type + '.slots_' + state
+                if key not in self.slots:
+                    self.slots[key] = {}
+                self.slots[key][log_time] = float(num_slots)
+        if not (log.message_contains('JOB') or log.message_contains('"job"')):
+            return
+        match = self.JOB_ID_REGEX.search(log.get_message())
+        if not match:
+            return
+        job_id = int(match.group(1) or match.group(2))
+        log_time = log.get_timestamp_micros() / TimestampParser.MICROS_PER_SEC
+        if (self.session, job_id) not in self.jobs:
+            self.jobs[(self.session, job_id)] = BackgroundJob(
+                job_id, self.session, log.get_context(), log_time
+            )
+        self.jobs[(self.session, job_id)].add_log(
+            log_time, self.get_job_type(log.get_message())
+        )
+
+    def get_busy_intervals(self):
+        # returns Dict[thread, List[Tuple[start_time, end_time, job_type]]]
+        # of the flush and compaction jobs, in the order of time
+        busy_intervals = {}
+        for job in self.jobs.values():
+            if not job.job_type:
+                continue
+            if job.thread not in busy_intervals:
+                busy_intervals[job.thread] = []
+            busy_intervals[job.thread].append(
+                (job.start_time, job.end_time, job.job_type)
+            )
+        for intervals in busy_intervals.values():
+            intervals.sort()
+        return busy_intervals
+
+    def get_busy_threads(self, busy_intervals, job_type):
+        # returns Dict[bucket start, average number of busy threads]
+        busy_sec = {}
+        for intervals in busy_intervals.values():
+            for start_time, end_time, interval_type in intervals:
+                if interval_type != job_type:
+                    continue
+                bucket = math.floor(start_time / self.bucket_sec)
+                while bucket * self.bucket_sec <= end_time:
+                    bucket_start = bucket * self.bucket_sec
+                    overlap = (
+                        min(end_time, bucket_start + self.bucket_sec) -
+                        max(start_time, bucket_start)
+                    )
+                    busy_sec[bucket_start] = (
+                        busy_sec.get(bucket_start, 0) + overlap
+                    )
+                    bucket += 1
+        return {
+            bucket_start: busy / self.bucket_sec
+            for bucket_start, busy in busy_sec.items()
+        }
+
+    def reset_logs(self):
+        self.jobs = {}
+        self.slots = {}
+        self.session = None
+
+    def build_timeseries(self, reqd_keys):
+        # keys_ts[NO_ENTITY]['background.<type>.<metric>'][time] = value
+        timeseries = {}
+        busy_intervals = self.get_busy_intervals()
+        for job_type in self.JOB_TYPES:
+            busy_threads = self.get_busy_threads(busy_intervals, job_type)
+            if not busy_threads:
+                continue
+            pool_size = self.pool_sizes.get(job_type)
+            if not pool_size:
+                pool_size = sum(
+                    any(interval[2] == job_type for interval in intervals)
+                    for intervals in busy_intervals.values()
+                )
+            timeseries[job_type + '.busy_threads'] = busy_threads
+            timeseries[job_type + '.utilization'] = {
+                bucket_start: busy / pool_size
+                for bucket_start, busy in busy_threads.items()
+            }
+        timeseries.update(self.slots)
+        self.keys_ts = {NO_ENTITY: {}}
+        for key in reqd_keys:
+            metric = key[len(self.KEY_PREFIX):]
+            if metric in timeseries:
+                self.keys_ts[NO_ENTITY][key] = timeseries[metric]
@@ -1,9 +1,17 @@
 from advisor.bench_runner import BenchmarkRunner
-from advisor.db_log_parser import DataSource, DatabaseLogs, NO_COL_FAMILY
+from advisor.db_background_jobs_parser import BackgroundJobsParser
+from advisor.db_event_log_parser import EventLogParser
+from advisor.db_job_throughput_parser import JobThroughputParser
+from advisor.db_log_parser import (
+    DataSource, DatabaseLogs, LogScanner, NO_COL_FAMILY
+)
 from advisor.db_options_parser import DatabaseOptions
 from advisor.db_stats_fetcher import (
     LogStatsParser, OdsStatsFetcher, DatabasePerfContext
 )
+from advisor.db_write_stall_parser import WriteStallParser
+from advisor.histogram import DBBenchHistograms, Histogram
+from advisor.timestamp_parser import TimestampParser
 import os
 import re
 import shutil
@@ -22,6 +30,7 @@ class DBBenchRunner(BenchmarkRunner):
     DB_PATH = "DB path"
     THROUGHPUT = "ops/sec"
     PERF_CON = " PERF_CONTEXT:"
+    HISTOGRAMS = "histograms"
 
     @staticmethod
     def is_metric_better(new_metric, old_metric):
@@ -38,6 +47,17 @@ class DBBenchRunner(BenchmarkRunner):
                 )
         return optional_args_str
 
+    @staticmethod
+    def is_histogram_enabled(db_bench_args):
+        # The latency histograms change the measured throughput, so they are
+        # printed only if '--histogram' is given in the db_bench arguments,
+        # e.g. as the positional argument 'histogram=1'
+        for cmd_line_arg in db_bench_args or []:
+            name, _, value = cmd_line_arg.partition('=')
+            if name.strip() == 'histogram':
+                return value.strip().lower() not in ('0', 'false')
+        return False
+
     def __init__(self, positional_args, ods_args=None):
         # parse positional_args list appropriately
         self.db_bench_binary = positional_args[0]
@@ -50,6 +70,9 @@ class DBBenchRunner(BenchmarkRunner):
             self.db_bench_args = positional_args[2:]
         # save ods_args if provided
         self.ods_args = ods_args
+        self.histogram = DBBenchRunner.is_histogram_enabled(
+            self.db_bench_args
+        )
 
     def _parse_output(self, get_perf_context=False):
         '''
@@ -59,12 +82,18 @@ class DBBenchRunner(BenchmarkRunner):
         of 5427999 found)\n
         PERF_CONTEXT:\n
         user_key_comparison_count = 500466712, block_cache_hit_count = ...\n
+        The latency histograms printed with --histogram, if it is enabled,
+        are parsed into output[HISTOGRAMS]: Dict[operation, Histogram].
         '''
         output = {
-            self.THROUGHPUT: None, self.DB_PATH: None, self.PERF_CON: None
+            self.THROUGHPUT: None, self.DB_PATH: None, self.PERF_CON: None,
+            self.HISTOGRAMS: {}
         }
         perf_context_begins = False
         with open(self.OUTPUT_FILE, 'r') as fp:
+            if self.histogram:
+                output[self.HISTOGRAMS] = Histogram.parse_db_bench_output(fp)
+                fp.seek(0)
             for line in fp:
                 if line.startswith(self.benchmark):
                     print(line)  # print output of db_bench run
@@ -87,10 +116,12 @@ class DBBenchRunner(BenchmarkRunner):
                         for tk in token_list
                         if tk
                     }
-                    # TODO(poojam23): this is a hack and should be replaced
-                    # with the timestamp that db_bench will provide per printed
+                    # TODO(poojam23): this should be replaced with the
+                    # timestamp that db_bench will provide per printed
                     # perf_context
-                    timestamp = int(time.time())
+                    timestamp = self._get_last_report_timestamp()
+                    if timestamp is None:
+                        timestamp = int(time.time())
                     perf_context_ts = {}
                     for stat in perf_context.keys():
                         perf_context_ts[stat] = {
@@ -104,6 +135,27 @@ class DBBenchRunner(BenchmarkRunner):
                     )
         return output
 
+    def _get_last_report_timestamp(self):
+        # With --stats_interval, db_bench prints periodic reports that begin
+        # with the time of the report in the same format as the timestamps in
+        # the Rocksdb LOG. The time of the last report is the closest estimate
+        # of when the perf_context was printed, and decoding it like the LOG
+        # timestamps keeps the perf_context on the same clock as the LOG
+        # statistics.
+        timestamp = None
+        for file_name in [self.OUTPUT_FILE, self.ERROR_FILE]:
+            if not os.path.isfile(file_name):
+                continue
+            with open(file_name, 'r') as fp:
+                for line in fp:
+                    if TimestampParser.is_timestamp(line):
+                        report_time = TimestampParser.get_timestamp(
+                            line.split()[0]
+                        )
+                        if timestamp is None or report_time > timestamp:
+                            timestamp = report_time
+        return timestamp
+
     def get_log_options(self, db_options, db_path):
         # get the location of the LOG file and the frequency at which stats are
         # dumped in the LOG file
@@ -161,12 +213,13 @@ class DBBenchRunner(BenchmarkRunner):
         self._run_command(command)
 
     def _build_experiment_command(self, curr_options, db_path):
-        command = "%s --benchmarks=%s --statistics --perf_level=3 --db=%s" % (
-            self.db_bench_binary, self.benchmark, db_path
-        )
+        command = (
+            "%s --benchmarks=%s --statistics --perf_level=3 " +
+            "--db=%s"
+        ) % (self.db_bench_binary, self.benchmark, db_path)
         args_str = self._get_options_command_line_args_str(curr_options)
         # handle the command-line args passed in the constructor
-        for cmd_line_arg in self.db_bench_args:
+        for cmd_line_arg in self.db_bench_args or []:
             args_str += (" --" + cmd_line_arg)
         command += args_str
         return command
@@ -184,6 +237,11 @@ class DBBenchRunner(BenchmarkRunner):
         # type: (List[str], str) -> str
         self._setup_db_before_experiment(db_options, db_path)
         command = self._build_experiment_command(db_options, db_path)
+        # the LOG files are timestamped in local time, which is parsed like
+        # GMT by the TimestampParser
+        experiment_start_time = TimestampParser.get_timestamp(
+            time.strftime('%Y/%m/%d-%H:%M:%S')
+        )
         self._run_command(command)
 
         parsed_output = self._parse_output(get_perf_context=True)
@@ -193,11 +251,37 @@ class DBBenchRunner(BenchmarkRunner):
         logs_file_prefix, stats_freq_sec = self.get_log_options(
             db_options, parsed_output[self.DB_PATH]
         )
+        # The LOGS, the Log STATS, the EVENT_LOG, the write stall, the job
+        # throughput and the background jobs objects share a LogScanner, so
+        # that the LOG files are read only once for all of them. The LOG files
+        # rotated during the experiment are read too, while those of the
+        # setup and of the earlier experiments end before its start time.
+        log_scanner = LogScanner(
+            logs_file_prefix, db_options.get_column_families(),
+            include_rotated=True, start_time=experiment_start_time
+        )
         db_logs = DatabaseLogs(
-            logs_file_prefix, db_options.get_column_families()
+            logs_file_prefix, db_options.get_column_families(), log_scanner
         )
         # Create the Log STATS object
-        db_log_stats = LogStatsParser(logs_file_prefix, stats_freq_sec)
+        db_log_stats = LogStatsParser(
+            logs_file_prefix, stats_freq_sec, log_scanner
+        )
+        # Create the EVENT_LOG object
+        db_event_log = EventLogParser(logs_file_prefix, log_scanner)
+        # Create the write stall timeline object
+        db_write_stalls = WriteStallParser(
+            logs_file_prefix, db_options.get_column_families(), log_scanner,
+            stats_dump_period_sec=stats_freq_sec
+        )
+        # Create the flush and compaction throughput object
+        db_job_throughput = JobThroughputParser(
+            logs_file_prefix, db_options.get_column_families(), log_scanner
+        )
+        # Create the background thread utilization object
+        db_background_jobs = BackgroundJobsParser(
+            logs_file_prefix, log_scanner
+        )
         # Create the PerfContext STATS object
         db_perf_context = DatabasePerfContext(
             parsed_output[self.PERF_CON], 0, False
@@ -205,8 +289,21 @@ class DBBenchRunner(BenchmarkRunner):
         data_sources = {
             DataSource.Type.DB_OPTIONS: [db_options],
             DataSource.Type.LOG: [db_logs],
-            DataSource.Type.TIME_SERIES: [db_log_stats, db_perf_context]
+            DataSource.Type.TIME_SERIES: [
+                db_log_stats, db_perf_context, db_event_log, db_write_stalls,
+                db_job_throughput, db_background_jobs
+            ]
         }
+        # Create the latency histograms object of this run
+        if self.histogram:
+            run_timestamp = self._get_last_report_timestamp()
+            if run_timestamp is None:
+                run_timestamp = int(time.time())
+            data_sources[DataSource.Type.TIME_SERIES].append(
+                DBBenchHistograms(
+                    parsed_output[self.HISTOGRAMS], run_timestamp
+                )
+            )
         # Create the ODS STATS object
         if self.ods_args:
             data_sources[DataSource.Type.TIME_SERIES].append(OdsStatsFetcher(
@@ -0,0 +1,155 @@
+# Copyright (c) 2011-present, Facebook, Inc.  All rights reserved.
+#  This source code is licensed under both the GPLv2 (found in the
+#  COPYING file in the root directory) and Apache 2.0 License
+#  (found in the LICENSE.Apache file in the root directory).
+
+from advisor.db_timeseries_parser import LogTimeSeriesData, NO_ENTITY
+from advisor.timestamp_parser import TimestampParser
+from array import array
+import json
+import re
+
+
+class EventTable:
+    # The events of one type (for example 'table_file_creation') stored by
+    # column: 'time_micros' holds the time of every event and 'columns' holds
+    # Dict[field, List[value]], with None where an event does not have the
+    # field. Nested objects are flattened, so the field 'num_entries' of the
+    # event's 'table_properties' is the column 'table_properties.num_entries'.
+    def __init__(self, event):
+        self.event = event
+        self.time_micros = array('q')
+        self.columns = {}
+
+    def __len__(self):
+        return len(self.time_micros)
+
+    @staticmethod
+    def flatten(fields, prefix, flat_fields):
+        for field, value in fields.items():
+            if isinstance(value, dict):
+                EventTable.flatten(value, prefix + field + '.', flat_fields)
+            else:
+                flat_fields[prefix + field] = value
+        return flat_fields
+
+    def add_row(self, time_micros, fields):
+        num_rows = len(self.time_micros)
+        for field, value in self.flatten(fields, '', {}).items():
+            if field not in self.columns:
+                self.columns[field] = [None] * num_rows
+            self.columns[field].append(value)
+        self.time_micros.append(time_micros)
+        for column in self.columns.values():
+            if len(column) == num_rows:
+                column.append(None)
+
+    def get_column(self, field):
+        if field not in self.columns:
+            return [None] * len(self.time_micros)
+        return self.columns[field]
+
+
+class EventLogParser(LogTimeSeriesData):
+    # This data source reads the 'EVENT_LOG_v1 {json}' records of the LOG
+    # files (flush_started, table_file_creation, compaction_finished, etc.)
+    # into an EventTable per event type. Only the records of the event types
+    # required by the conditions are decoded as JSON; all the other logs are
+    # skipped after a substring check. The fields of the events are exposed
+    # as time series with the keys '<event>.<field>', for example
+    # 'table_file_creation.file_size' or 'compaction_finished.output_level',
+    # so that TimeSeriesConditions can aggregate them. The entity of an event
+    # is its column family ('cf_name'), or NO_ENTITY for the events that do
+    # not name one; non-numeric fields, like 'flush_started.flush_reason',
+    # can be compared to strings, e.g. keys[0] == 'Manual Flush', per event
+    # or with the 'latest', 'oldest', 'max' and 'min' aggregation operators.
+    EVENT_LOG = 'EVENT_LOG_v1'
+    EVENT_TYPE_REGEX = re.compile(r'"event"\s*:\s*"([^"]+)"')
+    CF_NAME = 'cf_name'
+    TIME_MICROS = 'time_micros'
+
+    def __init__(
+        self, logs_path_prefix, log_scanner=None, start_time=None,
+        end_time=None
+    ):
+        super().__init__(
+            logs_path_prefix, [], log_scanner, start_time, end_time
+        )
+        self.event_tables = {}  # Dict[event, EventTable]
+        self.reqd_events = None
+
+    @staticmethod
+    def split_key(key):
+        # 'table_file_creation.table_properties.num_entries' is split into
+        # the event 'table_file_creation' and the field
+        # 'table_properties.num_entries'
+        event, _, field = key.partition('.')
+        return event, field
+
+    def get_keys_from_conditions(self, conditions):
+        reqd_keys = []
+        for cond in conditions:
+            for key in cond.keys:
+                # the '[]' prefix is meant for OdsStatsFetcher
+                if key.startswith('[]'):
+                    key = key[2:]
+                if self.split_key(key)[1]:
+                    reqd_keys.append(key)
+        return reqd_keys
+
+    def get_event_table(self, event):
+        # returns the EventTable of the 'event' type, which is empty if there
+        # were no such events or if the event type was not required
+        if event not in self.event_tables:
+            return EventTable(event)
+        return self.event_tables[event]
+
+    def process_log(self, log):
+        if not log.message_contains(self.EVENT_LOG):
+            return
+        message = log.get_message()
+        payload = message[message.find(self.EVENT_LOG) + len(self.EVENT_LOG):]
+        event_type = self.EVENT_TYPE_REGEX.search(payload)
+        if not event_type or event_type.group(1) not in self.reqd_events:
+            return
+        try:
+            fields = json.loads(payload)
+        except ValueError:
+            print('WARNING(EventLogParser) bad event: ' + payload)
+            return
+        event = fields.pop('event')
+        time_micros = fields.pop(self.TIME_MICROS, None)
+        if time_micros is None:
+            time_micros = log.get_timestamp_micros()
+        if event not in self.event_tables:
+            self.event_tables[event] = EventTable(event)
+        self.event_tables[event].add_row(time_micros, fields)
+
+    def register_keys(self, reqd_keys):
+        self.reqd_events = {self.split_key(key)[0] for key in reqd_keys}
+        super().register_keys(reqd_keys)
+
+    def reset_logs(self):
+        self.event_tables = {}
+
+    def build_timeseries(self, reqd_keys):
+        # keys_ts[entity]['<event>.<field>'][seconds] = value
+        self.keys_ts = {}
+        for key in reqd_keys:
+            event, field = self.split_key(key)
+            table = self.get_event_table(event)
+            entities = table.get_column(self.CF_NAME)
+            for time_micros, entity, value in zip(
+                table.time_micros, entities, table.get_column(field)
+            ):
+                if value is None:
+                    continue
+                if entity is None:
+                    entity = NO_ENTITY
+                if entity not in self.keys_ts:
+                    self.keys_ts[entity] = {}
+                if key not in self.keys_ts[entity]:
+                    self.keys_ts[entity][key] = {}
+                self.keys_ts[entity][key][
+                    time_micros / TimestampParser.MICROS_PER_SEC
+                ] = value
@@ -0,0 +1,139 @@
+# Copyright (c) 2011-present, Facebook, Inc.  All rights reserved.
+#  This source code is licensed under both the GPLv2 (found in the
+#  COPYING file in the root directory) and Apache 2.0 License
+#  (found in the LICENSE.Apache file in the root directory).
+
+from advisor.db_timeseries_parser import LogTimeSeriesData
+from advisor.timestamp_parser import TimestampParser
+import re
+
+
+class JobThroughputParser(LogTimeSeriesData):
+    # This data source parses the summaries that the flush and compaction jobs
+    # log when they finish, and exposes the throughput of the jobs as time
+    # series of the column families (the entities), with a value per job at
+    # the time it finished. The keys are '<job type>.L<output level>.<metric>'
+    # for example 'flush.L0.bytes_written' or 'compaction.L1.write_amplify'.
+    # The flush metrics are bytes_written, write_mb_per_sec and duration_sec;
+    # the duration of a flush is taken from the log of its start, and these
+    # two metrics are missing if that log was not scanned. The compaction
+    # metrics are bytes_read, bytes_written, read_mb_per_sec,
+    # write_mb_per_sec, read_write_amplify, write_amplify and duration_sec.
+    # Note: Rocksdb computes the MB/sec as bytes per microsecond.
+    KEY_PREFIX = ('flush.', 'compaction.')
+    FLUSH_STARTED_REGEX = re.compile(
+        r'\[JOB (\d+)\] Level-0 flush table #\d+: started'
+    )
+    FLUSH_FINISHED_REGEX = re.compile(
+        r'\[JOB (\d+)\] Level-0 flush table #\d+: (\d+) bytes OK'
+    )
+    COMPACTION_FINISHED_REGEX = re.compile(
+        r'compacted to: .*MB/sec: ([\d.]+) rd, ([\d.]+) wr, level (\d+), ' +
+        r'files in\(\d+, \d+\) out\(\d+\) MB in\(([\d.]+), ([\d.]+)\) ' +
+        r'out\(([\d.]+)\), read-write-amplify\(([\d.]+)\) ' +
+        r'write-amplify\(([\d.]+)\) OK'
+    )
+    BYTES_PER_MB = 1048576
+
+    def __init__(
+        self, logs_path_prefix, column_families, log_scanner=None,
+        start_time=None, end_time=None
+    ):
+        super().__init__(
+            logs_path_prefix, column_families, log_scanner, start_time,
+            end_time
+        )
+        # Dict[column_family, List[Tuple[time, key_prefix, Dict[metric,
+        # value]]]] of the jobs that finished
+        self.jobs = {}
+        # Dict[Tuple[column_family, job id], time] of the flushes started
+        self.flush_start_times = {}
+
+    def add_job(self, column_family, job_time, key_prefix, metrics):
+        if column_family not in self.jobs:
+            self.jobs[column_family] = []
+        self.jobs[column_family].append((job_time, key_prefix, metrics))
+
+    def process_flush_log(self, log, log_time):
+        match = self.FLUSH_STARTED_REGEX.search(log.get_message())
+        if match:
+            job = (log.get_column_family(), match.group(1))
+            self.flush_start_times[job] = log_time
+            return
+        match = self.FLUSH_FINISHED_REGEX.search(log.get_message())
+        if not match:
+            return
+        job = (log.get_column_family(), match.group(1))
+        metrics = {'bytes_written': float(match.group(2))}
+        start_time = self.flush_start_times.pop(job, None)
+        if start_time is not None:
+            duration = log_time - start_time
+            metrics['duration_sec'] = duration
+            if duration > 0:
+                metrics['write_mb_per_sec'] = (
+                    metrics['bytes_written'] / duration /
+                    TimestampParser.MICROS_PER_SEC
+                )
+        self.add_job(log.get_column_family(), log_time, 'flush.L0.', metrics)
+
+    def process_compaction_log(self, log, log_time):
+        match = self.COMPACTION_FINISHED_REGEX.search(log.get_message())
+        if not match:
+            return
+        read_rate, write_rate = float(match.group(1)), float(match.group(2))
+        bytes_read = (
+            (float(match.group(4)) + float(match.group(5))) * self.BYTES_PER_MB
+        )
+        bytes_written = float(match.group(6)) * self.BYTES_PER_MB
+        metrics = {
+            'bytes_read': bytes_read,
+            'bytes_written': bytes_written,
+            'read_mb_per_sec': read_rate,
+            'write_mb_per_sec': write_rate,
+            'read_write_amplify': float(match.group(7)),
+            'write_amplify': float(match.group(8))
+        }
+        # the rates are bytes per microsecond, so they give the duration
+        if read_rate > 0:
+            metrics['duration_sec'] = (
+                bytes_read / read_rate / TimestampParser.MICROS_PER_SEC
+            )
+        elif write_rate > 0:
+            metrics['duration_sec'] = (
+                bytes_written / write_rate / TimestampParser.MICROS_PER_SEC
+            )
+        self.add_job(
+            log.get_column_family(), log_time,
+            'compaction.L' + match.group(3) + '.', metrics
+        )
+
+    def process_log(self, log):
+        if log.message_contains('Level-0 flush table'):
+            self.process_flush_log(
+                log,
+                log.get_timestamp_micros() / TimestampParser.MICROS_PER_SEC
+            )
+        elif log.message_contains('compacted to:'):
+            self.process_compaction_log(
+                log,
+                log.get_timestamp_micros() / TimestampParser.MICROS_PER_SEC
+            )
+
+    def reset_logs(self):
+        self.jobs = {}
+        self.flush_start_times = {}
+
+    def build_timeseries(self, reqd_keys):
+        # keys_ts[column_family]['<job type>.L<level>.<metric>'][time] = value
+        self.keys_ts = {}
+        reqd_keys = set(reqd_keys)
+        for column_family, jobs in self.jobs.items():
+            self.keys_ts[column_family] = {}
+            for job_time, key_prefix, metrics in jobs:
+                for metric, value in metrics.items():
+                    key = key_prefix + metric
+                    if key not in reqd_keys:
+                        continue
+                    if key not in self.keys_ts[column_family]:
+                        self.keys_ts[column_family][key] = {}
+                    self.keys_ts[column_family][key][job_time] = value
@@ -4,11 +4,19 @@
 #  (found in the LICENSE.Apache file in the root directory).
 
 from abc import ABC, abstractmethod
-from calendar import timegm
+from advisor.timestamp_parser import TimestampParser
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
+from types import SimpleNamespace
+import bisect
 import glob
+import heapq
+import itertools
+import json
+import mmap
+import os
 import re
-import time
 
 
 NO_COL_FAMILY = 'DB_WIDE'
@@ -23,109 +31,1120 @@ class DataSource(ABC):
     def __init__(self, type):
         self.type = type
 
+    def register_conditions(self, conditions):
+        # This method is called for every data source before any of them is
+        # asked to check and trigger its conditions. Data sources that share
+        # a LogScanner use it to register themselves as consumers up front, so
+        # that the LOG files are read only once for all of them.
+        pass
+
     @abstractmethod
     def check_and_trigger_conditions(self, conditions):
         pass
 
 
 class Log:
+    # A Log is created either from a line of text or, by a LogScanner, from
+    # the offsets of a record in the raw bytes of a LOG file. In the latter
+    # case nothing is decoded up front: the time is sliced out of the bytes
+    # when it is first asked for, and the context, column family and message
+    # are decoded together when one of them is first asked for. The decoded
+    # fields are then cached. The __slots__ keep every Log object small, since
+    # the triggers of LogConditions can hold millions of them. A Log that is
+    # kept after the scan is detached from the buffer, so that it does not
+    # keep the map (and the file) of a whole LOG file open.
+    __slots__ = (
+        'buffer', 'start', 'end', 'column_family_index',
+        'time', 'context', 'message', 'column_family'
+    )
+
+    # The assumption is that a new log will start with a date printed in the
+    # below regex format.
+    DATE_REGEX = r'\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{6}'
+    DATE_LEN = len('2018/07/25-11:25:45.782710')
+    NEW_LOG_REGEX = re.compile(DATE_REGEX)
+    # match the beginning of a log in the raw bytes of a LOG file; searching
+    # for the newline before the date is much faster than a '^' anchor
+    NEW_LOG_BYTES_REGEX = re.compile(DATE_REGEX.encode())
+    NEXT_LOG_BYTES_REGEX = re.compile(b'\n' + DATE_REGEX.encode())
+
     @staticmethod
     def is_new_log(log_line):
-        # The assumption is that a new log will start with a date printed in
-        # the below regex format.
-        date_regex = '\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{6}'
-        return re.match(date_regex, log_line)
+        return Log.NEW_LOG_REGEX.match(log_line)
+
+    BRACKETED_TOKEN_REGEX = re.compile(r'\[([^\[\]]*)\]')
+    # Dict[substring, Tuple[normalized substring, longest word]] of the
+    # substrings given to message_contains()
+    SUBSTRING_FILTERS = {}
+
+    @staticmethod
+    def get_substring_filter(substring):
+        if substring not in Log.SUBSTRING_FILTERS:
+            words = substring.split()
+            normalized = re.sub(r'\s+', ' ', substring)
+            longest_word = max(words, key=len) if words else ''
+            Log.SUBSTRING_FILTERS[substring] = (normalized, longest_word)
+        return Log.SUBSTRING_FILTERS[substring]
+
+    @staticmethod
+    def get_column_family_index(column_families):
+        # Returns Dict[column_family_name, position in column_families]; the
+        # position decides which column family a log belongs to when its
+        # message mentions more than one of them. If column_families is
+        # already such a dictionary, it is returned as is, so that callers
+        # creating many Log objects can build it only once.
+        if isinstance(column_families, dict):
+            return column_families
+        return {col_fam: ix for ix, col_fam in enumerate(column_families)}
+
+    @classmethod
+    def from_record(cls, buffer, start, end, column_family_index):
+        # 'buffer' is any bytes-like object, for example the mmap of a LOG
+        # file, and the record is buffer[start:end]
+        log = cls.__new__(cls)
+        log.buffer = buffer
+        log.start = start
+        log.end = end
+        log.column_family_index = column_family_index
+        log.time = None
+        log.context = None
+        log.message = None
+        log.column_family = None
+        return log
 
     def __init__(self, log_line, column_families):
-        token_list = log_line.strip().split()
+        self.buffer = None
+        self.start = None
+        self.end = None
+        self.column_family_index = self.get_column_family_index(
+            column_families
+        )
+        self.parse_first_line(log_line)
+
+    def parse_first_line(self, log_line):
+        token_list = log_line.split(None, 2)
         self.time = token_list[0]
         self.context = token_list[1]
-        self.message = " ".join(token_list[2:])
+        self.message = token_list[2].strip() if len(token_list) > 2 else ''
+        # the whitespace between the words of the message is normalized to a
+        # single space, all other whitespace characters are non-printable
+        if '  ' in self.message or not self.message.isprintable():
+            self.message = " ".join(self.message.split())
         self.column_family = None
         # example log for 'default' column family:
         # "2018/07/25-17:29:05.176080 7f969de68700 [db/compaction_job.cc:1634]
         # [default] [JOB 3] Compacting 24@0 + 16@1 files to L1, score 6.00\n"
-        for col_fam in column_families:
-            search_for_str = '\[' + col_fam + '\]'
-            if re.search(search_for_str, self.message):
-                self.column_family = col_fam
-                break
+        # The bracketed tokens of the message ('db/compaction_job.cc:1634',
+        # 'default', 'JOB 3') are looked up among the known column families.
+        col_fam_index = self.column_family_index
+        col_fam_ix = None
+        for token in self.BRACKETED_TOKEN_REGEX.findall(self.message):
+            if token in col_fam_index:
+                if col_fam_ix is None or col_fam_index[token] < col_fam_ix:
+                    col_fam_ix = col_fam_index[token]
+                    self.column_family = token
         if not self.column_family:
             self.column_family = NO_COL_FAMILY
 
+    def decode(self):
+        if self.message is not None:
+            return
+        log_text = str(self.buffer[self.start:self.end], 'utf-8', 'replace')
+        first_line_end = log_text.find('\n')
+        if first_line_end == -1 or first_line_end == len(log_text) - 1:
+            self.parse_first_line(log_text)
+        else:
+            lines = log_text.split('\n')
+            if not lines[-1]:
+                lines.pop()
+            self.parse_first_line(lines[0])
+            # To account for logs split into multiple lines
+            self.append_lines(lines[1:])
+
+    def detach(self):
+        # decodes all the fields and drops the reference to the buffer
+        if self.buffer is None:
+            return
+        self.decode()
+        self.get_human_readable_time()
+        self.buffer = None
+
+    def message_contains(self, substring):
+        # This method checks if the message contains 'substring'. The
+        # whitespace between the words of a message is normalized to a single
+        # space, and so is every run of whitespace in 'substring', e.g.
+        # 'writes  because' matches 'writes because'. A log that has not been
+        # decoded yet is rejected without decoding it if the longest word of
+        # 'substring' is not in its raw bytes; otherwise it is decoded, so
+        # that the result is the same whether it was decoded or not.
+        normalized, longest_word = self.get_substring_filter(substring)
+        if self.message is None:
+            if self.buffer.find(
+                longest_word.encode(), self.start + self.DATE_LEN, self.end
+            ) == -1:
+                return False
+            self.decode()
+        return normalized in self.message
+
     def get_human_readable_time(self):
         # example from a log line: '2018/07/25-11:25:45.782710'
+        if self.time is None:
+            self.time = str(
+                self.buffer[self.start:self.start + self.DATE_LEN], 'ascii'
+            )
         return self.time
 
     def get_column_family(self):
+        self.decode()
         return self.column_family
 
     def get_context(self):
+        self.decode()
         return self.context
 
     def get_message(self):
+        self.decode()
         return self.message
 
     def append_message(self, remaining_log):
+        self.decode()
         self.message = self.message + '\n' + remaining_log.strip()
 
+    def append_lines(self, remaining_lines):
+        # appends all the remaining lines of a multi-line log in one go
+        self.decode()
+        self.message = '\n'.join(
+            [self.message] + [line.strip() for line in remaining_lines]
+        )
+
     def get_timestamp(self):
         # example: '2018/07/25-11:25:45.782710' will be converted to the GMT
         # Unix timestamp 1532517945 (note: this method assumes that self.time
         # is in GMT)
-        hr_time = self.time + 'GMT'
-        timestamp = timegm(time.strptime(hr_time, "%Y/%m/%d-%H:%M:%S.%f%Z"))
-        return timestamp
+        return TimestampParser.get_timestamp(self.get_human_readable_time())
+
+    def get_timestamp_micros(self):
+        # same as get_timestamp(), but the timestamp is in microseconds
+        return TimestampParser.get_timestamp_micros(
+            self.get_human_readable_time()
+        )
 
     def __repr__(self):
         return (
-            'time: ' + self.time + '; context: ' + self.context +
-            '; col_fam: ' + self.column_family +
-            '; message: ' + self.message
+            'time: ' + self.get_human_readable_time() +
+            '; context: ' + self.get_context() +
+            '; col_fam: ' + self.get_column_family() +
+            '; message: ' + self.get_message()
+        )
+
+
+class LogConditionMatcher:
+    # This class finds all the LogConditions whose regex matches a given log
+    # message. Every regex is compiled only once (case-insensitive) and two
+    # cheap filters are applied before it is searched for:
+    # - a regex that begins with a literal string can only match a message
+    #   that contains this literal, which is checked with a substring search;
+    # - the regexes that have no such literal are combined into one
+    #   alternation, so a message that matches none of them is rejected with a
+    #   single search.
+    # The conditions can be any objects with a 'regex' attribute, see
+    # from_regexes().
+    METACHARACTERS = '.^$*+?{}[]|()'
+    MIN_LITERAL_LEN = 3
+
+    @staticmethod
+    def get_literal_prefix(regex):
+        # example: the regex 'Stopping writes because we have \d+ immutable'
+        # has the literal prefix 'Stopping writes because we have '
+        if '|' in regex:
+            # a top-level alternation would make the prefix optional
+            return None
+        literal = ''
+        ix = 0
+        while ix < len(regex):
+            char = regex[ix]
+            if char == '\\':
+                if ix + 1 < len(regex) and not regex[ix + 1].isalnum():
+                    # escaped metacharacter, example: '\('
+                    literal += regex[ix + 1]
+                    ix += 2
+                    continue
+                break
+            if char in LogConditionMatcher.METACHARACTERS:
+                break
+            literal += char
+            ix += 1
+        # the last character of the literal is optional if it is followed by
+        # a quantifier, example: 'files?'
+        if ix < len(regex) and regex[ix] in '*?{':
+            literal = literal[:-1]
+        if len(literal) < LogConditionMatcher.MIN_LITERAL_LEN:
+            return None
+        if not literal.isascii():
+            return None
+        return literal.casefold()
+
+    def __init__(self, conditions):
+        # List[Tuple[literal_prefix, compiled_regex, LogCondition]]
+        self.compiled_conditions = []
+        unfiltered_regexes = []
+        for cond in conditions:
+            literal = self.get_literal_prefix(cond.regex)
+            self.compiled_conditions.append(
+                (literal, re.compile(cond.regex, re.IGNORECASE), cond)
+            )
+            if not literal:
+                unfiltered_regexes.append(cond.regex)
+        self.combined_regex = None
+        # regexes with back-references cannot be combined since the group
+        # numbers would change in the alternation
+        if (
+            len(unfiltered_regexes) > 1 and
+            not any(
+                re.search(r'\\[1-9]|\(\?P=', regex)
+                for regex in unfiltered_regexes
+            )
+        ):
+            try:
+                self.combined_regex = re.compile(
+                    '|'.join(
+                        '(?:' + regex + ')' for regex in unfiltered_regexes
+                    ),
+                    re.IGNORECASE
+                )
+            except re.error:
+                # some valid regexes cannot be combined, e.g. those with
+                # global flags like '(?i)' or with the same group names; the
+                # filter is then skipped
+                self.combined_regex = None
+
+    @staticmethod
+    def from_regexes(regexes):
+        # a matcher of plain regexes, e.g. in the worker processes of a scan
+        return LogConditionMatcher([
+            SimpleNamespace(regex=regex) for regex in regexes
+        ])
+
+    def matches_any(self, message):
+        # True if the regex of any of the conditions matches the message
+        folded_message = message.casefold()
+        unfiltered_may_match = None
+        for literal, regex, _ in self.compiled_conditions:
+            if literal:
+                if literal not in folded_message:
+                    continue
+            else:
+                if unfiltered_may_match is None:
+                    unfiltered_may_match = (
+                        not self.combined_regex or
+                        self.combined_regex.search(message)
+                    )
+                if not unfiltered_may_match:
+                    continue
+            if regex.search(message):
+                return True
+        return False
+
+    def get_matching_conditions(self, message):
+        folded_message = message.casefold()
+        unfiltered_may_match = (
+            not self.combined_regex or self.combined_regex.search(message)
+        )
+        matching_conditions = []
+        for literal, regex, cond in self.compiled_conditions:
+            if literal:
+                if literal not in folded_message:
+                    continue
+            elif not unfiltered_may_match:
+                continue
+            if regex.search(message):
+                matching_conditions.append(cond)
+        return matching_conditions
+
+
+class LogFileCursor:
+    # The position up to which a LOG file has been scanned. A LOG file is
+    # identified by its (device, inode) pair rather than by its name, because
+    # Rocksdb renames the LOG file to LOG.old.<timestamp> when it rotates it.
+    def __init__(self, file_name, file_id):
+        self.file_name = file_name
+        self.file_id = file_id
+        self.size = 0
+        self.offset = 0
+        # The bytes of the last record read from the file. This record is not
+        # handed to the consumers until the next record begins, since more of
+        # its lines might still be appended to the file.
+        self.partial_record = b''
+
+
+class LogTimeIndex:
+    # A sparse index from time to offsets in a LOG file, which is persisted
+    # in a hidden file next to the LOG file ('.LOG.tidx' for 'LOG'), so that
+    # the LogScanner's glob does not pick it up. For every BUCKET_SEC seconds
+    # of logs, the index stores the offset of the first record that reaches
+    # that time bucket. A scan for a time window can then seek straight to
+    # the records of the window. The index assumes that the records are
+    # appended in (roughly) increasing order of time, and it is extended
+    # incrementally as the LOG file grows.
+    VERSION = 1
+    BUCKET_SEC = 60
+
+    @staticmethod
+    def get_index_path(file_name):
+        dir_name, base_name = os.path.split(file_name)
+        return os.path.join(dir_name, '.' + base_name + '.tidx')
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.inode = None
+        # offset of the last record indexed, to continue indexing from
+        self.indexed_offset = 0
+        self.bucket_timestamps = []
+        self.bucket_offsets = []
+
+    def load(self):
+        try:
+            with open(self.get_index_path(self.file_name), 'r') as fp:
+                index = json.load(fp)
+        except (OSError, ValueError):
+            return
+        if (
+            index.get('version') != self.VERSION or
+            index.get('bucket_sec') != self.BUCKET_SEC
+        ):
+            return
+        self.inode = index['inode']
+        self.indexed_offset = index['indexed_offset']
+        self.bucket_timestamps = index['bucket_timestamps']
+        self.bucket_offsets = index['bucket_offsets']
+
+    def save(self):
+        index = {
+            'version': self.VERSION,
+            'bucket_sec': self.BUCKET_SEC,
+            'inode': self.inode,
+            'indexed_offset': self.indexed_offset,
+            'bucket_timestamps': self.bucket_timestamps,
+            'bucket_offsets': self.bucket_offsets
+        }
+        try:
+            with open(self.get_index_path(self.file_name), 'w') as fp:
+                json.dump(index, fp)
+        except OSError:
+            # the index is an optimization, the LOG directory may be read-only
+            pass
+
+    def update(self, log_map, inode):
+        # Indexes the records appended to the file since the last update and
+        # returns True if the index changed. The whole file is indexed again
+        # if it is not the file that was indexed before.
+        if (
+            self.inode != inode or
+            len(log_map) < self.indexed_offset or
+            not Log.NEW_LOG_BYTES_REGEX.match(log_map, self.indexed_offset)
+        ):
+            self.__init__(self.file_name)
+            self.inode = inode
+        last_offset = None
+        for offset in LogScanner.get_record_offsets(
+            log_map, self.indexed_offset, len(log_map)
+        ):
+            timestamp = (
+                LogScanner.get_record_timestamp(log_map, offset) //
+                TimestampParser.MICROS_PER_SEC
+            )
+            bucket_timestamp = timestamp - timestamp % self.BUCKET_SEC
+            if (
+                not self.bucket_timestamps or
+                bucket_timestamp > self.bucket_timestamps[-1]
+            ):
+                self.bucket_timestamps.append(bucket_timestamp)
+                self.bucket_offsets.append(offset)
+            last_offset = offset
+        if last_offset is None or last_offset == self.indexed_offset:
+            return False
+        self.indexed_offset = last_offset
+        return True
+
+    def get_offset_range(self, start_time, end_time, file_size):
+        # Returns the range of offsets in the file that holds all the records
+        # with timestamps in [start_time, end_time] (in seconds); it can hold
+        # some records outside of the window too.
+        start_offset = 0
+        end_offset = file_size
+        if start_time is not None:
+            ix = bisect.bisect_right(self.bucket_timestamps, start_time) - 1
+            if ix >= 0:
+                start_offset = self.bucket_offsets[ix]
+        if end_time is not None:
+            ix = bisect.bisect_right(self.bucket_timestamps, end_time)
+            if ix < len(self.bucket_offsets):
+                end_offset = self.bucket_offsets[ix]
+        return (start_offset, end_offset)
+
+
+class LogScanner:
+    # A LogScanner reads the Rocksdb LOG files with the given path prefix in a
+    # single streaming pass and hands every parsed Log object to each of its
+    # registered consumers. A consumer is any object that provides the method
+    # process_log(log), which returns True once the consumer needs no more
+    # logs; the scan stops as soon as none of its consumers needs more logs.
+    # A consumer that only needs the logs whose messages match some regexes
+    # (case-insensitive), like DatabaseLogs, also provides the method
+    # get_log_regexes(), and it is then only handed the logs that match one
+    # of them. Only the consumers registered since the last scan are served
+    # by a scan, so consumers that register together (see
+    # DataSource.register_conditions) share one read of the LOG files.
+    #
+    # The rotated LOG files (LOG.old.<timestamp>) are read too if
+    # include_rotated is set, and the files are read in the order of the
+    # timestamps of their records. The records of files whose time ranges
+    # overlap are merged into time order. If a time window [start_time,
+    # end_time] is given (in seconds, like Log.get_timestamp()), only the
+    # files that overlap it are read and only the logs within it are handed
+    # to the consumers; a LogTimeIndex is kept for every LOG file so as to
+    # seek straight to the window. The LOG files are split into records by a
+    # pool of 'num_workers' processes (by default, one per CPU), which also
+    # match the records against the regexes of the consumers, so that the
+    # records that match none of them are not decoded at all when no other
+    # consumer needs them; the Log objects are then created lazily in this
+    # process, where the consumers run. If a LogCache is given, the offsets
+    # and timestamps of the records of every LOG file, and the records that
+    # every regex matches, are cached, so that unchanged LOG files are not
+    # split nor matched again by later scans.
+    #
+    # In the incremental mode, the scanner keeps a LogFileCursor per LOG file
+    # and every scan only reads the bytes appended since the previous scan.
+    # The consumers are then expected to carry their results forward from one
+    # scan to the next.
+    MICROS_PER_SEC = TimestampParser.MICROS_PER_SEC
+    RECORDS_CACHE_KIND = 'records'
+    MATCHES_CACHE_KIND = 'matches'
+    # the last record of a file is searched for in this many bytes at its end
+    TAIL_LEN = 65536
+
+    def __init__(
+        self, logs_path_prefix, column_families, incremental=False,
+        include_rotated=False, start_time=None, end_time=None,
+        num_workers=None, log_cache=None
+    ):
+        self.logs_path_prefix = logs_path_prefix
+        self.column_families = column_families
+        # built once for all the Log objects created by this scanner
+        self.column_family_index = Log.get_column_family_index(
+            column_families
         )
+        self.incremental = incremental
+        self.include_rotated = include_rotated
+        self.start_time = start_time
+        self.end_time = end_time
+        if not num_workers:
+            num_workers = os.cpu_count() or 1
+        self.num_workers = num_workers
+        self.log_cache = log_cache
+        self.file_cursors = {}  # Dict[file_id, LogFileCursor]
+        self.pending_consumers = []
+
+    @staticmethod
+    def get_log_scanner(
+        log_scanner, logs_path_prefix, column_families, start_time, end_time,
+        log_cache=None, include_rotated=False
+    ):
+        # used by the data sources that read LOG files, to create a LogScanner
+        # for the time window [start_time, end_time] unless one is shared
+        if not log_scanner:
+            return LogScanner(
+                logs_path_prefix, column_families,
+                include_rotated=include_rotated, start_time=start_time,
+                end_time=end_time, log_cache=log_cache
+            )
+        if (
+            start_time is not None or end_time is not None or log_cache or
+            include_rotated
+        ):
+            raise ValueError(
+                'LogScanner: set the time window, the cache and ' +
+                'include_rotated on the shared LogScanner'
+            )
+        return log_scanner
+
+    def register(self, consumer):
+        if consumer not in self.pending_consumers:
+            self.pending_consumers.append(consumer)
+
+    def reset(self):
+        # the next scan will read all the LOG files from the beginning
+        self.file_cursors = {}
+
+    @staticmethod
+    def is_rotated_log_file(file_name):
+        return bool(re.search('old', file_name, re.IGNORECASE))
+
+    @staticmethod
+    def map_log_file(file_name):
+        # Returns a read-only mmap of the file, or None if the file is empty.
+        # The map stays valid after the file is closed, and it is unmapped once
+        # it is not referenced anymore.
+        with open(file_name, 'rb') as db_logs:
+            if os.fstat(db_logs.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(db_logs.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def get_record_offsets(log_map, start, end):
+        # yields the offsets at which the logs begin in log_map[start:end],
+        # where 'start' is expected to be at the beginning of a line
+        if Log.NEW_LOG_BYTES_REGEX.match(log_map, start, end):
+            yield start
+        for match in Log.NEXT_LOG_BYTES_REGEX.finditer(log_map, start, end):
+            yield match.start() + 1
+
+    @staticmethod
+    def get_record_timestamp(buffer, offset):
+        # the timestamp, in microseconds, of the record at 'offset'
+        return TimestampParser.get_timestamp_micros(
+            str(buffer[offset:offset + Log.DATE_LEN], 'ascii')
+        )
+
+    @staticmethod
+    def get_log_file_time_range(file_name):
+        # Returns the timestamps, in microseconds, of the first and the last
+        # records in the file or None if the file has no records. The last
+        # record is searched for only in the tail of the file, unless the
+        # last record is longer than the tail.
+        log_map = LogScanner.map_log_file(file_name)
+        if not log_map:
+            return None
+        first = next(
+            LogScanner.get_record_offsets(log_map, 0, len(log_map)), None
+        )
+        if first is None:
+            return None
+        # the tail must begin at the beginning of a line
+        tail_start = max(first, len(log_map) - LogScanner.TAIL_LEN)
+        tail_start = log_map.rfind(b'\n', 0, tail_start) + 1
+        last = None
+        for offset in LogScanner.get_record_offsets(
+            log_map, tail_start, len(log_map)
+        ):
+            last = offset
+        if last is None:
+            for offset in LogScanner.get_record_offsets(
+                log_map, first, len(log_map)
+            ):
+                last = offset
+        return (
+            LogScanner.get_record_timestamp(log_map, first),
+            LogScanner.get_record_timestamp(log_map, last)
+        )
+
+    @staticmethod
+    def get_cached_records(file_name, log_map, log_cache):
+        # Returns the offsets of all the records of the file, followed by the
+        # size of the file, and their timestamps from the LogCache; they are
+        # parsed and cached if the cache does not hold them for this version of
+        # the file.
+        records = log_cache.load(LogScanner.RECORDS_CACHE_KIND, [file_name])
+        if records is not None:
+            return records
+        offsets = array('q')
+        offsets.extend(LogScanner.get_record_offsets(log_map, 0, len(log_map)))
+        timestamps = array('q')
+        timestamps.extend(
+            LogScanner.get_record_timestamp(log_map, offset)
+            for offset in offsets
+        )
+        offsets.append(len(log_map))
+        # the file must not have grown since it was mapped
+        if os.stat(file_name).st_size == len(log_map):
+            log_cache.store(
+                LogScanner.RECORDS_CACHE_KIND, [file_name],
+                (offsets, timestamps)
+            )
+        return offsets, timestamps
+
+    @staticmethod
+    def match_records(log_map, offsets, regexes):
+        # returns a bytearray with a 1 for every record of log_map, between
+        # two consecutive 'offsets', whose message matches any of 'regexes'
+        matcher = LogConditionMatcher.from_regexes(regexes)
+        matches = bytearray(max(len(offsets) - 1, 0))
+        for ix in range(len(matches)):
+            log = Log.from_record(log_map, offsets[ix], offsets[ix + 1], {})
+            if matcher.matches_any(log.get_message()):
+                matches[ix] = 1
+        return matches
+
+    @staticmethod
+    def match_records_per_regex(log_map, offsets, regexes):
+        # returns a bytearray for every regex, with a 1 for every record of
+        # log_map, between two consecutive 'offsets', that the regex matches
+        matchers = [
+            LogConditionMatcher.from_regexes([regex]) for regex in regexes
+        ]
+        regex_matches = [
+            bytearray(max(len(offsets) - 1, 0)) for _ in regexes
+        ]
+        for ix in range(len(offsets) - 1):
+            message = Log.from_record(
+                log_map, offsets[ix], offsets[ix + 1], {}
+            ).get_message()
+            for matcher, matches in zip(matchers, regex_matches):
+                if matcher.matches_any(message):
+                    matches[ix] = 1
+        return regex_matches
+
+    @staticmethod
+    def get_cached_matches(file_name, log_map, offsets, regexes, log_cache):
+        # Returns a bytearray that flags the records of the file, between two
+        # consecutive cached 'offsets', that match any of 'regexes'. The
+        # matches of every regex are cached per file, like the records, so
+        # only the regexes that the cache does not hold for this version of
+        # the file are matched against it.
+        cached_matches = log_cache.load(
+            LogScanner.MATCHES_CACHE_KIND, [file_name]
+        ) or {}  # Dict[regex, bytearray]
+        new_regexes = [
+            regex for regex in regexes if regex not in cached_matches
+        ]
+        if new_regexes:
+            cached_matches.update(zip(
+                new_regexes,
+                LogScanner.match_records_per_regex(
+                    log_map, offsets, new_regexes
+                )
+            ))
+            # the file must not have grown since it was mapped
+            if os.stat(file_name).st_size == len(log_map):
+                log_cache.store(
+                    LogScanner.MATCHES_CACHE_KIND, [file_name], cached_matches
+                )
+        # the flags are 0 or 1, so the bytearrays are merged with a bitwise or
+        num_records = max(len(offsets) - 1, 0)
+        merged = 0
+        for regex in regexes:
+            merged |= int.from_bytes(cached_matches[regex], 'big')
+        return bytearray(merged.to_bytes(num_records, 'big'))
+
+    @staticmethod
+    def split_log_file(
+        file_name, with_timestamps, start_time=None, end_time=None,
+        log_cache=None, regexes=None
+    ):
+        # Returns the offsets at which the records of the file begin, followed
+        # by the offset at which the last record ends, if 'with_timestamps'
+        # is set then the timestamp, in microseconds, of every record, and if
+        # 'regexes' are given then a bytearray that flags the records that
+        # match any of them. If a time window is given, the file's
+        # LogTimeIndex is used to split only the part of the file that holds
+        # the window. If a LogCache is given, the records and their matches
+        # are taken from it. This method is run by the worker processes of the
+        # scan, so it returns compact arrays.
+        offsets = array('q')
+        timestamps = array('q')
+        matches = None
+        log_map = LogScanner.map_log_file(file_name)
+        if not log_map:
+            return offsets, timestamps, bytearray() if regexes else None
+        start = 0
+        end = len(log_map)
+        if start_time is not None or end_time is not None:
+            time_index = LogTimeIndex(file_name)
+            time_index.load()
+            if time_index.update(log_map, os.stat(file_name).st_ino):
+                time_index.save()
+            start, end = time_index.get_offset_range(
+                start_time, end_time, len(log_map)
+            )
+        if log_cache:
+            cached_offsets, cached_timestamps = LogScanner.get_cached_records(
+                file_name, log_map, log_cache
+            )
+            # 'end' is the offset of a record or the size of the file, both of
+            # which are in cached_offsets
+            first = bisect.bisect_left(cached_offsets, start)
+            last = bisect.bisect_left(cached_offsets, end)
+            offsets = cached_offsets[first:last + 1]
+            if with_timestamps:
+                timestamps = cached_timestamps[first:last]
+            if regexes:
+                matches = LogScanner.get_cached_matches(
+                    file_name, log_map, cached_offsets, regexes, log_cache
+                )[first:last]
+        else:
+            offsets.extend(LogScanner.get_record_offsets(log_map, start, end))
+            if with_timestamps:
+                timestamps.extend(
+                    LogScanner.get_record_timestamp(log_map, offset)
+                    for offset in offsets
+                )
+            offsets.append(end)
+            if regexes:
+                matches = LogScanner.match_records(log_map, offsets, regexes)
+        return offsets, timestamps, matches
+
+    def has_time_window(self):
+        return self.start_time is not None or self.end_time is not None
+
+    def overlaps_time_window(self, first_timestamp, last_timestamp):
+        # the timestamps are in microseconds, the time window in seconds
+        if (
+            self.start_time is not None and
+            last_timestamp < self.start_time * self.MICROS_PER_SEC
+        ):
+            return False
+        if (
+            self.end_time is not None and
+            first_timestamp >= (self.end_time + 1) * self.MICROS_PER_SEC
+        ):
+            return False
+        return True
+
+    def get_log_files(self):
+        # Returns List[Tuple[first_timestamp, last_timestamp, file_name]] of
+        # the LOG files to be read, ordered by the timestamps of their first
+        # records.
+        log_files = []
+        for file_name in glob.glob(self.logs_path_prefix + '*'):
+            # TODO(poojam23): find a way to distinguish between log files
+            # - generated in the current experiment but are labeled 'old'
+            # because they LOGs exceeded the file size limit  AND
+            # - generated in some previous experiment that are also labeled
+            # 'old' and were not deleted for some reason
+            if (
+                self.is_rotated_log_file(file_name) and
+                not self.include_rotated
+            ):
+                continue
+            time_range = self.get_log_file_time_range(file_name)
+            if not time_range or not self.overlaps_time_window(*time_range):
+                continue
+            log_files.append((time_range[0], time_range[1], file_name))
+        log_files.sort()
+        return log_files
+
+    def get_log_file_cursors(self):
+        # Returns List[Tuple[LogFileCursor, is_rotated]], with the rotated
+        # files first, since their records are older than those of the live
+        # LOG file.
+        file_cursors = {}
+        for file_name in glob.glob(self.logs_path_prefix + '*'):
+            file_stat = os.stat(file_name)
+            file_id = (file_stat.st_dev, file_stat.st_ino)
+            is_rotated = self.is_rotated_log_file(file_name)
+            cursor = self.file_cursors.get(file_id)
+            if not cursor or file_stat.st_size < cursor.offset:
+                # Unless include_rotated is set, a rotated file is only read
+                # if it was scanned as the live LOG file before, so as to read
+                # the remainder of its records.
+                if is_rotated and not self.include_rotated:
+                    continue
+                cursor = LogFileCursor(file_name, file_id)
+            cursor.file_name = file_name
+            cursor.size = file_stat.st_size
+            file_cursors[file_id] = (cursor, is_rotated)
+        # forget the cursors of the files that do not exist anymore
+        self.file_cursors = {
+            file_id: cursor for file_id, (cursor, _) in file_cursors.items()
+        }
+        return sorted(
+            file_cursors.values(),
+            key=lambda pair: (not pair[1], pair[0].file_name)
+        )
+
+    def process_record(
+        self, buffer, start, end, consumers, other_consumers=None,
+        matches=True
+    ):
+        # The record buffer[start:end] is decoded only if a consumer needs it.
+        # If it does not match the regexes of the consumers, it is only handed
+        # to the 'other_consumers', which need all the logs. The consumers
+        # that need no more logs are removed from both lists.
+        receivers = consumers if matches else other_consumers
+        if not receivers:
+            return
+        if self.has_time_window():
+            timestamp = self.get_record_timestamp(buffer, start)
+            if not self.overlaps_time_window(timestamp, timestamp):
+                return
+        new_log = Log.from_record(buffer, start, end, self.column_family_index)
+        done_consumers = [
+            consumer for consumer in receivers if consumer.process_log(new_log)
+        ]
+        for consumer in done_consumers:
+            consumers.remove(consumer)
+            if other_consumers and consumer in other_consumers:
+                other_consumers.remove(consumer)
+
+    def scan_file(self, cursor, is_complete, consumers):
+        # Memory-maps the file and splits the bytes after the cursor's offset
+        # into records, by searching for the timestamp that begins every
+        # record; each record is handed over as offsets into the map.
+        # If the file is not complete, i.e. it might still be appended to,
+        # then a partially written last line is left for the next scan and the
+        # last record is held back in the cursor.
+        log_map = None
+        if cursor.size > cursor.offset:
+            log_map = self.map_log_file(cursor.file_name)
+        if log_map:
+            end = len(log_map)
+            if not is_complete:
+                end = max(
+                    log_map.rfind(b'\n', cursor.offset) + 1, cursor.offset
+                )
+            record_start = None
+            for offset in self.get_record_offsets(
+                log_map, cursor.offset, end
+            ):
+                if record_start is not None:
+                    self.process_record(
+                        log_map, record_start, offset, consumers
+                    )
+                elif cursor.partial_record:
+                    # the bytes before the first record are the remaining
+                    # lines of the record held back by the previous scan
+                    record = (
+                        cursor.partial_record + log_map[cursor.offset:offset]
+                    )
+                    self.process_record(record, 0, len(record), consumers)
+                record_start = offset
+            if record_start is not None:
+                cursor.partial_record = log_map[record_start:end]
+            elif cursor.partial_record:
+                cursor.partial_record += log_map[cursor.offset:end]
+            cursor.offset = end
+        # Check for the last log in the file.
+        if is_complete and cursor.partial_record:
+            record = cursor.partial_record
+            self.process_record(record, 0, len(record), consumers)
+            cursor.partial_record = b''
+
+    @staticmethod
+    def get_file_records(file_ix, offsets, timestamps, matches, only_matches):
+        # yields Tuple[timestamp, file_ix, start, end, matches] for every
+        # record, or for the records that match the regexes of the consumers
+        # if 'only_matches' is set
+        for ix in range(len(offsets) - 1):
+            record_matches = matches is None or matches[ix]
+            if only_matches and not record_matches:
+                continue
+            timestamp = timestamps[ix] if timestamps else 0
+            yield (
+                timestamp, file_ix, offsets[ix], offsets[ix + 1],
+                record_matches
+            )
+
+    @staticmethod
+    def get_consumer_regexes(consumers):
+        # returns the regexes of the consumers that provide them, and the
+        # consumers that need all the logs
+        regexes = []
+        other_consumers = []
+        for consumer in consumers:
+            if hasattr(consumer, 'get_log_regexes'):
+                for regex in consumer.get_log_regexes():
+                    if regex not in regexes:
+                        regexes.append(regex)
+            else:
+                other_consumers.append(consumer)
+        return regexes, other_consumers
+
+    def scan_log_files(self, consumers):
+        log_files = self.get_log_files()
+        file_names = [file_name for _, _, file_name in log_files]
+        # the records of the files need to be merged by their timestamps only
+        # if the time range of some file overlaps that of an earlier file
+        overlapping = False
+        max_last_timestamp = None
+        for first_timestamp, last_timestamp, _ in log_files:
+            if max_last_timestamp is not None:
+                if first_timestamp < max_last_timestamp:
+                    overlapping = True
+            max_last_timestamp = max(max_last_timestamp or 0, last_timestamp)
+        regexes, other_consumers = self.get_consumer_regexes(consumers)
+        use_pool = self.num_workers > 1 and len(file_names) > 1
+        # The records are matched against the regexes up front only by the
+        # workers of the pool, or if the matches are cached; otherwise
+        # matching all the records first would defeat the early exit of the
+        # consumers, which match them anyway.
+        if (
+            not (use_pool or self.log_cache) or
+            len(other_consumers) == len(consumers)
+        ):
+            regexes = None
+        split_args = [
+            file_names,
+            [overlapping] * len(file_names),
+            [self.start_time] * len(file_names),
+            [self.end_time] * len(file_names),
+            [self.log_cache] * len(file_names),
+            [regexes] * len(file_names)
+        ]
+        if use_pool:
+            with ProcessPoolExecutor(
+                max_workers=min(self.num_workers, len(file_names))
+            ) as executor:
+                file_splits = list(
+                    executor.map(self.split_log_file, *split_args)
+                )
+        else:
+            file_splits = list(map(self.split_log_file, *split_args))
+        log_maps = [self.map_log_file(file_name) for file_name in file_names]
+        file_records = [
+            self.get_file_records(
+                file_ix, offsets, timestamps, matches, not other_consumers
+            )
+            for file_ix, (offsets, timestamps, matches)
+            in enumerate(file_splits)
+        ]
+        if overlapping:
+            records = heapq.merge(*file_records)
+        else:
+            records = itertools.chain(*file_records)
+        for _, file_ix, start, end, matches in records:
+            self.process_record(
+                log_maps[file_ix], start, end, consumers, other_consumers,
+                matches
+            )
+            if not consumers:
+                break
+
+    def scan(self):
+        if not self.pending_consumers:
+            return
+        consumers = self.pending_consumers
+        self.pending_consumers = []
+        if not self.incremental:
+            self.scan_log_files(consumers)
+            return
+        # the cursors are advanced to the end of the files even if the
+        # consumers need no more logs, so that the next scan reads only the
+        # logs appended after this scan
+        for cursor, is_rotated in self.get_log_file_cursors():
+            # a rotated LOG file is not written to anymore
+            self.scan_file(cursor, is_rotated, consumers)
 
 
 class DatabaseLogs(DataSource):
-    def __init__(self, logs_path_prefix, column_families):
+    # Most LogConditions only need to know whether their regex matched a log
+    # of a column family, so by default a condition is not matched against
+    # any more logs once it is triggered for all the column families (or for
+    # NO_COL_FAMILY, which stands for all of them), and DatabaseLogs stops
+    # consuming logs once all its conditions are triggered. If full_evidence
+    # is set, all the logs that match the conditions are gathered instead.
+    def __init__(
+        self, logs_path_prefix, column_families, log_scanner=None,
+        start_time=None, end_time=None, log_cache=None, full_evidence=False,
+        include_rotated=False
+    ):
         super().__init__(DataSource.Type.LOG)
         self.logs_path_prefix = logs_path_prefix
         self.column_families = column_families
+        # the LogScanner can be shared with other data sources that read the
+        # same LOG files, for example LogStatsParser; the time window
+        # [start_time, end_time], the LogCache and include_rotated are then
+        # set on the shared LogScanner
+        self.log_scanner = LogScanner.get_log_scanner(
+            log_scanner, logs_path_prefix, column_families, start_time,
+            end_time, log_cache, include_rotated
+        )
+        self.full_evidence = full_evidence
+        self.conditions = None
+        # the conditions that are still matched against the logs
+        self.pending_conditions = None
+        self.condition_matcher = None
+        self.awaiting_scan = False
+        # Dict[Tuple[condition_name, regex], trigger], used to carry the
+        # triggers forward across scans of an incremental LogScanner, even if
+        # the conditions are reloaded in between
+        self.log_triggers = {}
 
     def trigger_conditions_for_log(self, conditions, log):
         # For a LogCondition object, trigger is:
         # Dict[column_family_name, List[Log]]. This explains why the condition
         # was triggered and for which column families.
+        log.detach()
         for cond in conditions:
-            if re.search(cond.regex, log.get_message(), re.IGNORECASE):
-                trigger = cond.get_trigger()
-                if not trigger:
-                    trigger = {}
-                if log.get_column_family() not in trigger:
-                    trigger[log.get_column_family()] = []
-                trigger[log.get_column_family()].append(log)
-                cond.set_trigger(trigger)
+            trigger = cond.get_trigger()
+            if not trigger:
+                trigger = {}
+            if log.get_column_family() not in trigger:
+                trigger[log.get_column_family()] = []
+            trigger[log.get_column_family()].append(log)
+            cond.set_trigger(trigger)
+
+    def is_condition_satisfied(self, cond):
+        # True if the condition is triggered for all the column families,
+        # i.e. more matching logs cannot change which rules it triggers
+        trigger = cond.get_trigger()
+        if not trigger:
+            return False
+        if NO_COL_FAMILY in trigger:
+            return True
+        return all(
+            column_family in trigger for column_family in self.column_families
+        )
+
+    def set_pending_conditions(self, conditions):
+        self.pending_conditions = conditions
+        # the regexes are compiled once for all the logs that will be scanned
+        self.condition_matcher = LogConditionMatcher(conditions)
+
+    def get_log_regexes(self):
+        # the LogScanner hands this data source only the logs that match the
+        # regexes of its pending conditions
+        return [cond.regex for cond in self.pending_conditions or []]
+
+    def process_log(self, log):
+        # returns True if there are no more conditions to match the logs with
+        if not self.pending_conditions:
+            return True
+        matching_conditions = self.condition_matcher.get_matching_conditions(
+            log.get_message()
+        )
+        if not matching_conditions:
+            return False
+        self.trigger_conditions_for_log(matching_conditions, log)
+        if self.full_evidence:
+            return False
+        if any(self.is_condition_satisfied(c) for c in matching_conditions):
+            self.set_pending_conditions([
+                cond
+                for cond in self.pending_conditions
+                if not self.is_condition_satisfied(cond)
+            ])
+        return not self.pending_conditions
+
+    def register_conditions(self, conditions):
+        self.conditions = conditions
+        if self.log_scanner.incremental:
+            for cond in conditions:
+                if (cond.name, cond.regex) in self.log_triggers:
+                    if not cond.get_trigger():
+                        cond.set_trigger(
+                            self.log_triggers[(cond.name, cond.regex)]
+                        )
+        if self.full_evidence:
+            self.set_pending_conditions(conditions)
+        else:
+            self.set_pending_conditions([
+                cond
+                for cond in conditions
+                if not self.is_condition_satisfied(cond)
+            ])
+        self.log_scanner.register(self)
+        self.awaiting_scan = True
 
     def check_and_trigger_conditions(self, conditions):
-        for file_name in glob.glob(self.logs_path_prefix + '*'):
-            # TODO(poojam23): find a way to distinguish between log files
-            # - generated in the current experiment but are labeled 'old'
-            # because they LOGs exceeded the file size limit  AND
-            # - generated in some previous experiment that are also labeled
-            # 'old' and were not deleted for some reason
-            if re.search('old', file_name, re.IGNORECASE):
-                continue
-            with open(file_name, 'r') as db_logs:
-                new_log = None
-                for line in db_logs:
-                    if Log.is_new_log(line):
-                        if new_log:
-                            self.trigger_conditions_for_log(
-                                conditions, new_log
-                            )
-                        new_log = Log(line, self.column_families)
-                    else:
-                        # To account for logs split into multiple lines
-                        new_log.append_message(line)
-            # Check for the last log in the file.
-            if new_log:
-                self.trigger_conditions_for_log(conditions, new_log)
+        if conditions != self.conditions or not self.awaiting_scan:
+            self.register_conditions(conditions)
+        # if the scanner has already been run for the consumers registered
+        # along with this one, this is a no-op
+        self.log_scanner.scan()
+        self.awaiting_scan = False
+        if self.log_scanner.incremental:
+            for cond in conditions:
+                if cond.get_trigger():
+                    self.log_triggers[(cond.name, cond.regex)] = (
+                        cond.get_trigger()
+                    )
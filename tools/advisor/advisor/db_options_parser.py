@@ -121,6 +121,8 @@ class DatabaseOptions(DataSource):
         # Dict[section_type, Dict[section_name, Dict[option_name, value]]]
         self.options_dict = None
         self.column_families = None
+        # see get_expression_functions()
+        self.expression_functions = None
         # Load the options from the given file to a dictionary.
         self.load_from_source(rocksdb_options)
         # Setup the miscellaneous options expected to be List[str], where each
@@ -284,8 +286,54 @@ class DatabaseOptions(DataSource):
                 fp.write('\n')
         return file_path
 
+    @staticmethod
+    def memoize_conversion(convert):
+        # returns 'convert' (e.g. int) memoized by the values converted, so
+        # that an option value is parsed once however many conditions and
+        # column families it is evaluated for; the errors are not memoized
+        converted = {}
+
+        def convert_value(*values):
+            try:
+                return converted[values]
+            except KeyError:
+                converted[values] = convert(*values)
+                return converted[values]
+            except TypeError:  # unhashable value, e.g. a list
+                return convert(*values)
+        return convert_value
+
+    def get_expression_functions(self):
+        # the OptionCondition.FUNCTIONS memoized over the option values; they
+        # are memoized by value, so they stay valid when the options are
+        # loaded or updated again
+        if self.expression_functions is None:
+            self.expression_functions = {
+                name: self.memoize_conversion(function)
+                for name, function in OptionCondition.FUNCTIONS.items()
+            }
+        return self.expression_functions
+
+    @staticmethod
+    def copy_option_values(options):
+        # the values are strings or numbers, except for the few list-valued
+        # options, which are copied so that the trigger does not change along
+        # with the options
+        return [
+            value if isinstance(value, (str, int, float)) or value is None
+            else copy.deepcopy(value)
+            for value in options
+        ]
+
     def check_and_trigger_conditions(self, conditions):
+        functions = self.get_expression_functions()
         for cond in conditions:
+            try:
+                # the expression is parsed and compiled once per condition
+                expression = cond.get_compiled_expression()
+            except ValueError as e:
+                print('WARNING(DatabaseOptions) check_and_trigger: ' + str(e))
+                continue
             reqd_options_dict = self.get_options(cond.options)
             # This contains the indices of options that are specific to some
             # column family and are not database-wide options.
@@ -314,7 +362,7 @@ class DatabaseOptions(DataSource):
             # if all the options are database-wide options
             if not incomplete_option_ix:
                 try:
-                    if eval(cond.eval_expr):
+                    if expression.evaluate(options, functions):
                         cond.set_trigger({NO_COL_FAMILY: options})
                 except Exception as e:
                     print(
@@ -323,27 +371,28 @@ class DatabaseOptions(DataSource):
                 continue
 
             # for all the options that are not database-wide, we look for their
-            # values specific to column families
+            # values specific to column families, and the expression is
+            # evaluated for all the column families in one pass
+            col_fam_values = [
+                (ix, reqd_options_dict[cond.options[ix]])
+                for ix in incomplete_option_ix
+            ]
             col_fam_options_dict = {}
             for col_fam in self.column_families:
-                present = True
-                for ix in incomplete_option_ix:
-                    option = cond.options[ix]
-                    if col_fam not in reqd_options_dict[option]:
-                        present = False
-                        break
-                    options[ix] = reqd_options_dict[option][col_fam]
-                if present:
-                    try:
-                        if eval(cond.eval_expr):
-                            col_fam_options_dict[col_fam] = (
-                                copy.deepcopy(options)
-                            )
-                    except Exception as e:
-                        print(
-                            'WARNING(DatabaseOptions) check_and_trigger: ' +
-                            str(e)
+                if any(col_fam not in values for _, values in col_fam_values):
+                    continue
+                for ix, values in col_fam_values:
+                    options[ix] = values[col_fam]
+                try:
+                    if expression.evaluate(options, functions):
+                        col_fam_options_dict[col_fam] = (
+                            self.copy_option_values(options)
                         )
+                except Exception as e:
+                    print(
+                        'WARNING(DatabaseOptions) check_and_trigger: ' +
+                        str(e)
+                    )
             # Trigger for an OptionCondition object is of the form:
             # Dict[col_fam_name: List[option_value]]
             # where col_fam_name is the name of a column family for which
@@ -3,26 +3,84 @@
 #  COPYING file in the root directory) and Apache 2.0 License
 #  (found in the LICENSE.Apache file in the root directory).
 
-from advisor.db_log_parser import Log
-from advisor.db_timeseries_parser import TimeSeriesData, NO_ENTITY
+from advisor.db_log_parser import LogScanner
+from advisor.db_timeseries_parser import (
+    TimeSeries, TimeSeriesData, TimeSeriesSummary, NO_ENTITY
+)
 from advisor.rule_parser import Condition, TimeSeriesCondition
+from array import array
+import bisect
 import copy
-import glob
 import re
 import subprocess
 import time
 
 
 class LogStatsParser(TimeSeriesData):
+    # Besides the 'STATISTICS:' dumps, the LogStatsParser parses the periodic
+    # '** DB Stats **' dumps into database wide (NO_ENTITY) time series, with
+    # keys like 'db_stats.cumulative.stall_percent' or
+    # 'db_stats.interval.ingest_mb_per_sec', and the '** Compaction Stats
+    # [<column family>] **' tables into time series of the column families,
+    # with the keys '<level>.<column>', like 'l1.w-amp' or 'sum.comp(sec)'.
+    #
+    # Most of these stats, e.g. the tickers' COUNTs, are cumulative since the
+    # database was opened. For such a stat, the key '<stat>.delta' gives its
+    # increase over every interval between two dumps and '<stat>.rate' gives
+    # that increase per second. The counters are reset when the database is
+    # restarted, which is detected from the 'RocksDB version' banner logged
+    # at startup or else from a drop in the value of the counter.
+    #
+    # The stats of a histogram are '<histogram>.p<percentile>', and the
+    # cumulative '<histogram>.count' and '<histogram>.sum'. The key
+    # '<histogram>.avg' gives the average of the samples of every interval
+    # between two dumps (the increase of the sum over the increase of the
+    # count). The percentiles and averages are gauges, they have no delta or
+    # rate. The 'avg' and 'stddev' aggregations of the averages are weighted
+    # by the number of samples of every interval rather than being those of
+    # the plain dumps. The percentiles are cumulative since the database was
+    # opened, so the 'avg' of a percentile is its latest value, which is the
+    # percentile of all the samples of the histogram.
     STATS = 'STATISTICS:'
+    RESTART = 'RocksDB version'
+    COUNTER_SUFFIXES = ('.delta', '.rate')
+    HISTOGRAM_STAT_REGEX = re.compile(r'\.(p\d+(\.\d+)?|avg)$')
+    HISTOGRAM_AVG = '.avg'
+    HISTOGRAM_COUNT = '.count'
+    HISTOGRAM_SUM = '.sum'
+    STATS_CACHE_KIND = 'stats'
+    # a substring of both '** DB Stats **' and '** Compaction Stats [cf] **'
+    STATS_DUMP = ' Stats '
+    DB_STATS = '** DB Stats **'
+    COMPACTION_STATS_REGEX = re.compile(r'\*\* Compaction Stats \[(.*)\] \*\*')
+    DB_STATS_WRITES_REGEX = re.compile(
+        r'(Cumulative|Interval) writes: (\S+) writes, (\S+) keys, (\S+) ' +
+        r'commit groups, (\S+) writes per commit group, ingest: (\S+ \w+), ' +
+        r'(\S+) MB/s'
+    )
+    DB_STATS_WAL_REGEX = re.compile(
+        r'(Cumulative|Interval) WAL: (\S+) writes, (\S+) syncs, (\S+) ' +
+        r'writes per sync, written: (\S+ \w+), (\S+) MB/s'
+    )
+    DB_STATS_STALL_REGEX = re.compile(
+        r'(Cumulative|Interval) stall: (\d+):(\d+):([\d.]+) H:M:S, ' +
+        r'([\d.]+) percent'
+    )
+    # the suffixes of the counts and the units of the sizes in the dumps
+    COUNT_SUFFIXES = {'K': 1e3, 'M': 1e6, 'G': 1e9, 'T': 1e12}
+    SIZE_UNITS = {
+        'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4
+    }
 
     @staticmethod
     def parse_log_line_for_stats(log_line):
         # Example stat line (from LOG file):
-        # "rocksdb.db.get.micros P50 : 8.4 P95 : 21.8 P99 : 33.9 P100 : 92.0\n"
+        # "rocksdb.db.get.micros P50 : 8.4 P95 : 21.8 P99 : 33.9 P100 : 92.0
+        # COUNT : 120 SUM : 1500\n"
         token_list = log_line.strip().split()
         # token_list = ['rocksdb.db.get.micros', 'P50', ':', '8.4', 'P95', ':',
-        # '21.8', 'P99', ':', '33.9', 'P100', ':', '92.0']
+        # '21.8', 'P99', ':', '33.9', 'P100', ':', '92.0', 'COUNT', ':', '120',
+        # 'SUM', ':', '1500']
         stat_prefix = token_list[0] + '.'  # 'rocksdb.db.get.micros.'
         stat_values = [
             token
@@ -30,7 +88,7 @@ class LogStatsParser(TimeSeriesData):
             if token != ':'
         ]
         # stat_values = ['P50', '8.4', 'P95', '21.8', 'P99', '33.9', 'P100',
-        # '92.0']
+        # '92.0', 'COUNT', '120', 'SUM', '1500']
         stat_dict = {}
         for ix, metric in enumerate(stat_values):
             if ix % 2 == 0:
@@ -40,14 +98,161 @@ class LogStatsParser(TimeSeriesData):
                 stat_dict[stat_name] = float(metric)
         # stat_dict = {'rocksdb.db.get.micros.p50': 8.4,
         # 'rocksdb.db.get.micros.p95': 21.8, 'rocksdb.db.get.micros.p99': 33.9,
-        # 'rocksdb.db.get.micros.p100': 92.0}
+        # 'rocksdb.db.get.micros.p100': 92.0, 'rocksdb.db.get.micros.count':
+        # 120, 'rocksdb.db.get.micros.sum': 1500}
         return stat_dict
 
-    def __init__(self, logs_path_prefix, stats_freq_sec):
+    def __init__(
+        self, logs_path_prefix, stats_freq_sec, log_scanner=None,
+        start_time=None, end_time=None, log_cache=None, include_rotated=False
+    ):
         super().__init__()
         self.logs_file_prefix = logs_path_prefix
         self.stats_freq_sec = stats_freq_sec
         self.duration_sec = 60
+        # the LogScanner can be shared with other data sources that read the
+        # same LOG files, for example DatabaseLogs; the time window
+        # [start_time, end_time], the LogCache and include_rotated are then
+        # set on the shared LogScanner
+        self.log_scanner = LogScanner.get_log_scanner(
+            log_scanner, logs_path_prefix, [], start_time, end_time,
+            log_cache, include_rotated
+        )
+        self.reqd_stats = None
+        # the stats parsed out of the dumps for the reqd_stats, where a
+        # '<stat>.delta' or '<stat>.rate' requires the '<stat>'
+        self.parsed_stats = None
+        # the stat prefixes of the parsed_stats, see get_stat_prefixes()
+        self.stat_prefixes = None
+        # the timestamps at which the database was (re)started
+        self.restart_times = []
+        self.awaiting_scan = False
+        # the LOG files whose stats are to be cached after the scan
+        self.files_to_cache = None
+
+    @staticmethod
+    def parse_count(token):
+        # example: '1000K' will be converted to 1000000.0
+        if token[-1:] in LogStatsParser.COUNT_SUFFIXES:
+            return float(token[:-1]) * LogStatsParser.COUNT_SUFFIXES[token[-1]]
+        return float(token)
+
+    @staticmethod
+    def parse_size(size):
+        # example: '59.57 MB' will be converted to 62464491.52 bytes
+        value, unit = size.split()
+        return float(value) * LogStatsParser.SIZE_UNITS[unit]
+
+    @staticmethod
+    def parse_db_stats(lines):
+        # Example DB Stats lines (from LOG file):
+        # "Cumulative writes: 1000K writes, 1000K keys, 1000K commit groups,
+        # 1.0 writes per commit group, ingest: 0.12 GB, 2.05 MB/s"
+        # "Cumulative WAL: 1000K writes, 0 syncs, 1000000.00 writes per sync,
+        # written: 0.12 GB, 2.05 MB/s"
+        # "Cumulative stall: 00:00:1.500 H:M:S, 2.5 percent"
+        # the same lines are dumped for the 'Interval' since the last dump;
+        # returns Dict['db_stats.<cumulative|interval>.<field>', value]
+        stats = {}
+        for line in lines:
+            match = LogStatsParser.DB_STATS_WRITES_REGEX.search(line)
+            if match:
+                prefix = 'db_stats.' + match.group(1).lower() + '.'
+                stats[prefix + 'writes'] = (
+                    LogStatsParser.parse_count(match.group(2))
+                )
+                stats[prefix + 'keys'] = (
+                    LogStatsParser.parse_count(match.group(3))
+                )
+                stats[prefix + 'commit_groups'] = (
+                    LogStatsParser.parse_count(match.group(4))
+                )
+                stats[prefix + 'writes_per_commit_group'] = (
+                    float(match.group(5))
+                )
+                stats[prefix + 'ingest_bytes'] = (
+                    LogStatsParser.parse_size(match.group(6))
+                )
+                stats[prefix + 'ingest_mb_per_sec'] = float(match.group(7))
+                continue
+            match = LogStatsParser.DB_STATS_WAL_REGEX.search(line)
+            if match:
+                prefix = 'db_stats.' + match.group(1).lower() + '.'
+                stats[prefix + 'wal_writes'] = (
+                    LogStatsParser.parse_count(match.group(2))
+                )
+                stats[prefix + 'wal_syncs'] = (
+                    LogStatsParser.parse_count(match.group(3))
+                )
+                stats[prefix + 'wal_writes_per_sync'] = float(match.group(4))
+                stats[prefix + 'wal_written_bytes'] = (
+                    LogStatsParser.parse_size(match.group(5))
+                )
+                stats[prefix + 'wal_mb_per_sec'] = float(match.group(6))
+                continue
+            match = LogStatsParser.DB_STATS_STALL_REGEX.search(line)
+            if match:
+                prefix = 'db_stats.' + match.group(1).lower() + '.'
+                stats[prefix + 'stall_sec'] = (
+                    int(match.group(2)) * 3600 + int(match.group(3)) * 60 +
+                    float(match.group(4))
+                )
+                stats[prefix + 'stall_percent'] = float(match.group(5))
+        return stats
+
+    @staticmethod
+    def parse_compaction_stats(lines):
+        # Example Compaction Stats table (from LOG file):
+        # "** Compaction Stats [default] **"
+        # "Level    Files   Size     Score Read(GB)  Rn(GB) ... W-Amp ..."
+        # "--------------------------------------------------- ... ----"
+        # "  L0      2/0   59.57 MB   0.5      0.0     0.0 ...   1.0 ..."
+        # " Sum      2/0   59.57 MB   0.0      0.0     0.0 ...   1.0 ..."
+        # returns Dict[column_family, Dict['<level>.<column>', value]], for
+        # example {'default': {'l0.files': 2.0, 'l0.size': 62464491.52,
+        # 'l0.score': 0.5, ..., 'sum.w-amp': 1.0, ...}}; the 'Files' column
+        # 'a/b' is the number of files and that of files being compacted
+        stats = {}
+        column_family = None
+        columns = None
+        for line in lines:
+            match = LogStatsParser.COMPACTION_STATS_REGEX.search(line)
+            if match:
+                column_family = match.group(1)
+                if column_family not in stats:
+                    stats[column_family] = {}
+                columns = None
+                continue
+            if column_family is None:
+                continue
+            tokens = line.split()
+            if not tokens or line.startswith('---'):
+                continue
+            if columns is None:
+                # the header of the table, e.g. 'Level Files Size Score ...'
+                columns = [column.lower() for column in tokens]
+                continue
+            if '/' not in tokens[1] or len(tokens) != len(columns) + 1:
+                # the table has ended
+                column_family = None
+                continue
+            try:
+                prefix = tokens[0].lower() + '.'
+                files, files_in_compaction = tokens[1].split('/')
+                row = {
+                    prefix + 'files': float(files),
+                    prefix + 'files_in_compaction': float(files_in_compaction),
+                    prefix + 'size': LogStatsParser.parse_size(
+                        tokens[2] + ' ' + tokens[3]
+                    )
+                }
+                for column, token in zip(columns[3:], tokens[4:]):
+                    row[prefix + column] = LogStatsParser.parse_count(token)
+            except (KeyError, ValueError):
+                print('WARNING(LogStatsParser) bad compaction stats: ' + line)
+                continue
+            stats[column_family].update(row)
+        return stats
 
     def get_keys_from_conditions(self, conditions):
         # Note: case insensitive stat names
@@ -65,10 +270,29 @@ class LogStatsParser(TimeSeriesData):
                     reqd_stats.append(key)
         return reqd_stats
 
-    def add_to_timeseries(self, log, reqd_stats):
+    @staticmethod
+    def get_stat_prefixes(reqd_stats):
+        # Returns Dict[stat prefix, Set[stat]], where the prefix is the name
+        # that begins the line of the stat in a dump, for example:
+        # {'rocksdb.db.get.micros': {'rocksdb.db.get.micros.p99'}}; the
+        # percentiles may have a dot of their own, e.g. '.p99.9'
+        stat_prefixes = {}
+        for stat in reqd_stats:
+            stat_prefix = LogStatsParser.get_histogram(stat)
+            if stat_prefix is None:
+                stat_prefix = stat.rsplit('.', 1)[0]
+            if stat_prefix not in stat_prefixes:
+                stat_prefixes[stat_prefix] = set()
+            stat_prefixes[stat_prefix].add(stat)
+        return stat_prefixes
+
+    def add_to_timeseries(self, log, reqd_stats, stat_prefixes=None):
         # this method takes in the Log object that contains the Rocksdb stats
         # and a list of required stats, then it parses the stats line by line
-        # to fetch required stats and add them to the keys_ts object
+        # to fetch required stats and add them to the keys_ts object; all the
+        # stats are added if reqd_stats is None. The stat_prefixes of the
+        # reqd_stats may be given, so that they are not computed for every
+        # dump.
         # Example: reqd_stats = ['rocksdb.block.cache.hit.count',
         # 'rocksdb.db.get.micros.p99']
         # Let log.get_message() returns following string:
@@ -81,43 +305,305 @@ class LogStatsParser(TimeSeriesData):
         new_lines = log.get_message().split('\n')
         # let log_ts = 1532518219
         log_ts = log.get_timestamp()
+        if reqd_stats is None:
+            stat_prefixes = None
+        elif stat_prefixes is None:
+            stat_prefixes = self.get_stat_prefixes(reqd_stats)
         # example updates to keys_ts:
         # keys_ts[NO_ENTITY]['rocksdb.db.get.micros.p99'][1532518219] = 62.6
         # keys_ts[NO_ENTITY]['rocksdb.block.cache.hit.count'][1532518219] = 37
         for line in new_lines[1:]:  # new_lines[0] does not contain any stats
+            if stat_prefixes is not None:
+                # Only the lines of the required stats are parsed: the name
+                # of the stat is looked up before the line is tokenized.
+                line = line.lstrip()
+                stat_prefix = line.split(' ', 1)[0].lower()
+                if stat_prefix not in stat_prefixes:
+                    continue
             stats_on_line = self.parse_log_line_for_stats(line)
             for stat in stats_on_line:
-                if stat in reqd_stats:
+                if (
+                    stat_prefixes is None or
+                    stat in stat_prefixes[stat_prefix]
+                ):
                     if stat not in self.keys_ts[NO_ENTITY]:
-                        self.keys_ts[NO_ENTITY][stat] = {}
+                        self.keys_ts[NO_ENTITY][stat] = TimeSeries()
                     self.keys_ts[NO_ENTITY][stat][log_ts] = stats_on_line[stat]
 
+    def add_dump_to_timeseries(self, log, reqd_stats):
+        # adds the stats of a DB Stats or Compaction Stats dump to keys_ts;
+        # all of them are added if reqd_stats is None
+        lines = log.get_message().split('\n')
+        log_ts = log.get_timestamp()
+        entity_stats = {}
+        if log.message_contains(self.DB_STATS):
+            entity_stats[NO_ENTITY] = self.parse_db_stats(lines)
+        entity_stats.update(self.parse_compaction_stats(lines))
+        if reqd_stats is not None:
+            reqd_stats = set(reqd_stats)
+        for entity, stats in entity_stats.items():
+            for stat, value in stats.items():
+                if reqd_stats is not None and stat not in reqd_stats:
+                    continue
+                if entity not in self.keys_ts:
+                    self.keys_ts[entity] = {}
+                if stat not in self.keys_ts[entity]:
+                    self.keys_ts[entity][stat] = TimeSeries()
+                self.keys_ts[entity][stat][log_ts] = value
+
+    def process_log(self, log):
+        reqd_stats = self.parsed_stats
+        if self.files_to_cache is not None:
+            reqd_stats = None
+        if log.message_contains(self.STATS):
+            self.add_to_timeseries(log, reqd_stats, self.stat_prefixes)
+        elif log.message_contains(self.STATS_DUMP):
+            self.add_dump_to_timeseries(log, reqd_stats)
+        elif log.message_contains(self.RESTART):
+            self.restart_times.append(log.get_timestamp())
+
+    @staticmethod
+    def get_counter_stat(stat):
+        # returns the cumulative stat and the suffix of a '<stat>.delta' or
+        # '<stat>.rate' key, or (stat, None) for any other stat
+        for suffix in LogStatsParser.COUNTER_SUFFIXES:
+            if stat.endswith(suffix):
+                return stat[:-len(suffix)], suffix
+        return stat, None
+
+    @staticmethod
+    def get_counter_deltas(timeseries, restart_times):
+        # Converts the time series of a cumulative counter (a TimeSeries or a
+        # Dict[timestamp, value]) to the increase of the counter over every
+        # interval between consecutive timestamps and to the increase per
+        # second, both keyed by the timestamp at the end of the interval. If
+        # the database was restarted in an interval (per 'restart_times') or
+        # if the counter dropped, the counter restarted from zero.
+        deltas = {}
+        rates = {}
+        restart_times = sorted(restart_times)
+        timestamps, values = TimeSeriesData.get_columns(timeseries)
+        for ix in range(1, len(timestamps)):
+            prev_ts, curr_ts = timestamps[ix - 1], timestamps[ix]
+            interval_start = prev_ts
+            delta = values[ix] - values[ix - 1]
+            restart_ix = bisect.bisect_right(restart_times, curr_ts)
+            if restart_ix > 0 and restart_times[restart_ix - 1] > prev_ts:
+                interval_start = restart_times[restart_ix - 1]
+                delta = values[ix]
+            elif delta < 0:
+                delta = values[ix]
+            deltas[curr_ts] = delta
+            if curr_ts > interval_start:
+                rates[curr_ts] = delta / (curr_ts - interval_start)
+        return deltas, rates
+
+    @staticmethod
+    def get_histogram(stat):
+        # returns the name of the histogram of a percentile or average stat,
+        # or None for any other stat
+        match = LogStatsParser.HISTOGRAM_STAT_REGEX.search(stat)
+        if not match:
+            return None
+        return stat[:match.start()]
+
+    def get_sample_counts(self, entity, histogram):
+        # returns Dict[timestamp, number of samples of the histogram in the
+        # interval that ends at the timestamp], where the first interval
+        # starts when the counting started
+        count_ts = self.keys_ts[entity].get(histogram + self.HISTOGRAM_COUNT)
+        if not count_ts:
+            return None
+        sample_counts, _ = self.get_counter_deltas(
+            count_ts, self.restart_times
+        )
+        first_ts = min(count_ts.keys())
+        sample_counts[first_ts] = count_ts[first_ts]
+        return sample_counts
+
+    def add_histogram_averages(self):
+        # adds the '<histogram>.avg' time series of the required stats to
+        # keys_ts
+        for stat in self.reqd_stats:
+            if not stat.endswith(self.HISTOGRAM_AVG):
+                continue
+            histogram = stat[:-len(self.HISTOGRAM_AVG)]
+            sum_stat = histogram + self.HISTOGRAM_SUM
+            for entity, entity_stats in self.keys_ts.items():
+                if sum_stat not in entity_stats:
+                    continue
+                sample_counts = self.get_sample_counts(entity, histogram)
+                if not sample_counts:
+                    continue
+                sums, _ = self.get_counter_deltas(
+                    entity_stats[sum_stat], self.restart_times
+                )
+                entity_stats[stat] = TimeSeries({
+                    ts: sums[ts] / sample_counts[ts]
+                    for ts in sums
+                    if sample_counts.get(ts)
+                })
+
+    def fetch_aggregated_values(self, entity, statistics, aggregation_op):
+        # the 'avg' and 'stddev' of the averages of a histogram are weighted
+        # by the number of samples of every interval, and the 'avg' of its
+        # cumulative percentiles is their latest value
+        result = super().fetch_aggregated_values(
+            entity, statistics, aggregation_op
+        )
+        if aggregation_op not in (
+            self.AggregationOperator.avg, self.AggregationOperator.stddev
+        ):
+            return result
+        percentiles = [
+            stat for stat in result
+            if self.get_histogram(stat) and
+            not stat.endswith(self.HISTOGRAM_AVG)
+        ]
+        if percentiles and aggregation_op is self.AggregationOperator.avg:
+            result.update(super().fetch_aggregated_values(
+                entity, percentiles, self.AggregationOperator.latest
+            ))
+        for stat in result:
+            if not stat.endswith(self.HISTOGRAM_AVG):
+                continue
+            histogram = self.get_histogram(stat)
+            sample_counts = self.get_sample_counts(entity, histogram)
+            if not sample_counts:
+                continue
+            timestamps, values = self.get_columns(self.keys_ts[entity][stat])
+            summary = TimeSeriesSummary(
+                values, [sample_counts.get(ts, 0) for ts in timestamps]
+            )
+            if summary.count <= 0:
+                continue
+            if aggregation_op is self.AggregationOperator.avg:
+                result[stat] = summary.get_average()
+            else:
+                result[stat] = summary.get_stddev()
+        return result
+
+    def add_counter_timeseries(self):
+        # adds the '<stat>.delta' and '<stat>.rate' time series of the
+        # required stats to keys_ts
+        for stat in self.reqd_stats:
+            counter_stat, suffix = self.get_counter_stat(stat)
+            if not suffix:
+                continue
+            if self.get_histogram(counter_stat):
+                print(
+                    'WARNING(LogStatsParser) ' + counter_stat +
+                    ' is not cumulative, ' + stat + ' is not supported'
+                )
+                continue
+            for entity_stats in self.keys_ts.values():
+                if counter_stat not in entity_stats:
+                    continue
+                deltas, rates = self.get_counter_deltas(
+                    entity_stats[counter_stat], self.restart_times
+                )
+                entity_stats[stat] = TimeSeries(
+                    deltas if suffix == '.delta' else rates
+                )
+
+    def register_conditions(self, conditions):
+        self.register_stats(self.get_keys_from_conditions(conditions))
+
+    def register_stats(self, reqd_stats):
+        self.reqd_stats = reqd_stats
+        self.parsed_stats = []
+        for stat in reqd_stats:
+            counter_stat, _ = self.get_counter_stat(stat)
+            parsed_stats = [counter_stat]
+            histogram = self.get_histogram(counter_stat)
+            if counter_stat.endswith(self.HISTOGRAM_AVG) and histogram:
+                # the averages are the increase of the sum over the increase
+                # of the count, which also weighs their aggregations
+                parsed_stats = [
+                    histogram + self.HISTOGRAM_COUNT,
+                    histogram + self.HISTOGRAM_SUM
+                ]
+            for parsed_stat in parsed_stats:
+                if parsed_stat not in self.parsed_stats:
+                    self.parsed_stats.append(parsed_stat)
+        self.stat_prefixes = self.get_stat_prefixes(self.parsed_stats)
+        # With an incremental LogScanner, the timeseries are carried forward
+        # and extended by every scan; a statistic that is required only from
+        # some scan onwards has no values for the LOGs scanned before it.
+        if not (self.log_scanner.incremental and self.keys_ts):
+            self.keys_ts = {NO_ENTITY: {}}
+            self.restart_times = []
+        self.awaiting_scan = True
+        self.files_to_cache = None
+        log_cache = self.log_scanner.log_cache
+        if log_cache and not self.log_scanner.incremental:
+            # All the stats in the LOG files are cached, whichever of them are
+            # required, so that the cache serves the later analyses too.
+            log_files = [
+                file_name
+                for _, _, file_name in self.log_scanner.get_log_files()
+            ]
+            cached_stats = log_cache.load(
+                self.get_stats_cache_kind(), log_files
+            )
+            if cached_stats is not None:
+                self.load_cached_stats(cached_stats)
+                return
+            self.files_to_cache = log_files
+        self.log_scanner.register(self)
+
+    def get_stats_cache_kind(self):
+        # the stats cached for a time window are only valid for that window
+        kind = self.STATS_CACHE_KIND
+        if self.log_scanner.has_time_window():
+            kind += '-' + str(self.log_scanner.start_time)
+            kind += '-' + str(self.log_scanner.end_time)
+        return kind
+
+    def load_cached_stats(self, cached_stats):
+        # cached_stats: Tuple[Dict[entity, Dict[stat, Tuple[array of
+        # timestamps, array of values]]], array of restart timestamps]
+        cached_stats, restart_times = cached_stats
+        self.restart_times = list(restart_times)
+        for entity, entity_stats in cached_stats.items():
+            for stat in self.parsed_stats:
+                if stat in entity_stats:
+                    timestamps, values = entity_stats[stat]
+                    if entity not in self.keys_ts:
+                        self.keys_ts[entity] = {}
+                    self.keys_ts[entity][stat] = TimeSeries.from_columns(
+                        timestamps, values
+                    )
+
+    def store_cached_stats(self):
+        cached_stats = {}
+        for entity, entity_stats in self.keys_ts.items():
+            cached_stats[entity] = {}
+            for stat, timeseries in entity_stats.items():
+                cached_stats[entity][stat] = timeseries.get_columns()
+        cached_stats = (cached_stats, array('q', self.restart_times))
+        self.log_scanner.log_cache.store(
+            self.get_stats_cache_kind(), self.files_to_cache, cached_stats
+        )
+        self.files_to_cache = None
+        # keep only the required stats
+        self.keys_ts = {NO_ENTITY: {}}
+        self.load_cached_stats(cached_stats)
+
     def fetch_timeseries(self, reqd_stats):
         # this method parses the Rocksdb LOG file and generates timeseries for
         # each of the statistic in the list reqd_stats
-        self.keys_ts = {NO_ENTITY: {}}
-        for file_name in glob.glob(self.logs_file_prefix + '*'):
-            # TODO(poojam23): find a way to distinguish between 'old' log files
-            # from current and previous experiments, present in the same
-            # directory
-            if re.search('old', file_name, re.IGNORECASE):
-                continue
-            with open(file_name, 'r') as db_logs:
-                new_log = None
-                for line in db_logs:
-                    if Log.is_new_log(line):
-                        if (
-                            new_log and
-                            re.search(self.STATS, new_log.get_message())
-                        ):
-                            self.add_to_timeseries(new_log, reqd_stats)
-                        new_log = Log(line, column_families=[])
-                    else:
-                        # To account for logs split into multiple lines
-                        new_log.append_message(line)
-            # Check for the last log in the file.
-            if new_log and re.search(self.STATS, new_log.get_message()):
-                self.add_to_timeseries(new_log, reqd_stats)
+        if reqd_stats != self.reqd_stats or not self.awaiting_scan:
+            self.register_stats(reqd_stats)
+        # if the scanner has already been run for the consumers registered
+        # along with this one, this is a no-op
+        self.log_scanner.scan()
+        self.awaiting_scan = False
+        if self.files_to_cache is not None:
+            self.store_cached_stats()
+        self.add_counter_timeseries()
+        self.add_histogram_averages()
+        self.aligned_ts = None
 
 
 class DatabasePerfContext(TimeSeriesData):
@@ -217,6 +703,7 @@ class OdsStatsFetcher(TimeSeriesData):
         # <entity_name>\t<key_name>\t[[ts, value], [ts, value], ...]
         # ts = timestamp; value = value of key_name in entity_name at time ts
         self.keys_ts = {}
+        self.aligned_ts = None
         with open(self.OUTPUT_FILE, 'r') as fp:
             for line in fp:
                 token_list = line.strip().split('\t')
@@ -231,13 +718,14 @@ class OdsStatsFetcher(TimeSeriesData):
                     for pair_string in token_list[2].split('],')
                 ]
                 value = {pair[0]: pair[1] for pair in list_of_lists}
-                self.keys_ts[entity][key] = value
+                self.keys_ts[entity][key] = TimeSeries(value)
 
     def parse_ods_output(self):
         # Output looks like the following:
         # <entity_name>\t<key_name>\t<timestamp>\t<value>
         # there is one line per (entity_name, key_name, timestamp)
         self.keys_ts = {}
+        self.aligned_ts = None
         with open(self.OUTPUT_FILE, 'r') as fp:
             for line in fp:
                 token_list = line.split()
@@ -246,8 +734,10 @@ class OdsStatsFetcher(TimeSeriesData):
                     self.keys_ts[entity] = {}
                 key = token_list[1]
                 if key not in self.keys_ts[entity]:
-                    self.keys_ts[entity][key] = {}
-                self.keys_ts[entity][key][token_list[2]] = token_list[3]
+                    self.keys_ts[entity][key] = TimeSeries()
+                self.keys_ts[entity][key][int(token_list[2])] = float(
+                    token_list[3]
+                )
 
     def fetch_timeseries(self, statistics):
         # this method fetches the timeseries of required stats from the ODS
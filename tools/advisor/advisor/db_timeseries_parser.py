@@ -4,12 +4,195 @@
 #  (found in the LICENSE.Apache file in the root directory).
 
 from abc import abstractmethod
-from advisor.db_log_parser import DataSource
+from advisor.db_log_parser import DataSource, LogScanner
+from array import array
+from collections.abc import MutableMapping
 from enum import Enum
+import bisect
 import math
+try:
+    import numpy
+except ImportError:
+    # numpy is optional, the columns are then only available as arrays
+    numpy = None
 
 
 NO_ENTITY = 'ENTITY_PLACEHOLDER'
+# the value of the times of an aligned time series that have no sample
+GAP = math.nan
+
+
+def is_gap(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class TimeSeriesSummary:
+    # The running summary of the values of a time series, from which every
+    # TimeSeriesData.AggregationOperator but 'latest' and 'oldest', which
+    # are read off the ends of the sorted columns, is answered without going
+    # over the values again. The mean and the sum of the squared deviations
+    # from it ('m2') are updated with Welford's method, which does not lose
+    # the variance of large values like cumulative counters to cancellation.
+    # A value can be given a weight, e.g. the number of samples it stands
+    # for, and 'count' is then the sum of the weights.
+    def __init__(self, values=(), weights=None):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        if weights is None:
+            for value in values:
+                self.add(value)
+        else:
+            for value, weight in zip(values, weights):
+                self.add(value, weight)
+
+    def add(self, value, weight=1):
+        if weight <= 0:
+            return
+        self.count += weight
+        delta = value - self.mean
+        self.mean += delta * weight / self.count
+        self.m2 += weight * delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def get_average(self):
+        return self.mean
+
+    def get_stddev(self):
+        # the population standard deviation of the values
+        return math.sqrt(max(self.m2 / self.count, 0))
+
+
+class TimeSeries(MutableMapping):
+    # The samples of a time series stored in two columns: the sorted integer
+    # timestamps (int64) and their values (float64). A TimeSeries behaves
+    # like the Dict[timestamp, value] that the time series used to be, so
+    # that the code that indexes or iterates over 'keys_ts' keeps working,
+    # but a sample costs 16 bytes instead of a dict entry and two boxed
+    # numbers. The samples are mostly added in the order of time, which
+    # appends them to the columns; keys() and values() return the columns
+    # themselves, which must not be modified. get_numpy_columns() returns
+    # the columns as numpy arrays for the vectorized computations, or as
+    # arrays if numpy is not installed. get_summary() returns the
+    # TimeSeriesSummary of the values, which is computed once and then kept
+    # up to date as samples are added; it is recomputed after a value is
+    # overwritten or removed.
+    def __init__(self, samples=None):
+        self.ts_column = array('q')
+        self.value_column = array('d')
+        self.numpy_columns = None
+        self.summary = None
+        if samples:
+            for timestamp in sorted(samples.keys()):
+                self.ts_column.append(timestamp)
+                self.value_column.append(samples[timestamp])
+
+    @staticmethod
+    def from_columns(ts_column, value_column):
+        # the timestamps must be sorted and unique
+        timeseries = TimeSeries()
+        timeseries.ts_column = array('q', ts_column)
+        timeseries.value_column = array('d', value_column)
+        return timeseries
+
+    @staticmethod
+    def from_numpy_columns(ts_column, value_column):
+        # the timestamps must be sorted and unique
+        timeseries = TimeSeries()
+        timeseries.ts_column.frombytes(
+            ts_column.astype(numpy.int64).tobytes()
+        )
+        timeseries.value_column.frombytes(
+            value_column.astype(numpy.float64).tobytes()
+        )
+        return timeseries
+
+    def find(self, timestamp):
+        ix = bisect.bisect_left(self.ts_column, timestamp)
+        if ix < len(self.ts_column) and self.ts_column[ix] == timestamp:
+            return ix
+        return None
+
+    def __getitem__(self, timestamp):
+        ix = self.find(timestamp)
+        if ix is None:
+            raise KeyError(timestamp)
+        return self.value_column[ix]
+
+    def __setitem__(self, timestamp, value):
+        self.numpy_columns = None
+        if not self.ts_column or timestamp > self.ts_column[-1]:
+            self.ts_column.append(timestamp)
+            self.value_column.append(value)
+            if self.summary is not None:
+                self.summary.add(value)
+            return
+        ix = bisect.bisect_left(self.ts_column, timestamp)
+        if self.ts_column[ix] == timestamp:
+            self.value_column[ix] = value
+            self.summary = None
+        else:
+            self.ts_column.insert(ix, timestamp)
+            self.value_column.insert(ix, value)
+            if self.summary is not None:
+                self.summary.add(value)
+
+    def __delitem__(self, timestamp):
+        ix = self.find(timestamp)
+        if ix is None:
+            raise KeyError(timestamp)
+        self.numpy_columns = None
+        self.summary = None
+        del self.ts_column[ix]
+        del self.value_column[ix]
+
+    def __contains__(self, timestamp):
+        return self.find(timestamp) is not None
+
+    def __iter__(self):
+        return iter(self.ts_column)
+
+    def __len__(self):
+        return len(self.ts_column)
+
+    def __repr__(self):
+        return 'TimeSeries(' + repr(dict(self.items())) + ')'
+
+    def keys(self):
+        return self.ts_column
+
+    def values(self):
+        return self.value_column
+
+    def items(self):
+        return zip(self.ts_column, self.value_column)
+
+    def get_columns(self):
+        return self.ts_column, self.value_column
+
+    def get_summary(self):
+        if self.summary is None:
+            self.summary = TimeSeriesSummary(self.value_column)
+        return self.summary
+
+    def get_numpy_columns(self):
+        if numpy is None:
+            return self.get_columns()
+        if self.numpy_columns is None:
+            # copies, since the columns cannot grow while their buffers are
+            # exported
+            self.numpy_columns = (
+                numpy.frombuffer(self.ts_column, dtype=numpy.int64).copy(),
+                numpy.frombuffer(
+                    self.value_column, dtype=numpy.float64
+                ).copy()
+            )
+        return self.numpy_columns
 
 
 class TimeSeriesData(DataSource):
@@ -23,11 +206,23 @@ class TimeSeriesData(DataSource):
         min = 3
         latest = 4
         oldest = 5
+        stddev = 6
+
+    # the number of entities whose rate changes are computed together
+    BURST_BATCH_SIZE = 1024
 
     def __init__(self):
         super().__init__(DataSource.Type.TIME_SERIES)
         self.keys_ts = None  # Dict[entity, Dict[key, Dict[timestamp, value]]]
         self.stats_freq_sec = None
+        # the sampling period detected from the samples of 'keys_ts', or the
+        # configured 'stats_freq_sec' if none is detected, see
+        # detect_sampling_period()
+        self.sampling_period = None
+        # the time series of 'keys_ts' aligned on a regular grid, see
+        # align_keys_ts(); it is reset to None whenever 'keys_ts' is
+        # repopulated, so that it is aligned again
+        self.aligned_ts = None
 
     @abstractmethod
     def get_keys_from_conditions(self, conditions):
@@ -42,6 +237,104 @@ class TimeSeriesData(DataSource):
         # for each of them and populates the 'keys_ts' dictionary
         pass
 
+    @staticmethod
+    def get_sampling_period(intervals):
+        # the median of the intervals between consecutive samples, which is
+        # not thrown off by the dumps that are delayed or skipped under load
+        intervals = sorted(interval for interval in intervals if interval > 0)
+        if not intervals:
+            return None
+        return intervals[len(intervals) // 2]
+
+    def detect_sampling_period(self):
+        # The sampling period is detected from the timestamps of the samples;
+        # the configured 'stats_freq_sec' (e.g. the stats_dump_period_sec
+        # option) is only a fallback, since the actual dumps drift. It is
+        # kept as configured.
+        intervals = []
+        for entity_ts in self.keys_ts.values():
+            for timeseries in entity_ts.values():
+                if numpy is not None:
+                    timestamps, _ = self.get_numpy_columns(timeseries)
+                    intervals.append(numpy.diff(timestamps))
+                    continue
+                timestamps, _ = self.get_columns(timeseries)
+                intervals.extend(
+                    curr_ts - prev_ts
+                    for prev_ts, curr_ts in zip(timestamps, timestamps[1:])
+                )
+        if numpy is not None and intervals:
+            intervals = numpy.concatenate(intervals)
+            intervals = intervals[intervals > 0]
+            sampling_period = None
+            if len(intervals):
+                sampling_period = int(numpy.partition(
+                    intervals, len(intervals) // 2
+                )[len(intervals) // 2])
+        else:
+            sampling_period = self.get_sampling_period(intervals)
+        self.sampling_period = sampling_period or self.stats_freq_sec
+
+    @staticmethod
+    def align_timeseries(timeseries, period, origin):
+        # Aligns 'timeseries' on the grid of the times origin + n * period and
+        # returns the aligned TimeSeries: every sample is moved to the closest
+        # time of the grid (the latest sample wins if several are moved to the
+        # same time), and the times of the grid between 'origin' and the last
+        # sample that have no sample are explicit gaps, with the value GAP.
+        if not timeseries:
+            return TimeSeries()
+        if numpy is not None:
+            timestamps, values = TimeSeriesData.get_numpy_columns(timeseries)
+            slots = numpy.rint((timestamps - origin) / period).astype(
+                numpy.int64
+            )
+            aligned_values = numpy.full(slots[-1] + 1, GAP)
+            aligned_values[slots] = values
+            return TimeSeries.from_numpy_columns(
+                numpy.arange(len(aligned_values)) * period + origin,
+                aligned_values
+            )
+        timestamps, values = TimeSeriesData.get_columns(timeseries)
+        num_slots = round((timestamps[-1] - origin) / period) + 1
+        aligned_values = array('d', [GAP]) * num_slots
+        for timestamp, value in zip(timestamps, values):
+            aligned_values[round((timestamp - origin) / period)] = value
+        return TimeSeries.from_columns(
+            range(origin, origin + num_slots * period, period), aligned_values
+        )
+
+    def align_keys_ts(self):
+        # populates 'aligned_ts' with the time series of 'keys_ts' aligned on
+        # a regular grid per entity, whose period is the detected sampling
+        # period; the data that is not sampled at regular intervals
+        # (stats_freq_sec = 0) is not aligned
+        if self.stats_freq_sec == 0:
+            self.sampling_period = 0
+            self.aligned_ts = self.keys_ts
+            return
+        self.detect_sampling_period()
+        if not self.sampling_period:
+            self.aligned_ts = self.keys_ts
+            return
+        self.aligned_ts = {}
+        for entity, entity_ts in self.keys_ts.items():
+            timestamps = [
+                self.get_columns(timeseries)[0][0]
+                for timeseries in entity_ts.values()
+                if timeseries
+            ]
+            if not timestamps:
+                self.aligned_ts[entity] = {}
+                continue
+            origin = min(timestamps)
+            self.aligned_ts[entity] = {
+                key: self.align_timeseries(
+                    timeseries, self.sampling_period, origin
+                )
+                for key, timeseries in entity_ts.items()
+            }
+
     def fetch_burst_epochs(
         self, entities, statistic, window_sec, threshold, percent
     ):
@@ -50,14 +343,16 @@ class TimeSeriesData(DataSource):
         # for each entity (over 'window_sec' seconds) and returns the epochs
         # where this rate change is greater than or equal to the 'threshold'
         # value
-        if self.stats_freq_sec == 0:
+        if self.aligned_ts is None:
+            self.align_keys_ts()
+        if not self.sampling_period:
             # not time series data, cannot check for bursty behavior
             return
-        if window_sec < self.stats_freq_sec:
-            window_sec = self.stats_freq_sec
+        if window_sec < self.sampling_period:
+            window_sec = self.sampling_period
         # 'window_samples' is the number of windows to go back to
         # compare the current window with, while calculating rate change.
-        window_samples = math.ceil(window_sec / self.stats_freq_sec)
+        window_samples = math.ceil(window_sec / self.sampling_period)
         burst_epochs = {}
         # if percent = False:
         # curr_val = value at window for which rate change is being calculated
@@ -67,59 +362,183 @@ class TimeSeriesData(DataSource):
         # if percent = True:
         # rate_with_percent = (rate_without_percent * 100) / prev_val
         # These calculations are in line with the rate() transform supported
-        # by ODS
-        for entity in entities:
-            if statistic not in self.keys_ts[entity]:
-                continue
-            timestamps = sorted(list(self.keys_ts[entity][statistic].keys()))
-            for ix in range(window_samples, len(timestamps), 1):
-                first_ts = timestamps[ix - window_samples]
-                last_ts = timestamps[ix]
-                first_val = self.keys_ts[entity][statistic][first_ts]
-                last_val = self.keys_ts[entity][statistic][last_ts]
-                diff = last_val - first_val
-                if percent:
-                    diff = diff * 100 / first_val
-                rate = (diff * self.duration_sec) / (last_ts - first_ts)
-                # if the rate change is greater than the provided threshold,
-                # then the condition is triggered for entity at time 'last_ts'
-                if rate >= threshold:
-                    if entity not in burst_epochs:
-                        burst_epochs[entity] = {}
-                    burst_epochs[entity][last_ts] = rate
+        # by ODS. The samples are taken from the regular grid of 'aligned_ts',
+        # so that 'window_samples' spans 'window_sec' even if some dumps were
+        # delayed or skipped; the windows that begin or end in a gap, and the
+        # percent rate changes from 0, are skipped.
+        entities = [
+            entity for entity in entities
+            if statistic in self.aligned_ts[entity]
+        ]
+        if numpy is None:
+            for entity in entities:
+                self.add_burst_epochs(
+                    burst_epochs, entity,
+                    self.get_columns(self.aligned_ts[entity][statistic]),
+                    window_samples, threshold, percent
+                )
+            return burst_epochs
+        # the time series of a batch of entities are concatenated, so that
+        # the rate changes of the batch are computed by a few array
+        # operations, and the windows that span two entities are masked
+        for batch_start in range(0, len(entities), self.BURST_BATCH_SIZE):
+            batch = entities[batch_start:batch_start + self.BURST_BATCH_SIZE]
+            self.add_batch_burst_epochs(
+                burst_epochs, batch, statistic, window_samples, threshold,
+                percent
+            )
         return burst_epochs
 
+    def add_burst_epochs(
+        self, burst_epochs, entity, columns, window_samples, threshold,
+        percent
+    ):
+        # the rate changes of one entity, without numpy
+        timestamps, values = columns
+        for ix in range(window_samples, len(timestamps), 1):
+            first_ts = timestamps[ix - window_samples]
+            last_ts = timestamps[ix]
+            first_val = values[ix - window_samples]
+            last_val = values[ix]
+            if is_gap(first_val) or is_gap(last_val):
+                continue
+            diff = last_val - first_val
+            if percent:
+                if not first_val:
+                    continue
+                diff = diff * 100 / first_val
+            rate = (diff * self.duration_sec) / (last_ts - first_ts)
+            # if the rate change is greater than the provided threshold,
+            # then the condition is triggered for entity at time 'last_ts'
+            if rate >= threshold:
+                if entity not in burst_epochs:
+                    burst_epochs[entity] = {}
+                burst_epochs[entity][last_ts] = rate
+
+    def add_batch_burst_epochs(
+        self, burst_epochs, entities, statistic, window_samples, threshold,
+        percent
+    ):
+        columns = [
+            self.get_numpy_columns(self.aligned_ts[entity][statistic])
+            for entity in entities
+        ]
+        timestamps = numpy.concatenate([column[0] for column in columns])
+        values = numpy.concatenate([column[1] for column in columns])
+        if len(values) <= window_samples:
+            return
+        # the index of the entity of every sample
+        entity_ixs = numpy.repeat(
+            numpy.arange(len(entities)),
+            [len(column[0]) for column in columns]
+        )
+        first_vals = values[:-window_samples]
+        last_vals = values[window_samples:]
+        valid = entity_ixs[:-window_samples] == entity_ixs[window_samples:]
+        diffs = last_vals - first_vals
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            if percent:
+                valid &= first_vals != 0
+                diffs = diffs * 100 / first_vals
+            rates = (diffs * self.duration_sec) / (
+                timestamps[window_samples:] - timestamps[:-window_samples]
+            )
+        # the gaps are NaN, so their rate changes are never >= threshold
+        for ix in numpy.nonzero(valid & (rates >= threshold))[0]:
+            entity = entities[entity_ixs[ix + window_samples]]
+            if entity not in burst_epochs:
+                burst_epochs[entity] = {}
+            burst_epochs[entity][int(timestamps[ix + window_samples])] = (
+                float(rates[ix])
+            )
+
+    @staticmethod
+    def get_columns(timeseries):
+        # returns the sorted timestamps of a time series, either a TimeSeries
+        # or a Dict[timestamp, value], and the values at these timestamps
+        if isinstance(timeseries, TimeSeries):
+            return timeseries.get_columns()
+        timestamps = sorted(timeseries.keys())
+        return timestamps, [timeseries[ts] for ts in timestamps]
+
+    @staticmethod
+    def get_numpy_columns(timeseries):
+        if isinstance(timeseries, TimeSeries):
+            return timeseries.get_numpy_columns()
+        timestamps, values = TimeSeriesData.get_columns(timeseries)
+        return (
+            numpy.array(timestamps, dtype=numpy.int64),
+            numpy.array(values, dtype=numpy.float64)
+        )
+
     def fetch_aggregated_values(self, entity, statistics, aggregation_op):
         # type: (str, AggregationOperator) -> Dict[str, float]
         # this method performs the aggregation specified by 'aggregation_op'
         # on the timeseries of 'statistics' for 'entity' and returns:
         # Dict[statistic, aggregated_value]
+        # The aggregations are answered by the running TimeSeriesSummary of
+        # every TimeSeries, which is shared by all the conditions on the key.
+        # The time series that are not TimeSeries may hold non-numeric
+        # values, e.g. the string fields of the events, which only have a
+        # max and a min.
         result = {}
         for stat in statistics:
             if stat not in self.keys_ts[entity]:
                 continue
-            agg_val = None
+            timeseries = self.keys_ts[entity][stat]
+            if not timeseries:
+                result[stat] = None
+                continue
+            _, values = self.get_columns(timeseries)
             if aggregation_op is self.AggregationOperator.latest:
-                latest_timestamp = max(list(self.keys_ts[entity][stat].keys()))
-                agg_val = self.keys_ts[entity][stat][latest_timestamp]
-            elif aggregation_op is self.AggregationOperator.oldest:
-                oldest_timestamp = min(list(self.keys_ts[entity][stat].keys()))
-                agg_val = self.keys_ts[entity][stat][oldest_timestamp]
-            elif aggregation_op is self.AggregationOperator.max:
-                agg_val = max(list(self.keys_ts[entity][stat].values()))
+                result[stat] = values[-1]
+                continue
+            if aggregation_op is self.AggregationOperator.oldest:
+                result[stat] = values[0]
+                continue
+            if isinstance(timeseries, TimeSeries):
+                summary = timeseries.get_summary()
+            elif all(isinstance(value, (int, float)) for value in values):
+                summary = TimeSeriesSummary(values)
+            else:
+                result[stat] = self.aggregate_non_numeric(
+                    stat, values, aggregation_op
+                )
+                continue
+            agg_val = None
+            if aggregation_op is self.AggregationOperator.max:
+                agg_val = summary.max
             elif aggregation_op is self.AggregationOperator.min:
-                agg_val = min(list(self.keys_ts[entity][stat].values()))
+                agg_val = summary.min
             elif aggregation_op is self.AggregationOperator.avg:
-                values = list(self.keys_ts[entity][stat].values())
-                agg_val = sum(values) / len(values)
+                agg_val = summary.get_average()
+            elif aggregation_op is self.AggregationOperator.stddev:
+                agg_val = summary.get_stddev()
             result[stat] = agg_val
         return result
 
+    def aggregate_non_numeric(self, stat, values, aggregation_op):
+        try:
+            if aggregation_op is self.AggregationOperator.max:
+                return max(values)
+            if aggregation_op is self.AggregationOperator.min:
+                return min(values)
+        except TypeError as e:  # e.g. strings mixed with numbers
+            print('WARNING(TimeSeriesData) ' + stat + ': ' + str(e))
+            return None
+        print(
+            'WARNING(TimeSeriesData) ' + stat + ': ' + aggregation_op.name +
+            ' of non-numeric values'
+        )
+        return None
+
     def check_and_trigger_conditions(self, conditions):
         # get the list of statistics that need to be fetched
         reqd_keys = self.get_keys_from_conditions(conditions)
         # fetch the required statistics and populate the map 'keys_ts'
         self.fetch_timeseries(reqd_keys)
+        # align them on a regular grid in 'aligned_ts'
+        self.align_keys_ts()
         # Trigger the appropriate conditions
         for cond in conditions:
             complete_keys = self.get_keys_from_conditions([cond])
@@ -163,6 +582,12 @@ class TimeSeriesData(DataSource):
 
     def handle_evaluate_expression(self, condition, statistics, entities):
         trigger = {}
+        try:
+            # the expression is parsed and compiled once per condition
+            expression = condition.get_compiled_expression()
+        except ValueError as e:
+            print('WARNING(TimeSeriesData) check_and_trigger: ' + str(e))
+            return
         # check 'condition' for each of these entities
         for entity in entities:
             if hasattr(condition, 'aggregation_op'):
@@ -176,26 +601,40 @@ class TimeSeriesData(DataSource):
                 )
                 keys = [result[key] for key in statistics]
                 try:
-                    if eval(condition.expression):
+                    if expression.evaluate(keys):
                         trigger[entity] = keys
                 except Exception as e:
                     print(
                         'WARNING(TimeSeriesData) check_and_trigger: ' + str(e)
                     )
+            elif (
+                self.can_evaluate_columns(expression, entity, statistics) and
+                self.add_triggered_epochs(
+                    trigger, entity, expression,
+                    [self.aligned_ts[entity][key] for key in statistics]
+                )
+            ):
+                # the expression was evaluated on the columns of the entity
+                continue
             else:
-                # assumption: all stats have same series of timestamps
                 # this is similar to the above but 'expression' is evaluated at
-                # each timestamp, since there is no aggregation, and all the
-                # epochs are added to the trigger when the condition's
-                # 'expression' evaluated to true; so trigger is:
-                # Dict[entity, Dict[timestamp, List[stats]]]
-                for epoch in self.keys_ts[entity][statistics[0]].keys():
+                # each epoch of the grid of 'aligned_ts', since there is no
+                # aggregation, and all the epochs are added to the trigger
+                # when the condition's 'expression' evaluated to true; so
+                # trigger is: Dict[entity, Dict[timestamp, List[stats]]]
+                # The epochs at which a stat has a gap are skipped.
+                aligned_ts = self.aligned_ts
+                if aligned_ts is None:
+                    aligned_ts = self.keys_ts
+                for epoch in aligned_ts[entity][statistics[0]].keys():
                     keys = [
-                        self.keys_ts[entity][key][epoch]
+                        aligned_ts[entity][key].get(epoch)
                         for key in statistics
                     ]
+                    if any(is_gap(key) for key in keys):
+                        continue
                     try:
-                        if eval(condition.expression):
+                        if expression.evaluate(keys):
                             if entity not in trigger:
                                 trigger[entity] = {}
                             trigger[entity][epoch] = keys
@@ -206,3 +645,125 @@ class TimeSeriesData(DataSource):
                         )
         if trigger:
             condition.set_trigger(trigger)
+
+    def can_evaluate_columns(self, expression, entity, statistics):
+        # the expression is evaluated on the columns of the time series of an
+        # entity if they are aligned on the same grid, which begins at the
+        # same epoch for all the keys of the entity
+        return (
+            expression.can_evaluate_columns() and
+            expression.num_values <= len(statistics) and
+            self.aligned_ts is not None and
+            self.aligned_ts is not self.keys_ts and
+            all(
+                isinstance(self.aligned_ts[entity][key], TimeSeries)
+                for key in statistics
+            )
+        )
+
+    @staticmethod
+    def add_triggered_epochs(trigger, entity, expression, series):
+        # evaluates the expression at all the epochs of the grid of the first
+        # time series in one vectorized pass; the shorter time series are
+        # padded with gaps. Returns False, without updating the trigger, if
+        # the vectorized evaluation raises, so that the expression is then
+        # evaluated epoch by epoch.
+        epochs, first_values = series[0].get_numpy_columns()
+        columns = [first_values]
+        for timeseries in series[1:]:
+            _, values = timeseries.get_numpy_columns()
+            values = values[:len(epochs)]
+            if len(values) < len(epochs):
+                values = numpy.concatenate([
+                    values, numpy.full(len(epochs) - len(values), GAP)
+                ])
+            columns.append(values)
+        try:
+            triggered = numpy.nonzero(expression.evaluate_columns(columns))[0]
+        except Exception:
+            return False
+        for ix in triggered:
+            if entity not in trigger:
+                trigger[entity] = {}
+            trigger[entity][int(epochs[ix])] = [
+                float(column[ix]) for column in columns
+            ]
+        return True
+
+
+class LogTimeSeriesData(TimeSeriesData):
+    # The base of the time series data sources that are derived from the logs
+    # of the Rocksdb LOG files. A subclass parses what it needs out of every
+    # log handed to process_log(log) and keeps it until reset_logs() is
+    # called, then build_timeseries(reqd_keys) turns what it parsed into the
+    # 'keys_ts' dictionary. The subclass' time series keys all begin with its
+    # KEY_PREFIX, so that the keys of the conditions that are meant for other
+    # data sources are ignored. The events parsed out of the logs are not
+    # sampled at regular intervals, so the timestamps are the times of the
+    # events in (fractional) seconds and bursty behavior is not supported.
+    KEY_PREFIX = None
+
+    def __init__(
+        self, logs_path_prefix, column_families, log_scanner=None,
+        start_time=None, end_time=None
+    ):
+        super().__init__()
+        self.logs_file_prefix = logs_path_prefix
+        self.column_families = column_families
+        self.stats_freq_sec = 0
+        # the LogScanner can be shared with other data sources that read the
+        # same LOG files, for example DatabaseLogs; the time window
+        # [start_time, end_time] is then set on the shared LogScanner
+        self.log_scanner = LogScanner.get_log_scanner(
+            log_scanner, logs_path_prefix, column_families, start_time,
+            end_time
+        )
+        self.reqd_keys = None
+        self.awaiting_scan = False
+
+    @abstractmethod
+    def process_log(self, log):
+        pass
+
+    @abstractmethod
+    def reset_logs(self):
+        # forget what was parsed out of the logs scanned before
+        pass
+
+    @abstractmethod
+    def build_timeseries(self, reqd_keys):
+        # populates 'keys_ts' with the time series of 'reqd_keys'
+        pass
+
+    def get_keys_from_conditions(self, conditions):
+        reqd_keys = []
+        for cond in conditions:
+            for key in cond.keys:
+                # the '[]' prefix is meant for OdsStatsFetcher
+                if key.startswith('[]'):
+                    key = key[2:]
+                if key.startswith(self.KEY_PREFIX):
+                    reqd_keys.append(key)
+        return reqd_keys
+
+    def register_conditions(self, conditions):
+        self.register_keys(self.get_keys_from_conditions(conditions))
+
+    def register_keys(self, reqd_keys):
+        self.reqd_keys = reqd_keys
+        # With an incremental LogScanner, what was parsed out of the logs is
+        # carried forward and extended by every scan.
+        if not self.log_scanner.incremental:
+            self.reset_logs()
+        self.log_scanner.register(self)
+        self.awaiting_scan = True
+
+    def fetch_timeseries(self, reqd_keys):
+        if reqd_keys != self.reqd_keys or not self.awaiting_scan:
+            self.register_keys(reqd_keys)
+        # if the scanner has already been run for the consumers registered
+        # along with this one, this is a no-op
+        self.log_scanner.scan()
+        self.awaiting_scan = False
+        self.build_timeseries(reqd_keys)
+        self.aligned_ts = None
@@ -0,0 +1,178 @@
+# Copyright (c) 2011-present, Facebook, Inc.  All rights reserved.
+#  This source code is licensed under both the GPLv2 (found in the
+#  COPYING file in the root directory) and Apache 2.0 License
+#  (found in the LICENSE.Apache file in the root directory).
+
+from advisor.db_timeseries_parser import LogTimeSeriesData
+from advisor.timestamp_parser import TimestampParser
+import bisect
+import re
+
+
+class WriteStallEpisode:
+    # A run of the write stall (or stop) logs of a column family, in which no
+    # two consecutive logs are more than 'episode_gap_sec' seconds apart. The
+    # times are in (fractional) seconds. Rocksdb does not log the end of a
+    # stall, so the end_time of an episode is estimated by the
+    # WriteStallParser; it is the time of its last log until then.
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.last_log_time = start_time
+        self.end_time = start_time
+        self.stopped = False
+        self.causes = {}  # Dict[cause, number of logs]
+
+    def add_log(self, log_time, stopped, cause):
+        self.last_log_time = max(self.last_log_time, log_time)
+        self.end_time = max(self.end_time, log_time)
+        self.stopped = self.stopped or stopped
+        self.causes[cause] = self.causes.get(cause, 0) + 1
+
+    def get_duration(self):
+        return self.end_time - self.start_time
+
+
+class WriteStallParser(LogTimeSeriesData):
+    # This data source turns the 'Stalling writes because ...' and 'Stopping
+    # writes because ...' logs into a timeline of WriteStallEpisodes per
+    # column family, and exposes it as time series of the column families
+    # (the entities), with a value per episode at the episode's start time:
+    # - 'write_stall.duration_sec': the duration of the episode,
+    # - 'write_stall.cumulative_duration_sec': the write time lost to stalls
+    #   up to the end of the episode (its 'latest' value is the total),
+    # - 'write_stall.stopped': 1 if writes were stopped, not only slowed down,
+    # - 'write_stall.cause.<cause>': the number of logs of the episode with
+    #   the cause 'memtables', 'level0_files' or 'pending_compaction_bytes'.
+    # An episode is taken to last until the first log after its last stall
+    # log that is either a log of the column family other than a stall log,
+    # or a stats dump, since the column family recalculates its stall
+    # conditions whenever its flushes and compactions progress. It lasts at
+    # most one stats dump period after its last stall log, e.g. if the LOG
+    # file ends first, and it ends before the next episode begins.
+    STALL_REGEX = re.compile(
+        r'(Stalling|Stopping) writes because (?:we have \d+ ' +
+        r'(immutable memtables|level-0 files)|of estimated ' +
+        r'(pending compaction bytes))'
+    )
+    CAUSES = {
+        'immutable memtables': 'memtables',
+        'level-0 files': 'level0_files',
+        'pending compaction bytes': 'pending_compaction_bytes'
+    }
+    KEY_PREFIX = 'write_stall.'
+    DURATION = KEY_PREFIX + 'duration_sec'
+    CUMULATIVE_DURATION = KEY_PREFIX + 'cumulative_duration_sec'
+    STOPPED = KEY_PREFIX + 'stopped'
+    CAUSE_PREFIX = KEY_PREFIX + 'cause.'
+    # the substrings of the logs that begin a stats dump
+    STATS_DUMPS = ('DUMPING', 'STATISTICS:')
+    # the default of the stats_dump_period_sec option of Rocksdb
+    DEFAULT_STATS_DUMP_PERIOD_SEC = 600
+
+    def __init__(
+        self, logs_path_prefix, column_families, log_scanner=None,
+        start_time=None, end_time=None, episode_gap_sec=10,
+        stats_dump_period_sec=None
+    ):
+        super().__init__(
+            logs_path_prefix, column_families, log_scanner, start_time,
+            end_time
+        )
+        self.episode_gap_sec = episode_gap_sec
+        self.stats_dump_period_sec = (
+            stats_dump_period_sec or self.DEFAULT_STATS_DUMP_PERIOD_SEC
+        )
+        # Dict[column_family, List[Tuple[time, stopped, cause]]]
+        self.stall_logs = {}
+        # Dict[column_family, List[time]], the times of the first logs that
+        # may end the stalls of the column families after their stall logs
+        self.stall_ends = {}
+        # the column families whose last stall log has not been followed yet
+        # by such a log
+        self.awaiting_end = set()
+
+    @staticmethod
+    def get_log_time(log):
+        return log.get_timestamp_micros() / TimestampParser.MICROS_PER_SEC
+
+    def process_log(self, log):
+        match = None
+        if log.message_contains('writes because'):
+            match = self.STALL_REGEX.search(log.get_message())
+        if match:
+            column_family = log.get_column_family()
+            if column_family not in self.stall_logs:
+                self.stall_logs[column_family] = []
+            self.stall_logs[column_family].append((
+                self.get_log_time(log),
+                match.group(1) == 'Stopping',
+                self.CAUSES[match.group(2) or match.group(3)]
+            ))
+            self.awaiting_end.add(column_family)
+            return
+        if not self.awaiting_end:
+            return
+        if any(log.message_contains(dump) for dump in self.STATS_DUMPS):
+            ended = list(self.awaiting_end)
+        elif log.get_column_family() in self.awaiting_end:
+            ended = [log.get_column_family()]
+        else:
+            return
+        for column_family in ended:
+            if column_family not in self.stall_ends:
+                self.stall_ends[column_family] = []
+            self.stall_ends[column_family].append(self.get_log_time(log))
+            self.awaiting_end.remove(column_family)
+
+    def get_episodes(self, column_family):
+        # returns the List[WriteStallEpisode] of the column family, in the
+        # order of time
+        episodes = []
+        for log_time, stopped, cause in sorted(
+            self.stall_logs.get(column_family, [])
+        ):
+            if (
+                not episodes or
+                log_time - episodes[-1].last_log_time > self.episode_gap_sec
+            ):
+                episodes.append(WriteStallEpisode(log_time))
+            episodes[-1].add_log(log_time, stopped, cause)
+        stall_ends = sorted(self.stall_ends.get(column_family, []))
+        for ix, episode in enumerate(episodes):
+            end_time = episode.last_log_time + self.stats_dump_period_sec
+            end_ix = bisect.bisect_right(stall_ends, episode.last_log_time)
+            if end_ix < len(stall_ends):
+                end_time = min(end_time, stall_ends[end_ix])
+            if ix + 1 < len(episodes):
+                end_time = min(end_time, episodes[ix + 1].start_time)
+            episode.end_time = end_time
+        return episodes
+
+    def reset_logs(self):
+        self.stall_logs = {}
+        self.stall_ends = {}
+        self.awaiting_end = set()
+
+    def build_timeseries(self, reqd_keys):
+        # keys_ts[column_family]['write_stall.<key>'][episode start] = value
+        self.keys_ts = {}
+        for column_family in self.stall_logs:
+            timeseries = {key: {} for key in reqd_keys}
+            cumulative_duration = 0
+            for episode in self.get_episodes(column_family):
+                cumulative_duration += episode.get_duration()
+                values = {
+                    self.DURATION: episode.get_duration(),
+                    self.CUMULATIVE_DURATION: cumulative_duration,
+                    self.STOPPED: float(episode.stopped)
+                }
+                for cause in self.CAUSES.values():
+                    values[self.CAUSE_PREFIX + cause] = float(
+                        episode.causes.get(cause, 0)
+                    )
+                for key in reqd_keys:
+                    if key in values:
+                        timeseries[key][episode.start_time] = values[key]
+            self.keys_ts[column_family] = {
+                key: series for key, series in timeseries.items() if series
+            }
@@ -0,0 +1,270 @@
+# Copyright (c) 2011-present, Facebook, Inc.  All rights reserved.
+#  This source code is licensed under both the GPLv2 (found in the
+#  COPYING file in the root directory) and Apache 2.0 License
+#  (found in the LICENSE.Apache file in the root directory).
+
+import ast
+try:
+    import numpy
+except ImportError:
+    # numpy is optional, the expressions are then only evaluated on scalars
+    numpy = None
+
+
+class CompiledExpression:
+    # The 'evaluate' expression of a condition, parsed and checked against a
+    # whitelist once, then compiled to Python code. Only numbers, arithmetic,
+    # comparisons, 'and', 'or', 'not', the items of the 'variable' list with
+    # constant indices (like keys[0]) and calls to the given 'functions' with
+    # positional arguments (like int(options[0]) or max(keys[0], 1)) are
+    # allowed, so that a rules file cannot run arbitrary code. Strings,
+    # True, False and None are only allowed as the operands of comparisons,
+    # e.g. options[0] == 'kSnappyCompression', and 'in' and 'not in' may
+    # test a value against a tuple or list of them, e.g.
+    # options[0] in ('true', '1'). Any other syntax raises a ValueError.
+    #
+    # evaluate(values) evaluates the expression for one list of values; the
+    # functions may be bound to other implementations of the same names for
+    # the evaluation, e.g. memoized ones. If numpy is installed and the
+    # expression calls no functions, evaluate_columns(columns) evaluates it
+    # for all the rows of a list of columns (numpy arrays) in one vectorized
+    # pass, and returns a boolean array that is True for the rows for which
+    # evaluate() would have returned a true value without raising; the rows
+    # in which a column is NaN are False.
+    #
+    # '**' is not allowed, since an expression like keys[0] ** 10 ** 10
+    # would hang the advisor.
+    BIN_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod)
+    UNARY_OPS = (ast.UAdd, ast.USub, ast.Not)
+    COMPARE_OPS = (
+        ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In,
+        ast.NotIn
+    )
+    MEMBERSHIP_OPS = (ast.In, ast.NotIn)
+    NUMBER_TYPES = (int, float)
+    # the constants that may only be compared
+    COMPARAND_TYPES = (str, bool, type(None))
+    # the vectorized operators that raise ZeroDivisionError on scalars
+    DIVISIONS = {ast.Div: 'div', ast.FloorDiv: 'floordiv', ast.Mod: 'mod'}
+
+    def __init__(self, source, variable, functions=None):
+        self.source = source
+        self.variable = variable
+        self.functions = functions or {}
+        try:
+            tree = ast.parse(source.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ValueError('invalid expression: ' + source + ': ' + str(e))
+        self.num_values = 0
+        self.has_calls = False
+        self.has_bool_ops = False
+        self.has_divisions = False
+        # the strings, True, False, None and 'in' are not vectorized
+        self.has_comparands = False
+        self.check_node(tree.body)
+        self.code = compile(tree, '<expression>', 'eval')
+        # 'and' and 'or' short-circuit, so a division in their operands may
+        # not be evaluated on scalars; such expressions are not vectorized
+        self.columns_code = None
+        if (
+            numpy is not None and not self.has_calls and
+            not self.has_comparands and
+            not (self.has_bool_ops and self.has_divisions)
+        ):
+            columns_tree = ast.fix_missing_locations(
+                ast.Expression(body=self.vectorize(tree.body))
+            )
+            self.columns_code = compile(
+                columns_tree, '<expression>', 'eval'
+            )
+
+    def check_node(self, node, comparand=False):
+        if isinstance(node, ast.Constant):
+            if type(node.value) in self.NUMBER_TYPES:
+                return
+            if not comparand or type(node.value) not in self.COMPARAND_TYPES:
+                self.reject(node)
+            self.has_comparands = True
+        elif isinstance(node, ast.BinOp):
+            if not isinstance(node.op, self.BIN_OPS):
+                self.reject(node)
+            if type(node.op) in self.DIVISIONS:
+                self.has_divisions = True
+            self.check_node(node.left)
+            self.check_node(node.right)
+        elif isinstance(node, ast.UnaryOp):
+            if not isinstance(node.op, self.UNARY_OPS):
+                self.reject(node)
+            self.check_node(node.operand)
+        elif isinstance(node, ast.BoolOp):
+            self.has_bool_ops = True
+            for value in node.values:
+                self.check_node(value)
+        elif isinstance(node, ast.Compare):
+            if not all(isinstance(op, self.COMPARE_OPS) for op in node.ops):
+                self.reject(node)
+            self.check_node(node.left, comparand=True)
+            for op, comparator in zip(node.ops, node.comparators):
+                if isinstance(op, self.MEMBERSHIP_OPS):
+                    self.has_comparands = True
+                    if not isinstance(comparator, (ast.Tuple, ast.List)):
+                        self.reject(comparator)
+                    for element in comparator.elts:
+                        self.check_node(element, comparand=True)
+                else:
+                    self.check_node(comparator, comparand=True)
+        elif isinstance(node, ast.Subscript):
+            index = node.slice
+            # before Python 3.9, the index is wrapped in an ast.Index
+            if isinstance(index, getattr(ast, 'Index', ())):
+                index = index.value
+            if not (
+                isinstance(node.value, ast.Name) and
+                node.value.id == self.variable and
+                isinstance(node.ctx, ast.Load) and
+                isinstance(index, ast.Constant) and
+                type(index.value) is int and index.value >= 0
+            ):
+                self.reject(node)
+            self.num_values = max(self.num_values, index.value + 1)
+        elif isinstance(node, ast.Call):
+            if not (
+                isinstance(node.func, ast.Name) and
+                node.func.id in self.functions and
+                node.args and not node.keywords
+            ):
+                self.reject(node)
+            self.has_calls = True
+            for arg in node.args:
+                self.check_node(arg)
+        else:
+            self.reject(node)
+
+    def reject(self, node):
+        raise ValueError(
+            'expression not supported: ' + self.source + ': ' +
+            ast.dump(node)
+        )
+
+    def vectorize(self, node):
+        # rewrites the checked expression so that it operates on columns:
+        # 'and', 'or', 'not' and chained comparisons become elementwise
+        # operations, and the divisions record the rows they divide by zero;
+        # the results of the comparisons and of 'not' are numbers, so that
+        # the arithmetic on them is that of the booleans on scalars
+        if isinstance(node, ast.BinOp):
+            left, right = self.vectorize(node.left), self.vectorize(node.right)
+            if type(node.op) in self.DIVISIONS:
+                return self.call_helper(
+                    self.DIVISIONS[type(node.op)], [left, right]
+                )
+            return ast.BinOp(left=left, op=node.op, right=right)
+        if isinstance(node, ast.UnaryOp):
+            operand = self.vectorize(node.operand)
+            if isinstance(node.op, ast.Not):
+                return self.call_helper('logical_not', [operand])
+            return ast.UnaryOp(op=node.op, operand=operand)
+        if isinstance(node, ast.BoolOp):
+            helper = 'all' if isinstance(node.op, ast.And) else 'any'
+            return self.call_helper(
+                helper, [self.vectorize(value) for value in node.values]
+            )
+        if isinstance(node, ast.Compare):
+            operands = [node.left] + node.comparators
+            comparisons = [
+                ast.Compare(
+                    left=self.vectorize(operands[ix]), ops=[op],
+                    comparators=[self.vectorize(operands[ix + 1])]
+                )
+                for ix, op in enumerate(node.ops)
+            ]
+            comparisons = [
+                self.call_helper('number', [comparison])
+                for comparison in comparisons
+            ]
+            if len(comparisons) == 1:
+                return comparisons[0]
+            return self.call_helper('all', comparisons)
+        return node
+
+    @staticmethod
+    def call_helper(name, args):
+        return ast.Call(
+            func=ast.Attribute(
+                value=ast.Name(id='helpers', ctx=ast.Load()), attr=name,
+                ctx=ast.Load()
+            ),
+            args=args, keywords=[]
+        )
+
+    def evaluate(self, values, functions=None):
+        # may raise the exceptions of the arithmetic, e.g. ZeroDivisionError
+        namespace = {'__builtins__': {}, self.variable: values}
+        namespace.update(functions or self.functions)
+        return eval(self.code, namespace)
+
+    def can_evaluate_columns(self):
+        return self.columns_code is not None
+
+    def evaluate_columns(self, columns):
+        num_rows = len(columns[0]) if columns else 0
+        helpers = ColumnHelpers(num_rows)
+        for column in columns:
+            helpers.invalid |= numpy.isnan(column)
+        namespace = {
+            '__builtins__': {}, self.variable: columns, 'helpers': helpers
+        }
+        with numpy.errstate(all='ignore'):
+            result = eval(self.columns_code, namespace)
+            result = numpy.broadcast_to(
+                numpy.asarray(result, dtype=bool), (num_rows,)
+            )
+        return result & ~helpers.invalid
+
+
+class ColumnHelpers:
+    # the elementwise operations of the vectorized expressions; 'invalid'
+    # marks the rows that cannot be evaluated
+    def __init__(self, num_rows):
+        self.invalid = numpy.zeros(num_rows, dtype=bool)
+
+    def mark_division(self, divisor):
+        self.invalid |= numpy.broadcast_to(
+            numpy.asarray(divisor) == 0, self.invalid.shape
+        )
+
+    def div(self, dividend, divisor):
+        self.mark_division(divisor)
+        return numpy.true_divide(dividend, divisor)
+
+    def floordiv(self, dividend, divisor):
+        self.mark_division(divisor)
+        return numpy.floor_divide(dividend, divisor)
+
+    def mod(self, dividend, divisor):
+        self.mark_division(divisor)
+        return numpy.mod(dividend, divisor)
+
+    @staticmethod
+    def number(value):
+        return numpy.asarray(value, dtype=float)
+
+    @staticmethod
+    def logical_not(value):
+        return numpy.logical_not(value).astype(float)
+
+    @staticmethod
+    def all(*values):
+        # like 'and' on scalars: the first false value, or else the last one
+        result = values[-1]
+        for value in reversed(values[:-1]):
+            result = numpy.where(value, result, value)
+        return result
+
+    @staticmethod
+    def any(*values):
+        # like 'or' on scalars: the first true value, or else the last one
+        result = values[-1]
+        for value in reversed(values[:-1]):
+            result = numpy.where(value, value, result)
+        return result
@@ -0,0 +1,148 @@
+# Copyright (c) 2011-present, Facebook, Inc.  All rights reserved.
+#  This source code is licensed under both the GPLv2 (found in the
+#  COPYING file in the root directory) and Apache 2.0 License
+#  (found in the LICENSE.Apache file in the root directory).
+
+from advisor.db_timeseries_parser import TimeSeriesData, NO_ENTITY
+import re
+
+
+class Histogram:
+    # The buckets of a Rocksdb histogram, as printed by 'db_bench
+    # --histogram', along with its count, sum, min and max. The percentiles
+    # are interpolated within its buckets like HistogramStat::Percentile()
+    # does.
+    #
+    # Sample db_bench --histogram output:
+    # Microseconds per read:
+    # Count: 1000000 Average: 3.5000  StdDev: 10.20
+    # Min: 0  Median: 2.5000  Max: 1000
+    # Percentiles: P50: 2.50 P75: 3.40 P99: 10.00 P99.9: 20.00 P99.99: 100.00
+    # ------------------------------------------------------
+    # [       0,       1 ]   100000  10.000%  10.000% ##
+    # (       1,       2 ]   200000  20.000%  30.000% ####
+    HEADER_REGEX = re.compile(r'^Microseconds per (.+):$')
+    COUNT_REGEX = re.compile(r'Count: (\d+) +Average: ([\d.]+)')
+    MIN_MAX_REGEX = re.compile(r'Min: ([\d.]+) .*Max: ([\d.]+)')
+    BUCKET_REGEX = re.compile(
+        r'^[\[(]\s*([\d.]+),\s*([\d.]+)\s*\]\s+(\d+)\s'
+    )
+
+    @staticmethod
+    def parse_db_bench_output(lines):
+        # returns Dict[operation, Histogram] of the histograms in the lines of
+        # the db_bench output, e.g. {'read': Histogram, 'write': Histogram}
+        histograms = {}
+        histogram = None
+        for line in lines:
+            line = line.strip()
+            match = Histogram.HEADER_REGEX.match(line)
+            if match:
+                histogram = Histogram()
+                histograms[match.group(1)] = histogram
+                continue
+            if histogram is None:
+                continue
+            match = Histogram.BUCKET_REGEX.match(line)
+            if match:
+                histogram.add_bucket(
+                    float(match.group(1)), float(match.group(2)),
+                    int(match.group(3))
+                )
+                continue
+            match = Histogram.COUNT_REGEX.search(line)
+            if match:
+                histogram.count = int(match.group(1))
+                histogram.sum = histogram.count * float(match.group(2))
+                continue
+            match = Histogram.MIN_MAX_REGEX.search(line)
+            if match:
+                histogram.min = float(match.group(1))
+                histogram.max = float(match.group(2))
+        return histograms
+
+    def __init__(self):
+        self.buckets = {}  # Dict[Tuple[lower limit, upper limit], count]
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add_bucket(self, lower, upper, count):
+        self.buckets[(lower, upper)] = self.buckets.get((lower, upper), 0)
+        self.buckets[(lower, upper)] += count
+
+    def get_average(self):
+        if not self.count:
+            return None
+        return self.sum / self.count
+
+    def get_percentile(self, percentile):
+        # the value below which 'percentile' percent of the samples fall,
+        # linearly interpolated within the bucket that holds it
+        num_samples = sum(self.buckets.values())
+        if not num_samples:
+            return None
+        threshold = num_samples * percentile / 100.0
+        cumulative = 0
+        for (lower, upper), count in sorted(self.buckets.items()):
+            if not count:
+                continue
+            cumulative += count
+            if cumulative >= threshold:
+                position = (threshold - (cumulative - count)) / count
+                value = lower + (upper - lower) * position
+                if self.min is not None:
+                    value = max(value, self.min)
+                if self.max is not None:
+                    value = min(value, self.max)
+                return value
+        return self.max
+
+
+class DBBenchHistograms(TimeSeriesData):
+    # This data source holds the latency histograms of one db_bench run,
+    # Dict[operation, Histogram], as of the time of the run. Its database
+    # wide (NO_ENTITY) time series have a single value each:
+    # - 'db_bench.<operation>.p<percentile>', e.g. 'db_bench.read.p99': the
+    #   percentile interpolated within the buckets of the histogram,
+    # - 'db_bench.<operation>.avg' and 'db_bench.<operation>.count'.
+    KEY_PREFIX = 'db_bench.'
+    PERCENTILE_REGEX = re.compile(r'^p(\d+(\.\d+)?)$')
+
+    def __init__(self, histograms, timestamp):
+        super().__init__()
+        self.histograms = histograms
+        self.timestamp = timestamp
+        self.stats_freq_sec = 0
+
+    def get_keys_from_conditions(self, conditions):
+        reqd_keys = []
+        for cond in conditions:
+            for key in cond.keys:
+                if key.startswith(self.KEY_PREFIX):
+                    reqd_keys.append(key)
+        return reqd_keys
+
+    def get_value(self, key):
+        # returns the value of the key or None if the run has no such value
+        operation, _, metric = key[len(self.KEY_PREFIX):].partition('.')
+        if operation not in self.histograms:
+            return None
+        histogram = self.histograms[operation]
+        if metric == 'avg':
+            return histogram.get_average()
+        if metric == 'count':
+            return histogram.count
+        match = self.PERCENTILE_REGEX.match(metric)
+        if match:
+            return histogram.get_percentile(float(match.group(1)))
+        return None
+
+    def fetch_timeseries(self, reqd_keys):
+        self.keys_ts = {NO_ENTITY: {}}
+        self.aligned_ts = None
+        for key in reqd_keys:
+            value = self.get_value(key)
+            if value is not None:
+                self.keys_ts[NO_ENTITY][key] = {self.timestamp: value}
@@ -0,0 +1,82 @@
+# Copyright (c) 2011-present, Facebook, Inc.  All rights reserved.
+#  This source code is licensed under both the GPLv2 (found in the
+#  COPYING file in the root directory) and Apache 2.0 License
+#  (found in the LICENSE.Apache file in the root directory).
+
+import hashlib
+import os
+import pickle
+
+
+class LogCache:
+    # An on-disk cache of what is parsed out of Rocksdb LOG files, so that
+    # repeated analyses of LOG files that have not changed do not parse them
+    # again. An entry holds one 'kind' of parsed data (for example the record
+    # offsets of a LOG file, the records of a LOG file that some regexes
+    # match, or the STATISTICS time series of a set of LOG files) and it is
+    # keyed by the identity of the files it was parsed from: their path,
+    # inode, size and modification time. An entry is ignored if any of these
+    # files has changed, or if it was written by another PARSER_VERSION,
+    # which must be bumped whenever the parsers change what they extract. The
+    # data is pickled, so it should be made of compact objects like arrays.
+    PARSER_VERSION = 3
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def get_file_identity(file_name):
+        file_stat = os.stat(file_name)
+        return (
+            os.path.abspath(file_name), file_stat.st_ino, file_stat.st_size,
+            file_stat.st_mtime_ns
+        )
+
+    def get_entry_path(self, kind, file_names):
+        # the entry of a kind of data is replaced when the files change, the
+        # identities of the files are checked when the entry is loaded
+        paths = '\n'.join(
+            os.path.abspath(file_name) for file_name in file_names
+        )
+        digest = hashlib.sha1((kind + '\n' + paths).encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest + '.' + kind)
+
+    def load(self, kind, file_names):
+        # returns the data cached for the files or None if there is no valid
+        # entry for them
+        try:
+            identities = [
+                self.get_file_identity(file_name) for file_name in file_names
+            ]
+            with open(self.get_entry_path(kind, file_names), 'rb') as fp:
+                header, data = pickle.load(fp)
+        except (
+            OSError, EOFError, ValueError, pickle.UnpicklingError,
+            AttributeError, ImportError, IndexError, TypeError
+        ):
+            # a corrupt or foreign entry is a cache miss
+            return None
+        if header != (self.PARSER_VERSION, kind, identities):
+            return None
+        return data
+
+    def store(self, kind, file_names, data):
+        try:
+            header = (
+                self.PARSER_VERSION,
+                kind,
+                [self.get_file_identity(file_name) for file_name in file_names]
+            )
+            os.makedirs(self.cache_dir, exist_ok=True)
+            entry_path = self.get_entry_path(kind, file_names)
+            # write the entry to a temporary file first, so that concurrent
+            # readers never see a partially written entry
+            temp_path = entry_path + '.' + str(os.getpid())
+            with open(temp_path, 'wb') as fp:
+                pickle.dump(
+                    (header, data), fp, protocol=pickle.HIGHEST_PROTOCOL
+                )
+            os.replace(temp_path, entry_path)
+        except OSError as e:
+            # the cache is an optimization, the analysis goes on without it
+            print('WARNING(LogCache) store: ' + str(e))
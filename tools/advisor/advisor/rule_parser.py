@@ -7,6 +7,7 @@ from abc import ABC, abstractmethod
 from advisor.db_log_parser import DataSource, NO_COL_FAMILY
 from advisor.db_timeseries_parser import TimeSeriesData
 from enum import Enum
+from advisor.expression_parser import CompiledExpression
 from advisor.ini_parser import IniParser
 import re
 
@@ -338,6 +339,14 @@ class LogCondition(Condition):
 
 
 class OptionCondition(Condition):
+    # the functions that the 'evaluate' expression may call on the values of
+    # the options, which are strings; they are pure builtins, so that their
+    # results can be memoized (see DatabaseOptions.memoize_conversion())
+    FUNCTIONS = {
+        'int': int, 'float': float, 'abs': abs, 'min': min, 'max': max,
+        'len': len
+    }
+
     @classmethod
     def create(cls, base_condition):
         base_condition.set_data_source(DataSource.Type['DB_OPTIONS'])
@@ -352,6 +361,7 @@ class OptionCondition(Condition):
                 self.options = value
         elif key == 'evaluate':
             self.eval_expr = value
+            self.compiled_expression = None
 
     def perform_checks(self):
         super().perform_checks()
@@ -359,6 +369,19 @@ class OptionCondition(Condition):
             raise ValueError(self.name + ': options missing in condition')
         if not self.eval_expr:
             raise ValueError(self.name + ': expression missing in condition')
+        try:
+            self.get_compiled_expression()
+        except ValueError as e:
+            raise ValueError(self.name + ': ' + str(e))
+
+    def get_compiled_expression(self):
+        # the 'eval_expr' may only use the 'options' of the condition, the
+        # FUNCTIONS, numbers, arithmetic and comparisons
+        if getattr(self, 'compiled_expression', None) is None:
+            self.compiled_expression = CompiledExpression(
+                self.eval_expr, 'options', self.FUNCTIONS
+            )
+        return self.compiled_expression
 
     def __repr__(self):
         opt_cond_str = "OptionCondition: " + self.name
@@ -390,6 +413,7 @@ class TimeSeriesCondition(Condition):
             self.window_sec = int(value)
         elif key == 'evaluate':
             self.expression = value
+            self.compiled_expression = None
         elif key == 'aggregation_op':
             self.aggregation_op = TimeSeriesData.AggregationOperator[value]
 
@@ -408,9 +432,22 @@ class TimeSeriesCondition(Condition):
         elif self.behavior is TimeSeriesData.Behavior.evaluate_expression:
             if not (self.expression):
                 raise ValueError(self.name + ': specify evaluation expression')
+            try:
+                self.get_compiled_expression()
+            except ValueError as e:
+                raise ValueError(self.name + ': ' + str(e))
         else:
             raise ValueError(self.name + ': trigger behavior not supported')
 
+    def get_compiled_expression(self):
+        # the 'expression' may only use the 'keys' of the condition, numbers,
+        # arithmetic and comparisons; see CompiledExpression
+        if getattr(self, 'compiled_expression', None) is None:
+            self.compiled_expression = CompiledExpression(
+                self.expression, 'keys'
+            )
+        return self.compiled_expression
+
     def __repr__(self):
         ts_cond_str = "TimeSeriesCondition: " + self.name
         ts_cond_str += (" statistics: " + str(self.keys))
@@ -502,16 +539,24 @@ class RulesSpec:
         return triggered_rules
 
     def trigger_conditions(self, data_sources):
+        cond_subsets = {}
         for source_type in data_sources:
             cond_subset = [
                 cond
                 for cond in self.conditions_dict.values()
                 if cond.get_data_source() is source_type
             ]
-            if not cond_subset:
-                continue
+            if cond_subset:
+                cond_subsets[source_type] = cond_subset
+        # all the data sources register their conditions before any of them
+        # is triggered, so that the sources reading the same LOG files can be
+        # served by a single pass of their shared LogScanner
+        for source_type in cond_subsets:
+            for source in data_sources[source_type]:
+                source.register_conditions(cond_subsets[source_type])
+        for source_type in cond_subsets:
             for source in data_sources[source_type]:
-                source.check_and_trigger_conditions(cond_subset)
+                source.check_and_trigger_conditions(cond_subsets[source_type])
 
     def print_rules(self, rules):
         for rule in rules:
@@ -0,0 +1,65 @@
+# Copyright (c) 2011-present, Facebook, Inc.  All rights reserved.
+#  This source code is licensed under both the GPLv2 (found in the
+#  COPYING file in the root directory) and Apache 2.0 License
+#  (found in the LICENSE.Apache file in the root directory).
+
+from calendar import timegm
+import re
+
+
+class TimestampParser:
+    # This class converts the timestamps printed by Rocksdb, in the format
+    # 'YYYY/MM/DD-HH:MM:SS.ffffff' (the microseconds are optional), to GMT Unix
+    # timestamps. The fields are sliced out of their fixed positions and the
+    # epoch of each date is memoized, so converting a timestamp costs a few
+    # int() calls instead of a time.strptime call.
+    TIMESTAMP_REGEX = re.compile(
+        r'\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}(\.\d{6})?'
+    )
+    MICROS_PER_SEC = 1000000
+    # Dict['YYYY/MM/DD', epoch at the start of that day]
+    date_epochs = {}
+
+    @staticmethod
+    def is_timestamp(hr_time):
+        return TimestampParser.TIMESTAMP_REGEX.match(hr_time)
+
+    @staticmethod
+    def get_date_epoch(date):
+        # example: '2018/07/25' will be converted to 1532476800
+        if date not in TimestampParser.date_epochs:
+            if date[4] != '/' or date[7] != '/':
+                raise ValueError('TimestampParser: bad date ' + date)
+            TimestampParser.date_epochs[date] = timegm(
+                (int(date[0:4]), int(date[5:7]), int(date[8:10]), 0, 0, 0)
+            )
+        return TimestampParser.date_epochs[date]
+
+    @staticmethod
+    def get_timestamp_micros(hr_time):
+        # example: '2018/07/25-11:25:45.782710' will be converted to the GMT
+        # Unix timestamp in microseconds 1532517945782710 (note: this method
+        # assumes that hr_time is in GMT)
+        if (
+            len(hr_time) < 19 or hr_time[10] != '-' or
+            hr_time[13] != ':' or hr_time[16] != ':'
+        ):
+            raise ValueError('TimestampParser: bad timestamp ' + hr_time)
+        timestamp = (
+            TimestampParser.get_date_epoch(hr_time[0:10]) +
+            int(hr_time[11:13]) * 3600 +
+            int(hr_time[14:16]) * 60 +
+            int(hr_time[17:19])
+        ) * TimestampParser.MICROS_PER_SEC
+        if len(hr_time) > 19 and hr_time[19] == '.':
+            timestamp += int(hr_time[20:26])
+        return timestamp
+
+    @staticmethod
+    def get_timestamp(hr_time):
+        # example: '2018/07/25-11:25:45.782710' will be converted to the GMT
+        # Unix timestamp 1532517945, the microseconds are dropped
+        return (
+            TimestampParser.get_timestamp_micros(hr_time) //
+            TimestampParser.MICROS_PER_SEC
+        )
@@ -0,0 +1,112 @@
+from advisor.db_background_jobs_parser import BackgroundJobsParser
+from advisor.db_log_parser import Log
+from advisor.db_timeseries_parser import NO_ENTITY
+from advisor.timestamp_parser import TimestampParser
+import os
+import unittest
+
+
+class TestBackgroundJobsParser(unittest.TestCase):
+    def setUp(self):
+        this_path = os.path.abspath(os.path.dirname(__file__))
+        logs_path_prefix = os.path.join(this_path, 'input_files/LOG-0')
+        self.background_jobs = BackgroundJobsParser(logs_path_prefix)
+
+    def test_get_busy_intervals(self):
+        self.background_jobs.fetch_timeseries([])
+        busy_intervals = self.background_jobs.get_busy_intervals()
+        # all the flushes ran on the same thread, the purge job (JOB 45) is
+        # neither a flush nor a compaction
+        self.assertListEqual(['7f82ba72e700'], list(busy_intervals.keys()))
+        self.assertListEqual(
+            [3, 10, 44],
+            sorted(
+                job.job_id for job in self.background_jobs.jobs.values()
+                if job.job_type == 'flush'
+            )
+        )
+        start_time, end_time, job_type = busy_intervals['7f82ba72e700'][0]
+        self.assertEqual('flush', job_type)
+        self.assertAlmostEqual(1.771626, end_time - start_time, places=5)
+
+    def test_fetch_timeseries(self):
+        self.background_jobs.fetch_timeseries([
+            'background.flush.busy_threads',
+            'background.flush.utilization',
+            'background.flush.slots_available',
+            'background.compaction.utilization'
+        ])
+        timeseries = self.background_jobs.keys_ts[NO_ENTITY]
+        minute = TimestampParser.get_timestamp('2018/05/25-14:30:00')
+        self.assertListEqual(
+            [minute, minute + 240],
+            sorted(timeseries['background.flush.busy_threads'].keys())
+        )
+        # the pool is a single thread
+        self.assertAlmostEqual(
+            (1.771626 + 1.796575) / 60,
+            timeseries['background.flush.utilization'][minute],
+            places=5
+        )
+        self.assertListEqual(
+            [1.0],
+            list(timeseries['background.flush.slots_available'].values())
+        )
+        self.assertNotIn('background.compaction.utilization', timeseries)
+
+    def test_get_job_type(self):
+        # the source location of the log is not part of its text
+        self.assertEqual(
+            'compaction',
+            BackgroundJobsParser.get_job_type(
+                '[db/db_impl_compaction_flush.cc:1973] [default] [JOB 7] ' +
+                'Compacting 4@0 files to L1, score 1.00'
+            )
+        )
+        self.assertEqual(
+            'flush',
+            BackgroundJobsParser.get_job_type(
+                '[db/db_impl_compaction_flush.cc:1421] [default] [JOB 3] ' +
+                'Flushing memtable with next log file: 8'
+            )
+        )
+        self.assertEqual(
+            'compaction',
+            BackgroundJobsParser.get_job_type(
+                'EVENT_LOG_v1 {"time_micros": 1527258625491635, "job": 7, ' +
+                '"event": "compaction_started", "flush_reason": "none"}'
+            )
+        )
+        self.assertIsNone(
+            BackgroundJobsParser.get_job_type(
+                '[db/db_impl_files.cc:261] [JOB 45] Delete 000084.sst'
+            )
+        )
+
+    def test_job_ids_of_sessions(self):
+        # the job ids start again after the database is reopened
+        lines = [
+            '2018/05/25-14:30:05.000000 7f82bd676200 RocksDB version: 5.14.0',
+            '2018/05/25-14:30:07.000000 7f82ba72e700 ' +
+            '[db/flush_job.cc:301] [default] [JOB 3] Flushing memtable',
+            '2018/05/25-14:30:08.000000 7f82ba72e700 ' +
+            '[db/flush_job.cc:371] [default] [JOB 3] Level-0 flush table ' +
+            '#10: 1890434 bytes OK',
+            '2018/05/25-15:00:05.000000 7f82bd676200 RocksDB version: 5.14.0',
+            '2018/05/25-15:00:07.000000 7f82ba72e700 ' +
+            '[db/flush_job.cc:301] [default] [JOB 3] Flushing memtable',
+            '2018/05/25-15:00:09.000000 7f82ba72e700 ' +
+            '[db/flush_job.cc:371] [default] [JOB 3] Level-0 flush table ' +
+            '#12: 1890434 bytes OK'
+        ]
+        self.background_jobs.reset_logs()
+        for line in lines:
+            self.background_jobs.process_log(Log(line, ['default']))
+        busy_intervals = self.background_jobs.get_busy_intervals()
+        self.assertListEqual(
+            [1.0, 2.0],
+            [
+                end_time - start_time
+                for start_time, end_time, _ in busy_intervals['7f82ba72e700']
+            ]
+        )
@@ -0,0 +1,96 @@
+from advisor.db_event_log_parser import EventLogParser, EventTable
+from advisor.db_timeseries_parser import NO_ENTITY
+from advisor.rule_parser import Condition, TimeSeriesCondition
+import os
+import unittest
+
+
+class TestEventTable(unittest.TestCase):
+    def test_add_row(self):
+        table = EventTable('table_file_creation')
+        table.add_row(1, {'file_size': 10, 'table_properties': {'a': 1}})
+        table.add_row(2, {'job': 4})
+        self.assertEqual(2, len(table))
+        self.assertListEqual([10, None], table.get_column('file_size'))
+        self.assertListEqual([1, None], table.get_column('table_properties.a'))
+        self.assertListEqual([None, 4], table.get_column('job'))
+        self.assertListEqual([None, None], table.get_column('missing'))
+
+
+class TestEventLogParser(unittest.TestCase):
+    def setUp(self):
+        this_path = os.path.abspath(os.path.dirname(__file__))
+        logs_path_prefix = os.path.join(this_path, 'input_files/LOG-0')
+        self.event_log = EventLogParser(logs_path_prefix)
+
+    def test_fetch_timeseries(self):
+        self.event_log.fetch_timeseries([
+            'table_file_creation.file_size',
+            'table_file_creation.table_properties.num_entries',
+            'flush_started.flush_reason'
+        ])
+        # only the required event types are parsed
+        self.assertSetEqual(
+            {'table_file_creation', 'flush_started'},
+            set(self.event_log.event_tables.keys())
+        )
+        self.assertDictEqual(
+            {1527283809.398276: 1890434, 1527283827.288158: 1893200,
+             1527284061.047181: 1890780},
+            self.event_log.keys_ts['default']['table_file_creation.file_size']
+        )
+        self.assertListEqual(
+            [27630, 27640, 27617],
+            list(self.event_log.keys_ts['default'][
+                'table_file_creation.table_properties.num_entries'
+            ].values())
+        )
+        self.assertDictEqual(
+            {1527283807.626732: 'Write Buffer Full'},
+            self.event_log.keys_ts[NO_ENTITY]['flush_started.flush_reason']
+        )
+
+    def test_check_and_trigger_conditions(self):
+        condition = TimeSeriesCondition.create(Condition('big-files'))
+        condition.set_parameter('keys', 'table_file_creation.file_size')
+        condition.set_parameter('behavior', 'evaluate_expression')
+        condition.set_parameter('evaluate', 'keys[0] > 1890500')
+        condition.set_parameter('aggregation_op', 'max')
+        self.event_log.check_and_trigger_conditions([condition])
+        self.assertDictEqual({'default': [1893200]}, condition.get_trigger())
+
+    def test_string_field_per_event(self):
+        conditions = []
+        for flush_reason in ['Write Buffer Full', 'Manual Flush']:
+            condition = TimeSeriesCondition.create(Condition(flush_reason))
+            condition.set_parameter('keys', 'flush_started.flush_reason')
+            condition.set_parameter('behavior', 'evaluate_expression')
+            condition.set_parameter(
+                'evaluate', "keys[0] == '" + flush_reason + "'"
+            )
+            condition.perform_checks()
+            conditions.append(condition)
+        self.event_log.check_and_trigger_conditions(conditions)
+        self.assertDictEqual(
+            {NO_ENTITY: {1527283807.626732: ['Write Buffer Full']}},
+            conditions[0].get_trigger()
+        )
+        self.assertIsNone(conditions[1].get_trigger())
+
+    def test_string_field_aggregations(self):
+        # the string fields have a max and a min, but no average
+        conditions = []
+        for aggregation_op in ['max', 'min', 'latest', 'avg', 'stddev']:
+            condition = TimeSeriesCondition.create(Condition(aggregation_op))
+            condition.set_parameter('keys', 'flush_started.flush_reason')
+            condition.set_parameter('behavior', 'evaluate_expression')
+            condition.set_parameter('evaluate', 'keys[0] != None')
+            condition.set_parameter('aggregation_op', aggregation_op)
+            conditions.append(condition)
+        self.event_log.check_and_trigger_conditions(conditions)
+        for condition in conditions[:3]:
+            self.assertDictEqual(
+                {NO_ENTITY: ['Write Buffer Full']}, condition.get_trigger()
+            )
+        for condition in conditions[3:]:
+            self.assertIsNone(condition.get_trigger())
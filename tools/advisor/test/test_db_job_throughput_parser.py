@@ -0,0 +1,60 @@
+from advisor.db_job_throughput_parser import JobThroughputParser
+from advisor.rule_parser import Condition, TimeSeriesCondition
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestJobThroughputParser(unittest.TestCase):
+    def setUp(self):
+        this_path = os.path.abspath(os.path.dirname(__file__))
+        self.logs_path_prefix = os.path.join(this_path, 'input_files/LOG-0')
+
+    def test_flush_jobs(self):
+        job_throughput = JobThroughputParser(
+            self.logs_path_prefix, ['default']
+        )
+        job_throughput.fetch_timeseries(
+            ['flush.L0.bytes_written', 'flush.L0.duration_sec']
+        )
+        timeseries = job_throughput.keys_ts['default']
+        self.assertListEqual(
+            [1890434.0, 1893200.0, 1890780.0],
+            list(timeseries['flush.L0.bytes_written'].values())
+        )
+        # the start of the last flush is not in the LOG file
+        durations = list(timeseries['flush.L0.duration_sec'].values())
+        self.assertEqual(2, len(durations))
+        self.assertAlmostEqual(1.771611, durations[0], places=5)
+        self.assertAlmostEqual(1.796575, durations[1], places=5)
+
+    def test_compaction_jobs(self):
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        log_path = os.path.join(log_dir, 'LOG')
+        with open(log_path, 'w') as fp:
+            fp.write(
+                '2018/05/25-14:34:21.049000 7f82bd676200 (Original Log Time ' +
+                '2018/05/25-14:34:21.048990) [db/compaction_job.cc:642] ' +
+                '[col-fam-A] compacted to: base level 1 max bytes base ' +
+                '268435456 files[0 5 0 0 0 0 0] max score 0.91, MB/sec: ' +
+                '100.0 rd, 50.0 wr, level 1, files in(4, 1) out(1) ' +
+                'MB in(200.0, 100.0) out(150.0), read-write-amplify(2.2) ' +
+                'write-amplify(0.8) OK, records in: 100, records dropped: 0 ' +
+                'output_compression: Snappy\n'
+            )
+        job_throughput = JobThroughputParser(log_path, ['col-fam-A'])
+        condition = TimeSeriesCondition.create(Condition('slow-compaction'))
+        condition.set_parameter('keys', [
+            'compaction.L1.duration_sec', 'compaction.L1.write_amplify'
+        ])
+        condition.set_parameter('behavior', 'evaluate_expression')
+        condition.set_parameter('evaluate', 'keys[0] > 3 and keys[1] < 1')
+        condition.set_parameter('aggregation_op', 'max')
+        job_throughput.check_and_trigger_conditions([condition])
+        trigger = condition.get_trigger()
+        self.assertListEqual(['col-fam-A'], list(trigger.keys()))
+        # 300 MB read at 100 bytes per microsecond
+        self.assertAlmostEqual(3.145728, trigger['col-fam-A'][0])
+        self.assertEqual(0.8, trigger['col-fam-A'][1])
@@ -1,6 +1,11 @@
-from advisor.db_log_parser import DatabaseLogs, Log, NO_COL_FAMILY
+from advisor.db_log_parser import (
+    DatabaseLogs, Log, LogConditionMatcher, LogScanner, LogTimeIndex,
+    NO_COL_FAMILY
+)
 from advisor.rule_parser import Condition, LogCondition
 import os
+import shutil
+import tempfile
 import unittest
 
 
@@ -24,6 +29,19 @@ class TestLog(unittest.TestCase):
         db_log.append_message('[default] some remaining part of log')
         self.assertEqual(NO_COL_FAMILY, db_log.get_column_family())
 
+        # the earlier column family in the list wins if a log mentions many
+        test_log = (
+            "2018/05/25-14:34:21.047233 7f82ba72e700 [db/db_impl.cc:371] " +
+            "[col_fam_A] [default] [JOB 44] some message"
+        )
+        db_log = Log(test_log, self.column_families)
+        self.assertEqual('default', db_log.get_column_family())
+        column_family_index = Log.get_column_family_index(
+            self.column_families
+        )
+        db_log = Log(test_log, column_family_index)
+        self.assertEqual('default', db_log.get_column_family())
+
     def test_get_methods(self):
         hr_time = "2018/05/25-14:30:25.491635"
         context = "7f82ba72e700"
@@ -45,6 +63,24 @@ class TestLog(unittest.TestCase):
             db_log.get_message(), str(message + '\n' + remaining_message)
         )
 
+    def test_message_contains(self):
+        record = (
+            b'2018/05/25-14:34:21.047233 7f82ba72e700 [db/db_impl.cc:371] '
+            b'Stalling  writes\tbecause we have 4 level-0 files\n'
+        )
+        substrings = {
+            'writes because': True, 'writes  because': True,
+            'Stalling writes': True, ' Stalling writes ': True,
+            'we have 4': True, 'writesbecause': False,
+            '7f82ba72e700': False, 'writes because they': False
+        }
+        for substring, expected in substrings.items():
+            # the same result before and after the log is decoded
+            db_log = Log.from_record(record, 0, len(record), {})
+            self.assertEqual(expected, db_log.message_contains(substring))
+            db_log.decode()
+            self.assertEqual(expected, db_log.message_contains(substring))
+
     def test_is_new_log(self):
         new_log = "2018/05/25-14:34:21.047233 context random new log"
         remaining_log = "2018/05/25 not really a new log"
@@ -96,3 +132,399 @@ class TestDatabaseLogs(unittest.TestCase):
             "remaining part of the log"
         )
         self.assertIsNone(condition3.get_trigger())
+        # the logs of the triggers do not keep the LOG file mapped
+        for trigger in [cond1_trigger, cond2_trigger]:
+            for logs in trigger.values():
+                self.assertTrue(all(log.buffer is None for log in logs))
+
+
+class TestLogScanner(unittest.TestCase):
+    class LogCounter:
+        def __init__(self):
+            self.num_logs = 0
+
+        def process_log(self, log):
+            self.num_logs += 1
+
+    def setUp(self):
+        this_path = os.path.abspath(os.path.dirname(__file__))
+        self.logs_path_prefix = os.path.join(this_path, 'input_files/LOG-0')
+        self.column_families = ['default', 'col-fam-A', 'col-fam-B']
+
+    def test_shared_scan(self):
+        log_scanner = LogScanner(self.logs_path_prefix, self.column_families)
+        db_logs = DatabaseLogs(
+            self.logs_path_prefix, self.column_families, log_scanner
+        )
+        log_counter = self.LogCounter()
+        condition = LogCondition.create(Condition('cond-A'))
+        condition.set_parameter('regex', 'random log message')
+        db_logs.register_conditions([condition])
+        log_scanner.register(log_counter)
+        db_logs.check_and_trigger_conditions([condition])
+        # both consumers were served by the same pass over the LOG file
+        self.assertEqual(29, log_counter.num_logs)
+        self.assertSetEqual(
+            {'col-fam-A', NO_COL_FAMILY}, set(condition.get_trigger().keys())
+        )
+        # scanning again is a no-op since no new consumer was registered
+        log_scanner.scan()
+        self.assertEqual(29, log_counter.num_logs)
+        self.assertEqual(2, len(condition.get_trigger()['col-fam-A']))
+
+    def test_early_exit(self):
+        class DatabaseLogsCounter(DatabaseLogs):
+            def process_log(self, log):
+                self.num_logs = getattr(self, 'num_logs', 0) + 1
+                return super().process_log(log)
+
+        for full_evidence, num_logs, num_stops in [
+            (False, 7, 1), (True, 29, 3)
+        ]:
+            log_scanner = LogScanner(self.logs_path_prefix, ['default'])
+            db_logs = DatabaseLogsCounter(
+                self.logs_path_prefix, ['default'], log_scanner,
+                full_evidence=full_evidence
+            )
+            condition = LogCondition.create(Condition('stop'))
+            condition.set_parameter('regex', 'Stopping writes')
+            db_logs.check_and_trigger_conditions([condition])
+            # the first match triggers the condition for the only column
+            # family, so the scan stops there unless full_evidence is set
+            self.assertEqual(num_logs, db_logs.num_logs)
+            self.assertEqual(
+                num_stops, len(condition.get_trigger()['default'])
+            )
+        # a consumer that shares the scanner still gets all the logs
+        log_scanner = LogScanner(self.logs_path_prefix, ['default'])
+        db_logs = DatabaseLogsCounter(
+            self.logs_path_prefix, ['default'], log_scanner
+        )
+        log_counter = self.LogCounter()
+        log_scanner.register(log_counter)
+        condition = LogCondition.create(Condition('stop'))
+        condition.set_parameter('regex', 'Stopping writes')
+        db_logs.check_and_trigger_conditions([condition])
+        self.assertEqual(7, db_logs.num_logs)
+        self.assertEqual(29, log_counter.num_logs)
+
+    def test_get_record_offsets(self):
+        log_bytes = (
+            b"2018/05/25-14:34:21.049010 7f82bd676200 first log\n" +
+            b"remaining part of the log\n" +
+            b"2018/05/25 not really a new log\n" +
+            b"2018/05/25-14:34:21.049020 7f82bd676200 second log\n"
+        )
+        self.assertListEqual(
+            [0, 108],
+            list(LogScanner.get_record_offsets(log_bytes, 0, len(log_bytes)))
+        )
+        self.assertListEqual(
+            [108],
+            list(LogScanner.get_record_offsets(log_bytes, 49, len(log_bytes)))
+        )
+
+    def test_incremental_scan(self):
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        log_path = os.path.join(log_dir, 'LOG')
+        with open(self.logs_path_prefix, 'r') as fp:
+            lines = fp.readlines()
+        log_scanner = LogScanner(
+            log_path, self.column_families, incremental=True
+        )
+        db_logs = DatabaseLogs(log_path, self.column_families, log_scanner)
+        condition1 = LogCondition.create(Condition('cond-A'))
+        condition1.set_parameter('regex', 'random log message')
+        condition2 = LogCondition.create(Condition('cond-B'))
+        condition2.set_parameter('regex', 'continuing on next line')
+        log_counter = self.LogCounter()
+        # the last record and the partially written line are held back
+        with open(log_path, 'w') as fp:
+            fp.writelines(lines[:27])
+            fp.write(lines[27][:10])
+        log_scanner.register(log_counter)
+        db_logs.check_and_trigger_conditions([condition1, condition2])
+        self.assertEqual(26, log_counter.num_logs)
+        self.assertEqual(1, len(condition1.get_trigger()['col-fam-A']))
+        self.assertIsNone(condition2.get_trigger())
+        # only the appended records are scanned and the triggers are carried
+        # forward, even if the conditions are reloaded
+        with open(log_path, 'a') as fp:
+            fp.write(lines[27][10:])
+            fp.write(lines[28])
+        condition1 = LogCondition.create(Condition('cond-A'))
+        condition1.set_parameter('regex', 'random log message')
+        log_scanner.register(log_counter)
+        db_logs.check_and_trigger_conditions([condition1, condition2])
+        self.assertEqual(27, log_counter.num_logs)
+        self.assertEqual(1, len(condition1.get_trigger()['col-fam-A']))
+        self.assertEqual(
+            condition2.get_trigger()['col-fam-B'][0].get_message(),
+            "[db/db_impl.cc:234] [col-fam-B] log continuing on next line\n" +
+            "remaining part of the log"
+        )
+        # the rotated LOG file is read till its end before the new LOG file
+        os.rename(log_path, log_path + '.old.1527284061049020')
+        with open(log_path, 'w') as fp:
+            fp.writelines(lines[29:])
+        log_scanner.register(log_counter)
+        db_logs.check_and_trigger_conditions([condition1, condition2])
+        self.assertEqual(28, log_counter.num_logs)
+        self.assertEqual(2, len(condition1.get_trigger()['col-fam-A']))
+        self.assertNotIn(NO_COL_FAMILY, condition1.get_trigger())
+
+    def test_rotated_files(self):
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        log_path = os.path.join(log_dir, 'LOG')
+        message = '2018/05/25-14:34:2%d.000000 7f82bd676200 [%s] log %d\n'
+        # the time ranges of the rotated files overlap, so their logs are
+        # merged by time; the live LOG file begins after both of them
+        with open(log_path + '.old.1527284062000000', 'w') as fp:
+            for ix in [1, 3, 5]:
+                fp.write(message % (ix, 'default', ix))
+        with open(log_path + '.old.1527284066000000', 'w') as fp:
+            for ix in [2, 4]:
+                fp.write(message % (ix, 'col-fam-A', ix))
+        with open(log_path, 'w') as fp:
+            for ix in [6, 7]:
+                fp.write(message % (ix, 'col-fam-B', ix))
+
+        class LogCollector:
+            def __init__(self):
+                self.logs = []
+
+            def process_log(self, log):
+                self.logs.append(log)
+
+        for num_workers in [1, 3]:
+            log_scanner = LogScanner(
+                log_path, self.column_families, include_rotated=True,
+                num_workers=num_workers
+            )
+            log_collector = LogCollector()
+            log_scanner.register(log_collector)
+            log_scanner.scan()
+            self.assertListEqual(
+                ['[default] log 1', '[col-fam-A] log 2', '[default] log 3',
+                 '[col-fam-A] log 4', '[default] log 5', '[col-fam-B] log 6',
+                 '[col-fam-B] log 7'],
+                [log.get_message() for log in log_collector.logs]
+            )
+        # the rotated files are skipped by default
+        log_scanner = LogScanner(log_path, self.column_families)
+        log_collector = LogCollector()
+        log_scanner.register(log_collector)
+        log_scanner.scan()
+        self.assertEqual(2, len(log_collector.logs))
+        # only the logs within the time window are scanned
+        log_scanner = LogScanner(
+            log_path, self.column_families, include_rotated=True,
+            start_time=1527258862, end_time=1527258866
+        )
+        log_collector = LogCollector()
+        log_scanner.register(log_collector)
+        log_scanner.scan()
+        self.assertListEqual(
+            [2, 3, 4, 5, 6],
+            [int(log.get_message()[-1]) for log in log_collector.logs]
+        )
+
+    def test_worker_matches(self):
+        class DatabaseLogsCounter(DatabaseLogs):
+            def process_log(self, log):
+                self.num_logs = getattr(self, 'num_logs', 0) + 1
+                return super().process_log(log)
+
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        log_path = os.path.join(log_dir, 'LOG')
+        # the LOG file is rotated, and the live LOG file has one more match
+        os.symlink(self.logs_path_prefix, log_path + '.old.1527284061049030')
+        with open(log_path, 'w') as fp:
+            fp.write(
+                '2018/05/25-14:34:22.000000 7f82bd676200 [db/db_impl.cc:563] '
+                '[col-fam-B] random log message after the rotation\n'
+            )
+        triggers = []
+        for num_workers in [1, 3]:
+            log_scanner = LogScanner(
+                log_path, self.column_families, include_rotated=True,
+                num_workers=num_workers
+            )
+            db_logs = DatabaseLogsCounter(
+                log_path, self.column_families, log_scanner,
+                full_evidence=True
+            )
+            log_counter = self.LogCounter()
+            log_scanner.register(log_counter)
+            condition = LogCondition.create(Condition('cond-A'))
+            condition.set_parameter('regex', 'random log message')
+            db_logs.check_and_trigger_conditions([condition])
+            triggers.append({
+                col_fam: [log.get_message() for log in logs]
+                for col_fam, logs in condition.get_trigger().items()
+            })
+            self.assertEqual(30, log_counter.num_logs)
+            num_matches = sum(len(logs) for logs in triggers[-1].values())
+            # the workers hand DatabaseLogs only the matching logs
+            if num_workers > 1:
+                self.assertEqual(num_matches, db_logs.num_logs)
+            else:
+                self.assertEqual(log_counter.num_logs, db_logs.num_logs)
+        self.assertDictEqual(triggers[0], triggers[1])
+        self.assertIn('col-fam-B', triggers[0])
+
+
+class TestLogTimeIndex(unittest.TestCase):
+    def setUp(self):
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        self.log_path = os.path.join(log_dir, 'LOG')
+        # one log every 30 seconds, from 2018/05/25-14:00:00 (1527256800)
+        self.message = '2018/05/25-14:%02d:%02d.000000 7f82bd676200 log %d\n'
+        self.write_logs(range(10))
+
+    def write_logs(self, log_ids):
+        with open(self.log_path, 'a') as fp:
+            for ix in log_ids:
+                fp.write(self.message % (ix // 2, (ix % 2) * 30, ix))
+
+    def get_logs(self, start_time, end_time):
+        class LogCollector:
+            def __init__(self):
+                self.logs = []
+
+            def process_log(self, log):
+                self.logs.append(int(log.get_message().split()[-1]))
+
+        log_collector = LogCollector()
+        log_scanner = LogScanner(
+            self.log_path, [], start_time=start_time, end_time=end_time
+        )
+        log_scanner.register(log_collector)
+        log_scanner.scan()
+        return log_collector.logs
+
+    def test_offset_range(self):
+        log_map = LogScanner.map_log_file(self.log_path)
+        record_size = len(self.message % (0, 0, 0))
+        time_index = LogTimeIndex(self.log_path)
+        self.assertTrue(time_index.update(log_map, 1))
+        self.assertListEqual(
+            [1527256800 + 60 * ix for ix in range(5)],
+            time_index.bucket_timestamps
+        )
+        self.assertListEqual(
+            [2 * record_size * ix for ix in range(5)],
+            time_index.bucket_offsets
+        )
+        self.assertFalse(time_index.update(log_map, 1))
+        self.assertTupleEqual(
+            (2 * record_size, 4 * record_size),
+            time_index.get_offset_range(
+                1527256800 + 90, 1527256800 + 90, len(log_map)
+            )
+        )
+        self.assertTupleEqual(
+            (0, len(log_map)),
+            time_index.get_offset_range(None, None, len(log_map))
+        )
+
+    def test_persisted_index(self):
+        self.assertListEqual([3, 4, 5], self.get_logs(
+            1527256800 + 90, 1527256800 + 150
+        ))
+        index_path = LogTimeIndex.get_index_path(self.log_path)
+        self.assertTrue(os.path.isfile(index_path))
+        # the LOG file grows, the index is extended from where it stopped
+        self.write_logs(range(10, 14))
+        self.assertListEqual([9, 10, 11], self.get_logs(
+            1527256800 + 270, 1527256800 + 330
+        ))
+        time_index = LogTimeIndex(self.log_path)
+        time_index.load()
+        self.assertEqual(7, len(time_index.bucket_timestamps))
+        self.assertEqual(
+            os.path.getsize(self.log_path) - len(self.message % (6, 30, 13)),
+            time_index.indexed_offset
+        )
+        # a new LOG file with the same name invalidates the index
+        os.remove(self.log_path)
+        self.write_logs(range(4))
+        self.assertListEqual([2, 3], self.get_logs(1527256800 + 60, None))
+
+
+class TestLogConditionMatcher(unittest.TestCase):
+    def test_get_literal_prefix(self):
+        self.assertEqual(
+            'stopping writes because we have ',
+            LogConditionMatcher.get_literal_prefix(
+                'Stopping writes because we have \\d+ level-0 files'
+            )
+        )
+        self.assertEqual(
+            'compacted (',
+            LogConditionMatcher.get_literal_prefix('compacted \\(\\d+')
+        )
+        self.assertEqual(
+            'file', LogConditionMatcher.get_literal_prefix('files? deleted')
+        )
+        self.assertIsNone(LogConditionMatcher.get_literal_prefix('\\d+ ok'))
+        self.assertIsNone(
+            LogConditionMatcher.get_literal_prefix('stall|stop writes')
+        )
+
+    def test_get_matching_conditions(self):
+        regexes = [
+            'Stopping writes because we have \\d+ level-0 files',
+            '\\d+ level-0 files',
+            'st(all|opp)ing writes',
+            'this should match no log'
+        ]
+        conditions = []
+        for ix, regex in enumerate(regexes):
+            cond = LogCondition.create(Condition('cond-' + str(ix)))
+            cond.set_parameter('regex', regex)
+            conditions.append(cond)
+        matcher = LogConditionMatcher(conditions)
+        self.assertListEqual(
+            conditions[:3],
+            matcher.get_matching_conditions(
+                '[default] STOPPING writes because we have 4 level-0 files'
+            )
+        )
+        self.assertListEqual(
+            [conditions[2]],
+            matcher.get_matching_conditions('[default] Stalling writes')
+        )
+        self.assertListEqual(
+            [], matcher.get_matching_conditions('[default] Flushing memtable')
+        )
+
+    def test_uncombinable_regexes(self):
+        # valid regexes that cannot be combined into one alternation, because
+        # of a global flag or of a group name used twice
+        regexes = [
+            '(?i)stall.*writes',
+            '(?P<n>\\d+) level-0 files',
+            '(?P<n>\\d+) immutable memtables'
+        ]
+        conditions = []
+        for ix, regex in enumerate(regexes):
+            cond = LogCondition.create(Condition('cond-' + str(ix)))
+            cond.set_parameter('regex', regex)
+            conditions.append(cond)
+        matcher = LogConditionMatcher(conditions)
+        self.assertIsNone(matcher.combined_regex)
+        self.assertListEqual(
+            conditions[:2],
+            matcher.get_matching_conditions(
+                '[default] Stalling writes because we have 4 level-0 files'
+            )
+        )
+        self.assertListEqual(
+            [conditions[2]],
+            matcher.get_matching_conditions('[default] 2 immutable memtables')
+        )
@@ -0,0 +1,134 @@
+from advisor.db_log_parser import NO_COL_FAMILY
+from advisor.db_options_parser import DatabaseOptions
+from advisor.rule_parser import Condition, OptionCondition, RulesSpec
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestDatabaseOptions(unittest.TestCase):
+    def setUp(self):
+        this_path = os.path.abspath(os.path.dirname(__file__))
+        self.db_options = DatabaseOptions(
+            os.path.join(this_path, 'input_files/OPTIONS-000005'),
+            ['bloom_bits=2']
+        )
+        # a column family with the same options as 'default' but for the
+        # write buffer size
+        options = self.db_options.get_all_options()
+        self.db_options.update_options({
+            option: {'cf_A': values['default']}
+            for option, values in options.items() if 'default' in values
+        })
+        self.db_options.update_options({
+            'CFOptions.write_buffer_size': {'cf_A': '1048576'}
+        })
+        self.db_options.column_families.append('cf_A')
+
+    def get_condition(self, options, expression):
+        condition = OptionCondition.create(Condition('option-condition'))
+        condition.set_parameter('options', options)
+        condition.set_parameter('evaluate', expression)
+        condition.perform_checks()
+        return condition
+
+    def test_check_and_trigger_conditions(self):
+        cf_condition = self.get_condition(
+            ['CFOptions.level0_file_num_compaction_trigger',
+             'CFOptions.write_buffer_size',
+             'CFOptions.max_bytes_for_level_base'],
+            'int(options[0])*int(options[1])-int(options[2])<0'
+        )
+        db_condition = self.get_condition(
+            ['bloom_bits', 'DBOptions.db_write_buffer_size'],
+            'int(options[0]) > int(options[1])'
+        )
+        # the expression raises for every column family
+        error_condition = self.get_condition(
+            ['CFOptions.max_bytes_for_level_multiplier'],
+            'int(options[0]) > 1'
+        )
+        self.db_options.check_and_trigger_conditions(
+            [cf_condition, db_condition, error_condition]
+        )
+        self.assertDictEqual(
+            {'default': ['4', '4194000', '268435456'],
+             'cf_A': ['4', '1048576', '268435456']},
+            cf_condition.get_trigger()
+        )
+        self.assertDictEqual(
+            {NO_COL_FAMILY: ['2', '0']}, db_condition.get_trigger()
+        )
+        self.assertFalse(error_condition.is_triggered())
+        # the conversions are memoized by value, so an updated option is
+        # converted anew
+        self.db_options.update_options({
+            'CFOptions.write_buffer_size': {'cf_A': '134217728'}
+        })
+        cf_condition.set_trigger(None)
+        self.db_options.check_and_trigger_conditions([cf_condition])
+        self.assertListEqual(['default'], list(cf_condition.get_trigger()))
+
+    def test_functions(self):
+        condition = self.get_condition(
+            ['CFOptions.write_buffer_size', 'DBOptions.db_write_buffer_size',
+             'bloom_bits'],
+            'max(int(options[0]), int(options[1])) >= 4194000 and ' +
+            'abs(min(int(options[2]), 0)) == 0 and len(options[2]) == 1'
+        )
+        self.db_options.check_and_trigger_conditions([condition])
+        self.assertListEqual(['default'], list(condition.get_trigger()))
+        # a function that raises only skips the condition
+        condition = self.get_condition(
+            ['CFOptions.write_buffer_size'], 'abs(options[0]) > 0'
+        )
+        self.db_options.check_and_trigger_conditions([condition])
+        self.assertFalse(condition.is_triggered())
+
+    def test_string_comparison(self):
+        # the option values are strings, so the rules compare them to strings
+        rules_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, rules_dir)
+        rules_path = os.path.join(rules_dir, 'rules.ini')
+        with open(rules_path, 'w') as fp:
+            fp.write(
+                '[Condition "wal-flush"]\n' +
+                'source=OPTIONS\n' +
+                'options=DBOptions.manual_wal_flush\n' +
+                "evaluate=options[0] == 'false'\n" +
+                '[Condition "leveled"]\n' +
+                'source=OPTIONS\n' +
+                'options=CFOptions.level0_file_num_compaction_trigger' +
+                ':CFOptions.compaction_style\n' +
+                "evaluate=int(options[0]) > 0 and options[1] != 'false' " +
+                "and options[1] in ('kCompactionStyleLevel', None)\n" +
+                '[Condition "universal"]\n' +
+                'source=OPTIONS\n' +
+                'options=CFOptions.compaction_style\n' +
+                "evaluate=options[0] == 'kCompactionStyleUniversal'\n"
+            )
+        rules_spec = RulesSpec(rules_path)
+        rules_spec.load_rules_from_spec()
+        rules_spec.perform_section_checks()
+        conditions = rules_spec.get_conditions_dict()
+        self.db_options.check_and_trigger_conditions(
+            list(conditions.values())
+        )
+        self.assertDictEqual(
+            {NO_COL_FAMILY: ['false']}, conditions['wal-flush'].get_trigger()
+        )
+        self.assertSetEqual(
+            {'default', 'cf_A'}, set(conditions['leveled'].get_trigger())
+        )
+        self.assertFalse(conditions['universal'].is_triggered())
+
+    def test_unsafe_expression(self):
+        with self.assertRaises(ValueError):
+            self.get_condition(
+                ['bloom_bits'], "__import__('os').system('true')"
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
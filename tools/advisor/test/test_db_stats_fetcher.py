@@ -0,0 +1,386 @@
+from advisor import db_timeseries_parser, expression_parser
+from advisor.db_log_parser import Log
+from advisor.db_stats_fetcher import LogStatsParser
+from advisor.db_timeseries_parser import NO_ENTITY, is_gap, numpy
+from advisor.expression_parser import CompiledExpression
+from advisor.rule_parser import Condition, TimeSeriesCondition
+from unittest import mock
+import math
+import unittest
+
+
+class TestLogStatsParser(unittest.TestCase):
+    def setUp(self):
+        self.log_stats = LogStatsParser('no/such/LOG', 60)
+        self.log_stats.keys_ts = {NO_ENTITY: {}}
+        self.stats_log = Log(
+            '2018/07/25-17:29:05.176080 7f969de68700 [WARN] ' +
+            '[db/db_impl.cc:485] STATISTICS:', []
+        )
+        self.stats_log.append_lines([
+            'rocksdb.block.cache.miss COUNT : 1459',
+            ' rocksdb.block.cache.hit COUNT : 37',
+            'rocksdb.db.get.micros P50 : 15.6 P95 : 39.7 P99 : 62.6 ' +
+            'P100 : 148.0',
+            'rocksdb.db.write.micros P50 : 1.5 P95 : 2.9 P99.9 : 3.5'
+        ])
+
+    def test_get_stat_prefixes(self):
+        self.assertDictEqual(
+            {'rocksdb.db.get.micros': {
+                'rocksdb.db.get.micros.p99', 'rocksdb.db.get.micros.p50'
+            }, 'rocksdb.block.cache.hit': {'rocksdb.block.cache.hit.count'},
+                'rocksdb.db.write.micros': {'rocksdb.db.write.micros.p99.9'}},
+            LogStatsParser.get_stat_prefixes([
+                'rocksdb.db.get.micros.p99', 'rocksdb.db.get.micros.p50',
+                'rocksdb.block.cache.hit.count',
+                'rocksdb.db.write.micros.p99.9'
+            ])
+        )
+
+    def test_add_to_timeseries(self):
+        self.log_stats.add_to_timeseries(
+            self.stats_log,
+            ['rocksdb.block.cache.hit.count', 'rocksdb.db.get.micros.p99',
+             'rocksdb.db.write.micros.p99.9']
+        )
+        self.assertDictEqual(
+            {'rocksdb.block.cache.hit.count': {1532539745: 37.0},
+             'rocksdb.db.get.micros.p99': {1532539745: 62.6},
+             'rocksdb.db.write.micros.p99.9': {1532539745: 3.5}},
+            self.log_stats.keys_ts[NO_ENTITY]
+        )
+        # the stat prefixes can be computed once for all the dumps
+        reqd_stats = ['rocksdb.db.get.micros.p50']
+        self.log_stats.add_to_timeseries(
+            self.stats_log, reqd_stats,
+            LogStatsParser.get_stat_prefixes(reqd_stats)
+        )
+        self.assertEqual(
+            {1532539745: 15.6},
+            self.log_stats.keys_ts[NO_ENTITY]['rocksdb.db.get.micros.p50']
+        )
+        # all the stats are added if no stats are required
+        self.log_stats.add_to_timeseries(self.stats_log, None)
+        self.assertEqual(9, len(self.log_stats.keys_ts[NO_ENTITY]))
+
+    def test_stats_dumps(self):
+        dump_log = Log(
+            '2018/07/25-17:29:05.176070 7f969de68700 [db/db_impl.cc:647] ',
+            ['default']
+        )
+        dump_log.append_lines([
+            '** DB Stats **',
+            'Uptime(secs): 60.0 total, 60.0 interval',
+            'Cumulative writes: 1000K writes, 1000K keys, 999K commit ' +
+            'groups, 1.0 writes per commit group, ingest: 0.12 GB, 2.05 MB/s',
+            'Cumulative WAL: 1000K writes, 0 syncs, 1000000.00 writes per ' +
+            'sync, written: 0.12 GB, 2.05 MB/s',
+            'Cumulative stall: 00:01:1.500 H:M:S, 2.5 percent',
+            'Interval stall: 00:00:0.000 H:M:S, 0.0 percent',
+            '',
+            '** Compaction Stats [default] **',
+            'Level    Files   Size     Score Read(GB)  Rn(GB) W-Amp ' +
+            'Comp(sec) KeyIn',
+            '-------------------------------------------------------------',
+            '  L0      2/1   59.57 MB   0.5      0.0     0.0   1.0       1 ' +
+            '     0',
+            ' Sum      7/0    1.50 GB   0.0      1.2     0.4   3.5      12 ' +
+            '  1500K',
+            'Uptime(secs): 60.0 total, 60.0 interval',
+            'Flush(GB): cumulative 0.114, interval 0.114'
+        ])
+        self.log_stats.parsed_stats = [
+            'db_stats.cumulative.stall_sec', 'l0.score', 'sum.w-amp'
+        ]
+        self.log_stats.process_log(dump_log)
+        self.assertDictEqual(
+            {NO_ENTITY: {'db_stats.cumulative.stall_sec': {1532539745: 61.5}},
+             'default': {'l0.score': {1532539745: 0.5},
+                         'sum.w-amp': {1532539745: 3.5}}},
+            self.log_stats.keys_ts
+        )
+        db_stats = LogStatsParser.parse_db_stats(
+            dump_log.get_message().split('\n')
+        )
+        self.assertEqual(1e6, db_stats['db_stats.cumulative.wal_writes'])
+        self.assertEqual(999e3, db_stats['db_stats.cumulative.commit_groups'])
+        self.assertEqual(2.5, db_stats['db_stats.cumulative.stall_percent'])
+        self.assertEqual(0.0, db_stats['db_stats.interval.stall_sec'])
+        compaction_stats = LogStatsParser.parse_compaction_stats(
+            dump_log.get_message().split('\n')
+        )['default']
+        self.assertEqual(18, len(compaction_stats))
+        self.assertEqual(1.0, compaction_stats['l0.files_in_compaction'])
+        self.assertEqual(1.5 * 1024 ** 3, compaction_stats['sum.size'])
+        self.assertEqual(1.5e6, compaction_stats['sum.keyin'])
+
+    def test_counter_deltas(self):
+        timeseries = {100: 10.0, 160: 70.0, 220: 40.0, 280: 100.0, 340: 30.0}
+        # the counter dropped at 220 and the database restarted at 300
+        deltas, rates = LogStatsParser.get_counter_deltas(timeseries, [300])
+        self.assertDictEqual(
+            {160: 60.0, 220: 40.0, 280: 60.0, 340: 30.0}, deltas
+        )
+        self.assertDictEqual(
+            {160: 1.0, 220: 40.0 / 60, 280: 1.0, 340: 0.75}, rates
+        )
+        self.log_stats.reqd_stats = [
+            'rocksdb.block.cache.hit.count.rate',
+            'rocksdb.db.get.micros.p99.delta'
+        ]
+        self.log_stats.restart_times = [300]
+        self.log_stats.keys_ts = {NO_ENTITY: {
+            'rocksdb.block.cache.hit.count': timeseries,
+            'rocksdb.db.get.micros.p99': timeseries
+        }}
+        self.log_stats.add_counter_timeseries()
+        self.assertDictEqual(
+            rates,
+            dict(self.log_stats.keys_ts[NO_ENTITY][
+                'rocksdb.block.cache.hit.count.rate'
+            ])
+        )
+        # percentiles are not cumulative
+        self.assertNotIn(
+            'rocksdb.db.get.micros.p99.delta',
+            self.log_stats.keys_ts[NO_ENTITY]
+        )
+
+    def test_histogram_aggregations(self):
+        self.log_stats.reqd_stats = [
+            'rocksdb.db.get.micros.avg', 'rocksdb.db.get.micros.p99'
+        ]
+        self.log_stats.keys_ts = {NO_ENTITY: {
+            'rocksdb.db.get.micros.count': {100: 10.0, 160: 40.0, 220: 50.0},
+            'rocksdb.db.get.micros.sum': {100: 20.0, 160: 140.0, 220: 150.0},
+            'rocksdb.db.get.micros.p99': {100: 2.0, 160: 8.0, 220: 6.0}
+        }}
+        self.log_stats.add_histogram_averages()
+        self.assertDictEqual(
+            {160: 4.0, 220: 1.0},
+            dict(
+                self.log_stats.keys_ts[NO_ENTITY]['rocksdb.db.get.micros.avg']
+            )
+        )
+        # the averages are weighted by the number of samples of the intervals
+        aggregated = self.log_stats.fetch_aggregated_values(
+            NO_ENTITY, self.log_stats.reqd_stats,
+            LogStatsParser.AggregationOperator.avg
+        )
+        self.assertAlmostEqual(130.0 / 40, aggregated[
+            'rocksdb.db.get.micros.avg'
+        ])
+        # the percentiles are cumulative, their average is the latest one
+        self.assertEqual(6.0, aggregated['rocksdb.db.get.micros.p99'])
+        aggregated = self.log_stats.fetch_aggregated_values(
+            NO_ENTITY, self.log_stats.reqd_stats,
+            LogStatsParser.AggregationOperator.stddev
+        )
+        # the standard deviation of the averages is weighted too
+        self.assertAlmostEqual(
+            math.sqrt((30 * 0.75 * 0.75 + 10 * 2.25 * 2.25) / 40),
+            aggregated['rocksdb.db.get.micros.avg']
+        )
+        self.assertAlmostEqual(
+            math.sqrt(104.0 / 3 - 16.0 * 16 / 9),
+            aggregated['rocksdb.db.get.micros.p99']
+        )
+        self.log_stats.register_stats([
+            'rocksdb.db.get.micros.avg', 'rocksdb.db.get.micros.p99'
+        ])
+        self.assertListEqual(
+            [
+                'rocksdb.db.get.micros.count', 'rocksdb.db.get.micros.sum',
+                'rocksdb.db.get.micros.p99'
+            ],
+            self.log_stats.parsed_stats
+        )
+
+    def test_aligned_timeseries(self):
+        # the dumps are 60 seconds apart, but for a delayed dump at 1185 and
+        # a skipped dump at 1300
+        timeseries = {
+            1000: 10.0, 1060: 20.0, 1120: 30.0, 1185: 40.0, 1240: 50.0,
+            1360: 100.0, 1420: 110.0
+        }
+        self.log_stats.stats_freq_sec = 20
+        self.log_stats.keys_ts = {NO_ENTITY: {
+            'rocksdb.block.cache.hit.count': timeseries,
+            'rocksdb.block.cache.miss.count': {1060: 1.0, 1420: 2.0}
+        }}
+        self.log_stats.align_keys_ts()
+        # the detected period does not override the configured one
+        self.assertEqual(60, self.log_stats.sampling_period)
+        self.assertEqual(20, self.log_stats.stats_freq_sec)
+        aligned = self.log_stats.aligned_ts[NO_ENTITY]
+        self.assertDictEqual(
+            {1000: 10.0, 1060: 20.0, 1120: 30.0, 1180: 40.0, 1240: 50.0,
+             1360: 100.0, 1420: 110.0},
+            {ts: value for ts, value in
+             aligned['rocksdb.block.cache.hit.count'].items()
+             if not is_gap(value)}
+        )
+        self.assertTrue(is_gap(aligned['rocksdb.block.cache.hit.count'][1300]))
+        self.assertListEqual(
+            [1060, 1420],
+            [ts for ts, value in
+             aligned['rocksdb.block.cache.miss.count'].items()
+             if not is_gap(value)]
+        )
+        # the windows that begin or end in the gap are skipped
+        burst_epochs = self.log_stats.fetch_burst_epochs(
+            [NO_ENTITY], 'rocksdb.block.cache.hit.count', 60, 10, False
+        )
+        self.assertDictEqual(
+            {NO_ENTITY: {1060: 10.0, 1120: 10.0, 1180: 10.0, 1240: 10.0,
+                         1420: 10.0}},
+            burst_epochs
+        )
+        # the time series are aligned again once they are fetched again
+        self.log_stats.fetch_timeseries(['rocksdb.block.cache.hit.count'])
+        self.assertIsNone(self.log_stats.aligned_ts)
+        self.assertDictEqual({}, self.log_stats.fetch_burst_epochs(
+            [], 'rocksdb.block.cache.hit.count', 60, 10, False
+        ))
+        self.assertEqual(20, self.log_stats.sampling_period)
+
+    def align_and_fetch_burst_epochs(self, keys_ts):
+        self.log_stats.stats_freq_sec = 20
+        self.log_stats.keys_ts = keys_ts
+        self.log_stats.align_keys_ts()
+        return self.log_stats.fetch_burst_epochs(
+            list(keys_ts.keys()), 'rocksdb.block.cache.hit.count', 120, 50,
+            True
+        )
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_batched_burst_epochs(self):
+        # the sampling period, the aligned grids and the rate changes of many
+        # entities, computed in batches with numpy, match those computed one
+        # entity at a time without numpy
+        self.log_stats.BURST_BATCH_SIZE = 3
+        keys_ts = {
+            str(entity): {'rocksdb.block.cache.hit.count': {
+                1000 + ix * 60 + (ix * entity) % 5: float((ix * entity) % 7)
+                for ix in range(20) if ix != entity
+            }}
+            for entity in range(10)
+        }
+        with mock.patch.object(db_timeseries_parser, 'numpy', None):
+            expected = self.align_and_fetch_burst_epochs(keys_ts)
+            expected_period = self.log_stats.sampling_period
+            expected_aligned = self.log_stats.aligned_ts
+        burst_epochs = self.align_and_fetch_burst_epochs(keys_ts)
+        self.assertEqual(60, expected_period)
+        self.assertEqual(expected_period, self.log_stats.sampling_period)
+        for entity, entity_ts in expected_aligned.items():
+            timeseries = entity_ts['rocksdb.block.cache.hit.count']
+            aligned = self.log_stats.aligned_ts[entity][
+                'rocksdb.block.cache.hit.count'
+            ]
+            self.assertListEqual(list(timeseries.keys()), list(aligned.keys()))
+            self.assertListEqual(
+                [None if is_gap(value) else value
+                 for value in timeseries.values()],
+                [None if is_gap(value) else value
+                 for value in aligned.values()]
+            )
+        self.assertTrue(expected)
+        self.assertEqual(expected.keys(), burst_epochs.keys())
+        for entity in expected:
+            self.assertListEqual(
+                list(expected[entity].keys()),
+                list(burst_epochs[entity].keys())
+            )
+            for ts, rate in expected[entity].items():
+                self.assertAlmostEqual(rate, burst_epochs[entity][ts])
+
+    def test_evaluate_expression(self):
+        # the expression is evaluated at the epochs of the aligned grid, and
+        # the epochs with a gap or a division by zero are skipped
+        condition = TimeSeriesCondition.create(Condition('ratio'))
+        condition.set_parameter('keys', ['hits', 'misses'])
+        condition.set_parameter('behavior', 'evaluate_expression')
+        condition.set_parameter('evaluate', 'keys[1] / keys[0] > 1')
+        self.log_stats.stats_freq_sec = 60
+        self.log_stats.keys_ts = {NO_ENTITY: {
+            'hits': {1000: 1.0, 1060: 0.0, 1120: 1.0, 1240: 1.0},
+            'misses': {1000: 2.0, 1060: 2.0, 1120: 2.0, 1180: 2.0}
+        }}
+        self.log_stats.align_keys_ts()
+        self.log_stats.handle_evaluate_expression(
+            condition, ['hits', 'misses'], [NO_ENTITY]
+        )
+        self.assertDictEqual(
+            {NO_ENTITY: {1000: [1.0, 2.0], 1120: [1.0, 2.0]}},
+            condition.get_trigger()
+        )
+        with self.assertRaises(ValueError):
+            condition.set_parameter('evaluate', 'keys[0].__class__')
+            condition.perform_checks()
+
+    def evaluate_expression(self, source, keys, entities):
+        condition = TimeSeriesCondition.create(Condition('expression'))
+        condition.set_parameter('keys', keys)
+        condition.set_parameter('behavior', 'evaluate_expression')
+        condition.set_parameter('evaluate', source)
+        self.log_stats.handle_evaluate_expression(condition, keys, entities)
+        return condition.get_trigger()
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_evaluate_expression_columns(self):
+        # the triggers of the expressions evaluated on the columns of the
+        # aligned grid match those evaluated epoch by epoch without numpy,
+        # including at the gaps and past the end of the shorter time series
+        self.log_stats.stats_freq_sec = 60
+        self.log_stats.keys_ts = {
+            str(entity): {
+                'hits': {
+                    1000 + ix * 60: float((ix * entity) % 5)
+                    for ix in range(30) if ix % 7 != entity
+                },
+                'misses': {
+                    1000 + ix * 60: float((ix + entity) % 4)
+                    for ix in range(20 + entity)
+                },
+                'stalls': {
+                    1000 + ix * 60: float(ix % 3) for ix in range(25)
+                }
+            }
+            for entity in range(5)
+        }
+        self.log_stats.align_keys_ts()
+        keys = ['hits', 'misses', 'stalls']
+        entities = list(self.log_stats.keys_ts.keys())
+        for source in [
+            'keys[1] / keys[0] > 1', 'keys[0] - keys[1] >= 1',
+            'keys[0] > 1 and not keys[2] > keys[1]', 'keys[2] % keys[1]',
+            'keys[2] < keys[0] <= keys[1] or keys[1] == 3',
+            'keys[2] // keys[1] == 1', '(keys[0] > 2) + (keys[1] > 2) >= 2',
+            '-(keys[0] > 2) < 0', '(keys[0] > 2) - (keys[1] > 2) < 0',
+            '(keys[0] > 2 or keys[1]) * 2 > 3', 'not keys[2] + 1 > 1'
+        ]:
+            with mock.patch.object(db_timeseries_parser, 'numpy', None), \
+                    mock.patch.object(expression_parser, 'numpy', None):
+                expected = self.evaluate_expression(source, keys, entities)
+            self.assertTrue(expected, source)
+            self.assertTrue(
+                self.log_stats.can_evaluate_columns(
+                    CompiledExpression(source, 'keys'), entities[0], keys
+                ),
+                source
+            )
+            self.assertDictEqual(
+                expected, self.evaluate_expression(source, keys, entities),
+                source
+            )
+            # the expression is evaluated epoch by epoch if the vectorized
+            # evaluation raises
+            with mock.patch.object(
+                CompiledExpression, 'evaluate_columns', side_effect=TypeError
+            ):
+                self.assertDictEqual(
+                    expected,
+                    self.evaluate_expression(source, keys, entities), source
+                )
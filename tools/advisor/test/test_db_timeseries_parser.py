@@ -0,0 +1,74 @@
+from advisor.db_timeseries_parser import TimeSeries, TimeSeriesSummary
+import math
+import pickle
+import unittest
+
+
+class TestTimeSeries(unittest.TestCase):
+    def test_dict_compatibility(self):
+        timeseries = TimeSeries({20: 2.0, 10: 1.0})
+        timeseries[40] = 4.0  # appended
+        timeseries[30] = 3.0  # inserted
+        timeseries[20] = 5.0  # overwritten
+        self.assertListEqual([10, 20, 30, 40], list(timeseries.keys()))
+        self.assertListEqual([1.0, 5.0, 3.0, 4.0], list(timeseries.values()))
+        self.assertEqual(4, len(timeseries))
+        self.assertIn(30, timeseries)
+        self.assertNotIn(35, timeseries)
+        self.assertEqual(3.0, timeseries[30])
+        self.assertEqual(None, timeseries.get(35))
+        with self.assertRaises(KeyError):
+            timeseries[35]
+        del timeseries[10]
+        self.assertEqual({20: 5.0, 30: 3.0, 40: 4.0}, timeseries)
+        self.assertEqual(timeseries, pickle.loads(pickle.dumps(timeseries)))
+
+    def test_columns(self):
+        timeseries = TimeSeries.from_columns([10, 20], [1.0, 2.0])
+        timestamps, values = timeseries.get_numpy_columns()
+        self.assertListEqual([10, 20], list(timestamps))
+        timeseries[30] = 3.0
+        # the columns are rebuilt after the time series changes
+        timestamps, values = timeseries.get_numpy_columns()
+        self.assertListEqual([1.0, 2.0, 3.0], list(values))
+
+    def test_summary(self):
+        timeseries = TimeSeries({10: 4.0, 20: 2.0})
+        summary = timeseries.get_summary()
+        self.assertEqual((2, 3.0, 2.0, 4.0), (
+            summary.count, summary.get_average(), summary.min, summary.max
+        ))
+        # the summary is kept up to date as samples are added
+        timeseries[30] = 6.0
+        timeseries[5] = 0.0
+        self.assertIs(summary, timeseries.get_summary())
+        self.assertEqual(3.0, summary.get_average())
+        self.assertAlmostEqual(math.sqrt(5.0), summary.get_stddev())
+        # and recomputed after a value is overwritten or removed
+        timeseries[30] = 1.0
+        self.assertEqual(4.0, timeseries.get_summary().max)
+        del timeseries[10]
+        self.assertEqual(2.0, timeseries.get_summary().max)
+        self.assertEqual(3, timeseries.get_summary().count)
+
+    def test_summary_of_large_values(self):
+        # the variance of large counters is not lost to cancellation
+        summary = TimeSeriesSummary([1e9, 1e9 + 1, 1e9 + 2, 1e9 + 3])
+        self.assertAlmostEqual(math.sqrt(1.25), summary.get_stddev())
+        summary = TimeSeriesSummary(
+            [1e12 + ix * 1000 for ix in range(100)]
+        )
+        self.assertAlmostEqual(
+            1000 * math.sqrt((100 * 100 - 1) / 12), summary.get_stddev(),
+            places=3
+        )
+        # the weighted summary is that of the values repeated 'weight' times
+        weighted = TimeSeriesSummary([1.0, 4.0], [3, 1])
+        repeated = TimeSeriesSummary([1.0, 1.0, 1.0, 4.0])
+        self.assertEqual(4, weighted.count)
+        self.assertAlmostEqual(repeated.get_average(), weighted.get_average())
+        self.assertAlmostEqual(repeated.get_stddev(), weighted.get_stddev())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+from advisor.db_write_stall_parser import WriteStallParser
+from advisor.rule_parser import Condition, TimeSeriesCondition
+from advisor.timestamp_parser import TimestampParser
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestWriteStallParser(unittest.TestCase):
+    def setUp(self):
+        this_path = os.path.abspath(os.path.dirname(__file__))
+        logs_path_prefix = os.path.join(this_path, 'input_files/LOG-0')
+        self.write_stalls = WriteStallParser(logs_path_prefix, ['default'])
+
+    @staticmethod
+    def get_time(hr_time):
+        return (
+            TimestampParser.get_timestamp_micros(hr_time) /
+            TimestampParser.MICROS_PER_SEC
+        )
+
+    def test_get_episodes(self):
+        self.write_stalls.fetch_timeseries([])
+        episodes = self.write_stalls.get_episodes('default')
+        self.assertListEqual(
+            [self.get_time('2018/05/23-11:53:12.800143'),
+             self.get_time('2018/05/25-14:30:07.764240'),
+             self.get_time('2018/05/25-14:30:25.643633')],
+            [episode.start_time for episode in episodes]
+        )
+        self.assertListEqual(
+            [{'level0_files': 2}, {'memtables': 1},
+             {'memtables': 1, 'pending_compaction_bytes': 1}],
+            [episode.causes for episode in episodes]
+        )
+        # the episodes end at the next log of the column family, but the
+        # first one, whose logs are out of order, lasts one dump period
+        self.assertListEqual(
+            [600.0,
+             self.get_time('2018/05/25-14:30:09.398351') -
+             self.get_time('2018/05/25-14:30:07.764240'),
+             self.get_time('2018/05/25-14:30:27.289390') -
+             self.get_time('2018/05/25-14:30:25.643633')],
+            [episode.get_duration() for episode in episodes]
+        )
+        self.assertListEqual([], self.write_stalls.get_episodes('col-fam-A'))
+
+    def test_episode_end(self):
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        log_path = os.path.join(log_dir, 'LOG')
+        stall = (
+            '[db/column_family.cc:743] [%s] Stopping writes because we have ' +
+            '2 immutable memtables (waiting for flush)'
+        )
+        with open(log_path, 'w') as fp:
+            for log_time, message in [
+                ('10', stall % 'default'), ('11', stall % 'col-fam-A'),
+                ('12', '[db/flush_job.cc:371] [col-fam-A] flush OK'),
+                ('13', stall % 'default'),
+                ('15', '[db/db_impl.cc:776] ------- DUMPING STATS -------'),
+                ('30', stall % 'col-fam-A')
+            ]:
+                fp.write(
+                    '2018/05/25-14:30:%s.000000 7f82ba72e700 %s\n' %
+                    (log_time, message)
+                )
+        write_stalls = WriteStallParser(
+            log_path, ['default', 'col-fam-A'], stats_dump_period_sec=20
+        )
+        write_stalls.fetch_timeseries([])
+        # the stall of 'default' ends with the stats dump, the first one of
+        # 'col-fam-A' with its flush, and the last one one dump period after
+        # its log
+        self.assertListEqual(
+            [5.0], [
+                episode.get_duration()
+                for episode in write_stalls.get_episodes('default')
+            ]
+        )
+        self.assertListEqual(
+            [1.0, 20.0], [
+                episode.get_duration()
+                for episode in write_stalls.get_episodes('col-fam-A')
+            ]
+        )
+
+    def test_check_and_trigger_conditions(self):
+        condition = TimeSeriesCondition.create(Condition('stall-time'))
+        condition.set_parameter('keys', [
+            'write_stall.cumulative_duration_sec',
+            'write_stall.cause.pending_compaction_bytes'
+        ])
+        condition.set_parameter('behavior', 'evaluate_expression')
+        condition.set_parameter('evaluate', 'keys[0] > 1 and keys[1] > 0')
+        condition.set_parameter('aggregation_op', 'latest')
+        self.write_stalls.check_and_trigger_conditions([condition])
+        trigger = condition.get_trigger()
+        self.assertListEqual(['default'], list(trigger.keys()))
+        self.assertAlmostEqual(
+            600.0 +
+            self.get_time('2018/05/25-14:30:09.398351') -
+            self.get_time('2018/05/25-14:30:07.764240') +
+            self.get_time('2018/05/25-14:30:27.289390') -
+            self.get_time('2018/05/25-14:30:25.643633'),
+            trigger['default'][0]
+        )
@@ -0,0 +1,83 @@
+from advisor.expression_parser import CompiledExpression, numpy
+import unittest
+
+
+class TestCompiledExpression(unittest.TestCase):
+    def test_whitelist(self):
+        for source in [
+            "__import__('os').system('true')", 'keys.__class__', 'open(0)',
+            'keys[0] if keys[1] else 0', '[keys[0]]', "keys[0] + 'a' == 0",
+            "'a' * 1000000000 == keys[0]", 'keys[0] in keys', 'not None',
+            "keys[0] in 'ab'",
+            'keys[-1] > 0', 'options[0] > 0', 'int(keys[0]) > 0',
+            'lambda: 0', 'keys[0] >', 'keys[0] ** 10 ** 10 > 0',
+            'max(*keys) > 0', 'max(keys[0], key=abs) > 0', 'max() > 0'
+        ]:
+            with self.assertRaises(ValueError, msg=source):
+                CompiledExpression(source, 'keys', {'max': max, 'abs': abs})
+        # the functions are only allowed if they are given
+        expression = CompiledExpression(
+            'int(options[0])*int(options[1])-int(options[2])>=1', 'options',
+            {'int': int}
+        )
+        self.assertTrue(expression.evaluate(['2', '3', '4']))
+        self.assertEqual(3, expression.num_values)
+        expression = CompiledExpression(
+            'max(keys[0], abs(keys[1]), 2) > 3', 'keys',
+            {'max': max, 'abs': abs}
+        )
+        self.assertTrue(expression.evaluate([1, -4]))
+        self.assertFalse(expression.evaluate([1, -3]))
+        # the strings, True, False and None may be compared, and these
+        # expressions are not vectorized
+        expression = CompiledExpression(
+            "keys[0] == 'a' and keys[1] not in ('b', None, True)", 'keys'
+        )
+        self.assertTrue(expression.evaluate(['a', 'c']))
+        self.assertFalse(expression.evaluate(['a', None]))
+        self.assertFalse(expression.can_evaluate_columns())
+
+    def test_evaluate(self):
+        expression = CompiledExpression(
+            '((keys[0]+keys[2])/(keys[0]+keys[1]))<0.9  ', 'keys'
+        )
+        self.assertTrue(expression.evaluate([1.0, 2.0, 1.0]))
+        self.assertFalse(expression.evaluate([1.0, 0.0, 1.0]))
+        with self.assertRaises(ZeroDivisionError):
+            expression.evaluate([0.0, 0.0, 1.0])
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_evaluate_columns(self):
+        rows = [
+            [1.0, 2.0, 1.0], [0.0, 0.0, 1.0], [3.0, -3.0, 0.0],
+            [2.0, float('nan'), 1.0], [-1.0, 4.0, 2.0], [5.0, 1.0, 0.0]
+        ]
+        columns = [numpy.array(column) for column in zip(*rows)]
+        for source in [
+            '((keys[0]+keys[2])/(keys[0]+keys[1]))<0.9',
+            'keys[0]+keys[1]+keys[2]==0', 'not keys[0] < keys[1] <= keys[2]',
+            '(keys[0] > 0 and keys[2] > 0) or keys[1] > 3',
+            'keys[1] % keys[0]',
+            'keys[0] - keys[2]', '1 < 2'
+        ]:
+            expression = CompiledExpression(source, 'keys')
+            self.assertTrue(expression.can_evaluate_columns(), source)
+            expected = []
+            for row in rows:
+                try:
+                    expected.append(
+                        row[1] == row[1] and bool(expression.evaluate(row))
+                    )
+                except ZeroDivisionError:
+                    expected.append(False)
+            self.assertListEqual(
+                expected, list(expression.evaluate_columns(columns)), source
+            )
+        # a division in the operands of 'or' may not be evaluated
+        self.assertFalse(CompiledExpression(
+            'keys[0] == 0 or keys[1] / keys[0] > 1', 'keys'
+        ).can_evaluate_columns())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+from advisor.db_bench_runner import DBBenchRunner
+from advisor.db_timeseries_parser import NO_ENTITY
+from advisor.histogram import DBBenchHistograms, Histogram
+import unittest
+
+
+class TestHistogram(unittest.TestCase):
+    def setUp(self):
+        self.output = [
+            'readrandom : 3.500 micros/op 285714 ops/sec;\n',
+            'Microseconds per read:\n',
+            'Count: 100 Average: 1.5000  StdDev: 0.50\n',
+            'Min: 0  Median: 1.0000  Max: 2\n',
+            'Percentiles: P50: 1.00 P75: 1.50 P99: 1.98 P99.9: 2.00\n',
+            '------------------------------------------------------\n',
+            '[       0,       1 ]       50  50.000%  50.000% ##########\n',
+            '(       1,       2 ]       50  50.000% 100.000% ##########\n',
+            '\n',
+            'Microseconds per write:\n',
+            'Count: 10 Average: 15.0000  StdDev: 5.00\n',
+            'Min: 10  Median: 15.0000  Max: 20\n',
+            '(      10,      20 ]       10 100.000% 100.000% ####\n'
+        ]
+
+    def test_parse_db_bench_output(self):
+        histograms = Histogram.parse_db_bench_output(self.output)
+        self.assertSetEqual({'read', 'write'}, set(histograms.keys()))
+        read = histograms['read']
+        self.assertEqual(100, read.count)
+        self.assertEqual(150.0, read.sum)
+        self.assertEqual(1.5, read.get_average())
+        self.assertDictEqual({(0.0, 1.0): 50, (1.0, 2.0): 50}, read.buckets)
+        self.assertEqual(1.0, read.get_percentile(50))
+        self.assertEqual(1.5, read.get_percentile(75))
+        # clamped to the min and the max
+        self.assertEqual(10.0, histograms['write'].get_percentile(0))
+        self.assertEqual(20.0, histograms['write'].get_percentile(100))
+
+    def test_db_bench_histograms(self):
+        histograms = DBBenchHistograms(
+            Histogram.parse_db_bench_output(self.output), 1000
+        )
+        histograms.fetch_timeseries([
+            'db_bench.read.p75', 'db_bench.read.avg', 'db_bench.write.count',
+            'db_bench.seek.p99', 'db_bench.read.p50.0', 'db_bench.read.x'
+        ])
+        self.assertDictEqual(
+            {
+                'db_bench.read.p75': {1000: 1.5},
+                'db_bench.read.p50.0': {1000: 1.0},
+                'db_bench.read.avg': {1000: 1.5},
+                'db_bench.write.count': {1000: 10}
+            },
+            histograms.keys_ts[NO_ENTITY]
+        )
+
+    def test_histogram_opt_in(self):
+        self.assertFalse(DBBenchRunner.is_histogram_enabled(None))
+        self.assertFalse(DBBenchRunner.is_histogram_enabled(['duration=10']))
+        self.assertFalse(
+            DBBenchRunner.is_histogram_enabled(['histogram=false'])
+        )
+        self.assertTrue(DBBenchRunner.is_histogram_enabled(['histogram=1']))
+        self.assertTrue(DBBenchRunner.is_histogram_enabled(['histogram']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+from advisor.db_log_parser import DatabaseLogs, LogScanner
+from advisor.db_stats_fetcher import LogStatsParser
+from advisor.db_timeseries_parser import NO_ENTITY
+from advisor.log_cache import LogCache
+from advisor.rule_parser import Condition, LogCondition
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+
+class TestLogCache(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        self.log_path = os.path.join(self.log_dir, 'LOG')
+        self.log_cache = LogCache(os.path.join(self.log_dir, 'cache'))
+        self.write_stats(range(3))
+
+    def write_stats(self, dump_ids):
+        with open(self.log_path, 'a') as fp:
+            for ix in dump_ids:
+                fp.write(
+                    '2018/05/25-14:30:%02d.000000 7f82ba72e700 ' % (ix * 10) +
+                    '[db/db_impl.cc:485] STATISTICS:\n' +
+                    'rocksdb.block.cache.hit COUNT : %d\n' % (ix * 5) +
+                    'rocksdb.db.get.micros P50 : 8.4 P99 : %d.5\n' % ix
+                )
+
+    def test_load_and_store(self):
+        self.assertIsNone(self.log_cache.load('kind', [self.log_path]))
+        self.log_cache.store('kind', [self.log_path], [1, 2])
+        self.assertListEqual(
+            [1, 2], self.log_cache.load('kind', [self.log_path])
+        )
+        self.assertIsNone(self.log_cache.load('other', [self.log_path]))
+        # the entry is invalidated by a change to the file
+        self.write_stats([3])
+        self.assertIsNone(self.log_cache.load('kind', [self.log_path]))
+        # and by a new version of the parsers
+        self.log_cache.store('kind', [self.log_path], [1, 2])
+        self.log_cache.PARSER_VERSION = LogCache.PARSER_VERSION + 1
+        self.assertIsNone(self.log_cache.load('kind', [self.log_path]))
+        # a corrupt entry is a cache miss
+        entry_path = self.log_cache.get_entry_path('kind', [self.log_path])
+        for data in [(1, 2, 3), None, [()]]:
+            with open(entry_path, 'wb') as fp:
+                pickle.dump(data, fp)
+            self.assertIsNone(self.log_cache.load('kind', [self.log_path]))
+
+    def test_cached_records(self):
+        class LogCollector:
+            def __init__(self):
+                self.logs = []
+
+            def process_log(self, log):
+                self.logs.append(log.get_message())
+
+        expected_logs = None
+        for _ in range(2):
+            log_scanner = LogScanner(
+                self.log_path, [], log_cache=self.log_cache
+            )
+            log_collector = LogCollector()
+            log_scanner.register(log_collector)
+            log_scanner.scan()
+            if expected_logs is None:
+                self.assertIsNotNone(self.log_cache.load(
+                    LogScanner.RECORDS_CACHE_KIND, [self.log_path]
+                ))
+                expected_logs = log_collector.logs
+            self.assertListEqual(expected_logs, log_collector.logs)
+        self.assertEqual(3, len(expected_logs))
+
+    def test_cached_matches(self):
+        def get_triggers(regexes):
+            db_logs = DatabaseLogs(
+                self.log_path, [], log_cache=self.log_cache
+            )
+            conditions = []
+            for ix, regex in enumerate(regexes):
+                condition = LogCondition.create(Condition('cond-%d' % ix))
+                condition.set_parameter('regex', regex)
+                conditions.append(condition)
+            db_logs.check_and_trigger_conditions(conditions)
+            return [
+                [
+                    log.get_message()
+                    for log in (condition.get_trigger() or {}).get(
+                        'DB_WIDE', []
+                    )
+                ]
+                for condition in conditions
+            ]
+
+        expected = [
+            ['[db/db_impl.cc:485] STATISTICS:\n' +
+             'rocksdb.block.cache.hit COUNT : 0\n' +
+             'rocksdb.db.get.micros P50 : 8.4 P99 : 0.5'],
+            []
+        ]
+        regexes = ['STATISTICS', 'no such log']
+        self.assertListEqual(expected, get_triggers(regexes))
+        cached_matches = self.log_cache.load(
+            LogScanner.MATCHES_CACHE_KIND, [self.log_path]
+        )
+        self.assertDictEqual(
+            {'STATISTICS': bytearray([1, 1, 1]),
+             'no such log': bytearray(3)},
+            cached_matches
+        )
+        # the cached matches are used, and those of a new regex are added
+        self.assertListEqual(expected, get_triggers(regexes))
+        self.assertListEqual(
+            [[], expected[0]], get_triggers(['no such log', 'P99 : 0.5'])
+        )
+        cached_matches = self.log_cache.load(
+            LogScanner.MATCHES_CACHE_KIND, [self.log_path]
+        )
+        self.assertEqual(bytearray([1, 0, 0]), cached_matches['P99 : 0.5'])
+
+    def test_cached_stats(self):
+        reqd_stats = ['rocksdb.db.get.micros.p99']
+        expected = {1527258600: 0.5, 1527258610: 1.5, 1527258620: 2.5}
+        log_stats = LogStatsParser(
+            self.log_path, 10, log_cache=self.log_cache
+        )
+        log_stats.fetch_timeseries(reqd_stats)
+        self.assertDictEqual(
+            expected,
+            dict(log_stats.keys_ts[NO_ENTITY]['rocksdb.db.get.micros.p99'])
+        )
+        # all the stats are cached, so another set of stats is served by the
+        # cache without scanning the LOG file again
+        log_stats = LogStatsParser(
+            self.log_path, 10, log_cache=self.log_cache
+        )
+        reqd_stats = ['rocksdb.block.cache.hit.count']
+        log_stats.register_stats(reqd_stats)
+        self.assertListEqual([], log_stats.log_scanner.pending_consumers)
+        log_stats.fetch_timeseries(reqd_stats)
+        self.assertDictEqual(
+            {1527258600: 0.0, 1527258610: 5.0, 1527258620: 10.0},
+            dict(
+                log_stats.keys_ts[NO_ENTITY]['rocksdb.block.cache.hit.count']
+            )
+        )
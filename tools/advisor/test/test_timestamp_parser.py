@@ -0,0 +1,44 @@
+from advisor.timestamp_parser import TimestampParser
+from calendar import timegm
+import time
+import unittest
+
+
+class TestTimestampParser(unittest.TestCase):
+    def test_get_timestamp(self):
+        hr_time = '2018/07/25-11:25:45.782710'
+        expected = timegm(
+            time.strptime(hr_time + 'GMT', "%Y/%m/%d-%H:%M:%S.%f%Z")
+        )
+        self.assertEqual(expected, TimestampParser.get_timestamp(hr_time))
+        self.assertEqual(
+            expected * 1000000 + 782710,
+            TimestampParser.get_timestamp_micros(hr_time)
+        )
+        # the microseconds are optional
+        self.assertEqual(
+            expected * 1000000,
+            TimestampParser.get_timestamp_micros('2018/07/25-11:25:45')
+        )
+        self.assertEqual(
+            1532476800, TimestampParser.get_timestamp('2018/07/25-00:00:00')
+        )
+
+    def test_bad_timestamp(self):
+        with self.assertRaises(ValueError):
+            TimestampParser.get_timestamp('2018/07/25 11:25:45.782710')
+        with self.assertRaises(ValueError):
+            TimestampParser.get_timestamp('2018-07-25-11:25:45.782710')
+
+    def test_is_timestamp(self):
+        self.assertTrue(TimestampParser.is_timestamp(
+            '2018/05/25-14:34:21.047233 context random new log'
+        ))
+        self.assertTrue(TimestampParser.is_timestamp(
+            '2018/05/25-14:34:21 ... thread 0: (1000,1000) ops'
+        ))
+        self.assertFalse(TimestampParser.is_timestamp('2018/05/25 14:34:21'))
+
+
+if __name__ == '__main__':
+    unittest.main()